@@ -0,0 +1,616 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import bulk
+import geektrust as ft
+import metrics
+import server
+import snapshot
+import tree_generator
+import wal
+
+
+def build_tree(size, seed=0, cache_size=ft.CACHE_SIZE, **options):
+    """
+    Builds a synthetic family tree of size blood-line vertices with tree_generator.generate_rows()
+
+    :param size: int
+        number of blood-line vertices to be created
+    :param seed: int
+        seed of the random generator so that the same tree is built on every run
+    :param cache_size: int
+        size of the relationship cache of the tree
+    :param options:
+        fanout, marriage_rate and depth of generate_rows()
+    :return: GraphADT obj and list of names of the vertices and spouses created
+    """
+    rows = list(tree_generator.generate_rows(size, seed=seed, **options))
+    ftree = ft.GraphADT(cache_size)
+    ftree.load_rows(rows)
+    return ftree, tree_generator.names_of(rows)
+
+
+def time_queries(ftree, names, relation, count=2000, seed=0):
+    """
+    Times get_relationship() of ftree for count random names of the tree with the given relation
+
+    :return: float
+        average latency of a query in microseconds
+    """
+    rnd = random.Random(seed)
+    queries = [rnd.choice(names) for _ in range(count)]
+    start = time.perf_counter()
+    for name in queries:
+        ftree.get_relationship(name, relation)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def bench_spouse_resolution(sizes=(1000, 10000, 100000)):
+    """
+    Prints the per-query latency of spouse resolution heavy relations for growing tree sizes.
+    Latency is expected to stay flat as the tree grows since spouses are resolved through the spouse index.
+    """
+    print("{:>10} {:>16} {:>16}".format("size", "Son (us/query)", "In-Law (us/query)"))
+    for size in sizes:
+        ftree, names = build_tree(size)
+        print("{:>10} {:>16.2f} {:>16.2f}".format(size, time_queries(ftree, names, "Son"),
+                                                  time_queries(ftree, names, "Sister-In-Law")))
+
+
+def bench_sibling_groups(fanouts=(3, 30, 300), relations=("Sister", "Siblings", "Maternal-Aunt", "Sister-In-Law")):
+    """
+    Prints the per-query latency in microseconds of sibling based relations for growing family sizes
+    """
+    print(("{:>10}" + " {:>16}" * len(relations)).format("fanout", *relations))
+    for fanout in fanouts:
+        ftree, names = build_tree(100000, cache_size=0, fanout=fanout)
+        print(("{:>10}" + " {:>16.2f}" * len(relations)).format(
+            fanout, *(time_queries(ftree, names, relation) for relation in relations)))
+
+
+def bench_edges(sizes=(100000, 1000000)):
+    """
+    Prints the memory of the edge store of GraphADT per edge, against one Edge object per parent kept in a dict
+    as GraphADT did before, and the time to enumerate all edges and to build the children offsets
+    """
+    print("{:>10} {:>18} {:>18} {:>16} {:>12}".format("size", "store (bytes/edge)", "Edge (bytes/edge)",
+                                                       "edges/sec", "build (s)"))
+    for size in sizes:
+        ftree, _ = build_tree(size, cache_size=0)
+        edges = len(ftree.edges)
+        tracemalloc.start()
+        store = ft.EdgeStore()
+        store.update(ftree.people)
+        store_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        edge_dict = {vertex.parent: ft.Edge.__new__(ft.Edge) for vertex in ftree.people if vertex.parent is not None}
+        edge_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del edge_dict
+        start = time.perf_counter()
+        enumerated = sum(1 for _ in store)
+        enumerate_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        store.build()
+        print("{:>10} {:>18.1f} {:>18.1f} {:>16.0f} {:>12.3f}".format(
+            size, store_bytes / edges, edge_bytes / edges, enumerated / enumerate_seconds,
+            time.perf_counter() - start))
+
+
+def bench_views(sizes=(10000, 100000, 1000000), count=20):
+    """
+    Prints the latency of the size, the first page of 10 names and the output line of the descendants of the
+    root, from the list of get_relationship() and from the view of relationship_view()
+    """
+    print("{:>10} {:>20} {:>10} {:>10} {:>12}".format("size", "method", "len (us)", "page (us)", "output (us)"))
+    for size in sizes:
+        ftree, _ = build_tree(size, cache_size=0)
+        ftree.descendant_index()
+        for method in ("get_relationship", "relationship_view"):
+            relationship = getattr(ftree, method)
+            latencies = []
+            for measure in (len, lambda res: res[:10] if isinstance(res, list) else res.page(0, 10),
+                            ft.format_relationship):
+                start = time.perf_counter()
+                for _ in range(count):
+                    measure(relationship("P0", "Descendants"))
+                latencies.append((time.perf_counter() - start) / count * 1e6)
+            print("{:>10} {:>20} {:>10.1f} {:>10.1f} {:>12.1f}".format(size, method, *latencies))
+
+
+def bench_chains(size=100000, count=4000, chains=("Son/Daughter", "Son/Son", "Siblings/Maternal-Aunt", "Cousin/Son",
+                                                  "Siblings/Son/Daughter", "Grandchild/Grandchild")):
+    """
+    Prints the throughput in queries/sec of the output lines of chained relations asked for count random names
+    each with every chain: composed by hand with get_relationship() (one query per relation of every intermediate
+    name), with get_relationship() of the chain (one ChainPlanner per query) and with process_commands(), whose
+    ChainPlanner shares the sub-results of the chains between queries
+    """
+    print("{:>18} {:>14}".format("method", "queries/sec"))
+    ftree, names = build_tree(size, cache_size=0)
+    rnd = random.Random(0)
+    commands = [(ft.GET_RELATIONSHIP, name, chain) for name in rnd.sample(names, count) for chain in chains]
+
+    def compose(name, chain):
+        reached = [name]
+        for relation in chain.split(ft.CHAIN):
+            results = {}
+            for item in reached:
+                results.update(dict.fromkeys(ftree.get_relationship(item, relation) or ()))
+            reached = list(results)
+        return reached
+
+    methods = (("by hand", lambda: [ft.format_relationship(compose(name, chain)) for _, name, chain in commands]),
+               ("get_relationship", lambda: [ft.format_relationship(ftree.get_relationship(name, chain))
+                                             for _, name, chain in commands]),
+               ("process_commands", lambda: ft.process_commands(ftree, commands, io.StringIO())))
+    for method, run in methods:
+        start = time.perf_counter()
+        run()
+        print("{:>18} {:>14.0f}".format(method, len(commands) / (time.perf_counter() - start)))
+
+
+def bench_reverse(size=100000, count=20, relations=("Son", "Siblings", "Paternal-Uncle", "Cousin", "Descendants",
+                                                    "Ancestor-1", "Son/Daughter")):
+    """
+    Prints the per-query latency of reverse relationship queries for count random names with every relation:
+    walked backwards from the name by reverse_relationship() and found by asking the relation of every name
+    """
+    print("{:>16} {:>18} {:>16}".format("relation", "reverse (us)", "scan (us)"))
+    ftree, names = build_tree(size, cache_size=0)
+    rnd = random.Random(0)
+    sample = rnd.sample(names, count)
+    for relation in relations:
+        start = time.perf_counter()
+        for name in sample:
+            ftree.reverse_relationship(name, relation)
+        reverse = (time.perf_counter() - start) / count * 1e6
+        # the scan answers a single name, the number of names it reaches grows with the tree
+        start = time.perf_counter()
+        [other for other in names if sample[0] in (ftree.get_relationship(other, relation) or ())]
+        scan = (time.perf_counter() - start) * 1e6
+        print("{:>16} {:>18.2f} {:>16.0f}".format(relation, reverse, scan))
+
+
+def bench_materialized(size=300000, watched=200000, count=100000, inserts=5000):
+    """
+    Prints the memory of the views of watched names for every relation of RELATIONS, the throughput of
+    get_relationship() of count random watched names with every relation without and with the views, the
+    throughput of add_child() without and with the views and the number of results changed per child addition
+    """
+    rnd = random.Random(0)
+    ftree, names = build_tree(size, cache_size=0)
+    watched_names = rnd.sample(names, min(watched, len(names)))
+    queries = [(rnd.choice(watched_names), rnd.choice(list(ft.RELATIONS))) for _ in range(count)]
+    additions = [(rnd.choice(names), "N{}".format(index), rnd.choice(("Male", "Female"))) for index in range(inserts)]
+    print("{:>14} {:>16} {:>16}".format("views", "queries/sec", "additions/sec"))
+    for views in (False, True):
+        ftree, _ = build_tree(size, cache_size=0)
+        if views:
+            start = time.perf_counter()
+            ftree.watch(watched_names)
+            watch_time = time.perf_counter() - start
+        get_relationship = ftree.get_relationship
+        start = time.perf_counter()
+        for name, relation in queries:
+            get_relationship(name, relation)
+        query_rate = count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for mother_name, name, gender in additions:
+            ftree.add_child(mother_name, name, gender)
+        print("{:>14} {:>16.0f} {:>16.0f}".format("on" if views else "off", query_rate,
+                                                 inserts / (time.perf_counter() - start)))
+    stats = ftree.materialized.stats()
+    print("watched {} names in {:.1f} s: {} results, {:.1f} MB ({:.0f} bytes per name)".format(
+        stats["names"], watch_time, stats["results"], stats["bytes"] / 1e6, stats["bytes"] / stats["names"]))
+    print("results changed per child addition: mean {:.1f}, max {}".format(stats["mean_fanout"],
+                                                                          stats["max_fanout"]))
+
+
+def bench_ancestry(sizes=(1000, 10000, 100000), count=2000):
+    """
+    Prints the per-query latency of ancestry relations on trees of 0 to 2 children per family, which grow hundreds
+    of generations deep. Latency is expected to grow with log depth since ancestors are found through the index.
+    """
+    print("{:>10} {:>10} {:>18} {:>16}".format("size", "depth", "Ancestor-N (us)", "Kinship (us)"))
+    for size in sizes:
+        ftree, _ = build_tree(size, fanout=1, marriage_rate=1.0)
+        names = list(ftree.vertices)
+        index = ftree.ancestry_index()
+        depth = max(index.add(vertex) for vertex in ftree.vertices.values())
+        rnd = random.Random(0)
+        queries = [(rnd.choice(names), rnd.randint(1, depth), rnd.choice(names)) for _ in range(count)]
+        start = time.perf_counter()
+        for name, generations, _ in queries:
+            ftree.get_relationship(name, "Ancestor-{}".format(generations))
+        ancestor_us = (time.perf_counter() - start) / count * 1e6
+        start = time.perf_counter()
+        for name, _, other in queries:
+            ftree.get_relationship(name, "Kinship", other)
+        print("{:>10} {:>10} {:>18.2f} {:>16.2f}".format(size, depth, ancestor_us,
+                                                         (time.perf_counter() - start) / count * 1e6))
+
+
+def bench_descendants(sizes=(10000, 100000, 1000000), count=2000):
+    """
+    Prints the time to label a tree and the per-query latency of descendant relations, which are expected to
+    stay flat as the tree grows, along with the latency of add_child() labelling the child in place
+    """
+    print("{:>10} {:>10} {:>22} {:>22} {:>16}".format("size", "label (s)", "Descendant-Count (us)",
+                                                      "Is-Descendant-Of (us)", "add_child (us)"))
+    for size in sizes:
+        ftree, names = build_tree(size)
+        start = time.perf_counter()
+        ftree.descendant_index()
+        label_seconds = time.perf_counter() - start
+        rnd = random.Random(0)
+        queries = [(rnd.choice(names), rnd.choice(names)) for _ in range(count)]
+        start = time.perf_counter()
+        for name, _ in queries:
+            ftree.get_relationship(name, "Descendant-Count")
+        count_us = (time.perf_counter() - start) / count * 1e6
+        start = time.perf_counter()
+        for name, other in queries:
+            ftree.get_relationship(name, "Is-Descendant-Of", other)
+        test_us = (time.perf_counter() - start) / count * 1e6
+        start = time.perf_counter()
+        for index, (name, _) in enumerate(queries):
+            ftree.add_child(name, "C{}".format(index), "Female")
+        print("{:>10} {:>10.3f} {:>22.2f} {:>22.2f} {:>16.2f}".format(size, label_seconds, count_us, test_us,
+                                                                     (time.perf_counter() - start) / count * 1e6))
+
+
+def command_lines(names, count, add_ratio=0.1, seed=0):
+    """
+    Returns count input lines for names with add_ratio of ADD_CHILD commands and GET_RELATIONSHIP otherwise
+    """
+    return list(tree_generator.generate_commands(names, count, add_ratio, seed=seed))
+
+
+def bench_command_processing(size=10000, count=200000, flush_sizes=(1, ft.FLUSH_SIZE)):
+    """
+    Prints the throughput of process_commands() in commands/sec for each of the flush sizes. Output goes to a
+    line buffered writer like a terminal stdout, so that every write() is a system call.
+    """
+    print("{:>10} {:>16}".format("flush size", "commands/sec"))
+    for flush_size in flush_sizes:
+        ftree, names = build_tree(size)
+        lines = command_lines(names, count)
+        with open(os.devnull, "w", buffering=1) as out:
+            start = time.perf_counter()
+            processed = ft.process_commands(ftree, ft.parse_commands(lines), out, flush_size)
+        print("{:>10} {:>16.0f}".format(flush_size, processed / (time.perf_counter() - start)))
+
+
+def split_commands(lines):
+    """
+    Parses lines the way geektrust.py did before CommandParser, splitting every line and gluing the 2 words of
+    names starting with King or Queen
+    """
+    for line in lines:
+        line = line.split()
+        if not line:
+            continue
+        if len(line) > 2 and (line[1] == 'King' or line[1] == 'Queen'):
+            line[1:3] = [line[1] + " " + line[2]]
+        if line[0] == 'ADD_CHILD':
+            yield 'ADD_CHILD', line[1], line[2], line[3]
+        elif line[0] == 'GET_RELATIONSHIP':
+            yield 'GET_RELATIONSHIP', line[1], line[2]
+
+
+def bench_tokenizer(size=100000, count=1000000):
+    """
+    Prints the throughput in lines/sec of parsing an input file with the split-based loop, with
+    CommandParser.parse() over its lines and with CommandParser.parse_stream() over its bytes
+    """
+    ftree, names = build_tree(size)
+    parser = ft.CommandParser(ftree)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "input.txt")
+        with open(path, "w") as f:
+            f.writelines(tree_generator.generate_commands(names, count))
+        print("{:>14} {:>16}".format("parser", "lines/sec"))
+        for label, mode, parse in (("split", "r", split_commands), ("parse", "r", parser.parse),
+                                   ("parse_stream", "rb", parser.parse_stream)):
+            with open(path, mode) as f:
+                start = time.perf_counter()
+                parsed = sum(1 for _ in parse(f))
+            print("{:>14} {:>16.0f}".format(label, parsed / (time.perf_counter() - start)))
+
+
+def bench_metrics(size=100000, count=200000):
+    """
+    Prints the throughput of process_commands() in commands/sec without and with metrics
+    """
+    print("{:>10} {:>16}".format("metrics", "commands/sec"))
+    for measured in (False, True):
+        ftree, names = build_tree(size)
+        commands = list(ft.parse_commands(command_lines(names, count)))
+        with open(os.devnull, "w") as out:
+            start = time.perf_counter()
+            processed = ft.process_commands(ftree, commands, out, metrics=metrics.Metrics() if measured else None)
+        print("{:>10} {:>16.0f}".format(str(measured), processed / (time.perf_counter() - start)))
+
+
+def bench_relationship_cache(size=100000, count=200000, cache_sizes=(0, 1000, 10000, ft.CACHE_SIZE)):
+    """
+    Prints commands/sec along with the hit, miss and eviction counters of the relationship cache for
+    a read-mostly command stream repeating (name, relation) pairs of 1000 names
+    """
+    print("{:>10} {:>16} {:>10} {:>10} {:>10}".format("cache size", "commands/sec", "hits", "misses", "evictions"))
+    for cache_size in cache_sizes:
+        ftree, names = build_tree(size, cache_size=cache_size)
+        lines = command_lines(names[:1000], count, add_ratio=0.001)
+        with open(os.devnull, "w") as out:
+            start = time.perf_counter()
+            processed = ft.process_commands(ftree, ft.parse_commands(lines), out)
+        stats = ftree.cache.stats() if ftree.cache is not None else {"hits": 0, "misses": 0, "evictions": 0}
+        print("{:>10} {:>16.0f} {:>10} {:>10} {:>10}".format(cache_size, processed / (time.perf_counter() - start),
+                                                            stats["hits"], stats["misses"], stats["evictions"]))
+
+
+def bench_memory(sizes=(10000, 100000, 1000000)):
+    """
+    Prints the memory allocated per person (vertices and spouses) while building trees of growing sizes,
+    measured with tracemalloc and excluding the list of names kept by the benchmark
+    """
+    print("{:>10} {:>16}".format("size", "bytes/person"))
+    for size in sizes:
+        tracemalloc.start()
+        ftree, names = build_tree(size, cache_size=0)
+        allocated = tracemalloc.get_traced_memory()[0] - sys.getsizeof(names)
+        tracemalloc.stop()
+        print("{:>10} {:>16.1f}".format(size, allocated / len(names)))
+
+
+def bench_load(sizes=(100000, 1000000)):
+    """
+    Writes synthetic trees of growing sizes to a CSV file and prints the time and rows/sec of GraphADT.load()
+    """
+    print("{:>10} {:>12} {:>16}".format("rows", "seconds", "rows/sec"))
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, "tree.csv")
+            tree_generator.write_tree_csv(path, tree_generator.generate_rows(size))
+            stats = ft.GraphADT().load(path)
+            print("{:>10} {:>12.3f} {:>16.0f}".format(stats["rows"], stats["seconds"], stats["rows_per_sec"]))
+
+
+def bench_snapshot(sizes=(100000, 1000000)):
+    """
+    Prints the cold start time, until the first query is answered, of a tree loaded from CSV and of
+    the same tree opened from a memory-mapped snapshot
+    """
+    print("{:>10} {:>14} {:>18} {:>14}".format("size", "CSV load (s)", "snapshot open (s)", "snapshot (MB)"))
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            csv_path = os.path.join(directory, "tree.csv")
+            snapshot_path = os.path.join(directory, "tree.snap")
+            tree_generator.write_tree_csv(csv_path, tree_generator.generate_rows(size))
+            start = time.perf_counter()
+            ftree = ft.GraphADT()
+            ftree.load(csv_path)
+            ftree.get_relationship("P{}".format(size - 1), "Siblings")
+            load_seconds = time.perf_counter() - start
+            snapshot.save_snapshot(ftree, snapshot_path)
+            del ftree
+            start = time.perf_counter()
+            with snapshot.MappedTree(snapshot_path) as mapped_tree:
+                mapped_tree.get_relationship("P{}".format(size - 1), "Siblings")
+                open_seconds = time.perf_counter() - start
+            print("{:>10} {:>14.3f} {:>18.4f} {:>14.1f}".format(size, load_seconds, open_seconds,
+                                                               os.path.getsize(snapshot_path) / 2 ** 20))
+
+
+def bench_mutation_log(count=5000, group_sizes=(1, 16, wal.GROUP_SIZE)):
+    """
+    Prints the throughput of add_child() in children/sec with a mutation log attached for each group size
+    """
+    print("{:>10} {:>16} {:>10}".format("group size", "children/sec", "fsyncs"))
+    with tempfile.TemporaryDirectory() as directory:
+        for group_size in group_sizes:
+            ftree, names = build_tree(1000)
+            mothers = [name for name in names if name in ftree.spouses and ftree.spouses[name].gender == "Male"]
+            log = wal.recover(ftree, os.path.join(directory, "tree{}.wal".format(group_size)), group_size)
+            start = time.perf_counter()
+            for index in range(count):
+                ftree.add_child(mothers[index % len(mothers)], "C{}".format(index), "Female")
+            log.close()
+            print("{:>10} {:>16.0f} {:>10}".format(group_size, count / (time.perf_counter() - start), log.commits))
+
+
+def bench_add_children(size=100000, count=200000, queries=20000):
+    """
+    Prints the throughput in rows/sec of ADD_CHILD rows added one by one with add_child() and in one batch with
+    add_children(), on trees with a warm relationship cache and a descendant index. Rows go to random names, so
+    that some of them fail.
+    """
+    print("{:>14} {:>14} {:>16}".format("method", "rows/sec", "index relabels"))
+    rnd = random.Random(0)
+    _, names = build_tree(size)
+    rows = [(rnd.choice(names), "C{}".format(index), rnd.choice(("Male", "Female"))) for index in range(count)]
+    for method in ("add_child", "add_children"):
+        ftree, names = build_tree(size)
+        for name in names[:queries]:
+            ftree.get_relationship(name, "Siblings")
+        ftree.descendant_index()
+        start = time.perf_counter()
+        if method == "add_child":
+            for row in rows:
+                ftree.add_child(*row)
+        else:
+            ftree.add_children(rows)
+        print("{:>14} {:>14.0f} {:>16}".format(method, count / (time.perf_counter() - start),
+                                                ftree.descendants.relabels if ftree.descendants else "dropped"))
+
+
+def bench_parallel(size=100000, count=400000, workers=(1, 2, 4, 8)):
+    """
+    Prints the throughput of process_commands() in commands/sec on a read-only command stream for each number
+    of worker processes
+    """
+    print("{:>10} {:>16}".format("workers", "commands/sec"))
+    ftree, names = build_tree(size, cache_size=0)
+    lines = command_lines(names, count, add_ratio=0)
+    commands = list(ft.parse_commands(lines))
+    for worker_count in workers:
+        with open(os.devnull, "w") as out:
+            start = time.perf_counter()
+            processed = ft.process_commands(ftree, commands, out, workers=worker_count)
+        print("{:>10} {:>16.0f}".format(worker_count, processed / (time.perf_counter() - start)))
+
+
+def bench_bulk(size=100000, relations=("Maternal-Aunt", "Siblings", "Sister-In-Law", "Cousin")):
+    """
+    Prints the time to answer each relation for every person of the tree with a get_relationship() loop over
+    the names, with one bulk query of the names and with one bulk query of the vertex ids of a ColumnarTree
+    """
+    ftree, _ = build_tree(size, cache_size=0)
+    start = time.perf_counter()
+    columnar_tree = bulk.ColumnarTree.from_graph(ftree)
+    print("ColumnarTree built in {:.3f} s, vectorized: {}".format(time.perf_counter() - start,
+                                                                 columnar_tree.vectorized))
+    names = list(ftree.vertices)
+    vertex_ids = [vertex.id for vertex in ftree.vertices.values()]
+    print("{:>16} {:>10} {:>10} {:>10} {:>10}".format("relation", "loop (s)", "names (s)", "ids (s)", "speedup"))
+    for relation in relations:
+        start = time.perf_counter()
+        for name in names:
+            ftree.get_relationship(name, relation)
+        loop_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        columnar_tree.query(names, relation)
+        names_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        columnar_tree.query_ids(vertex_ids, relation)
+        ids_seconds = time.perf_counter() - start
+        print("{:>16} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.1f}".format(relation, loop_seconds, names_seconds,
+                                                                     ids_seconds, loop_seconds / ids_seconds))
+
+
+def bench_server(size=100000, count=100000, connections=8, pipelines=(1, 16, 128)):
+    """
+    Prints requests/sec and p50/p99 latency of a TreeServer on a local TCP port for each pipeline depth
+    """
+    print("{:>10} {:>14} {:>10} {:>10}".format("pipeline", "requests/sec", "p50 (ms)", "p99 (ms)"))
+    ftree, names = build_tree(size)
+    lines = command_lines(names, count, add_ratio=0.01)
+
+    async def run(pipeline):
+        tree_server = await server.TreeServer(ftree).start()
+        async with tree_server:
+            port = tree_server.sockets[0].getsockname()[1]
+            return await server.load_test(port=port, lines=lines, connections=connections, pipeline=pipeline)
+
+    for pipeline in pipelines:
+        stats = asyncio.run(run(pipeline))
+        print("{:>10} {:>14.0f} {:>10.3f} {:>10.3f}".format(pipeline, stats["rps"], stats["p50_ms"], stats["p99_ms"]))
+
+
+def run_suite(sizes=(100000, 1000000), count=200000, seed=0):
+    """
+    Times, for each tree size, the tree build, every relation of get_relationship(), add_child() and
+    the end-to-end processing of an input file
+    :param sizes: tuple of int
+        sizes of the trees generated
+    :param count: int
+        number of command lines of the input file
+    :return: list of dict
+        one result per size, times in seconds, microseconds per call or commands/sec as named by the keys
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            rows = list(tree_generator.generate_rows(size, seed=seed))
+            names = tree_generator.names_of(rows)
+            ftree = ft.GraphADT(cache_size=0)
+            start = time.perf_counter()
+            ftree.load_rows(rows)
+            result = {"size": size, "people": len(names), "build_s": time.perf_counter() - start}
+            for relation in ft.RELATIONS:
+                result["relation_us." + relation] = time_queries(ftree, names, relation, seed=seed)
+            mothers = [name for name in names if name in ftree.spouses and ftree.spouses[name].gender == "Male"]
+            start = time.perf_counter()
+            for index in range(10000):
+                ftree.add_child(mothers[index % len(mothers)], "A{}".format(index), "Female")
+            result["add_child_us"] = (time.perf_counter() - start) / 10000 * 1e6
+
+            input_path = os.path.join(directory, "input.txt")
+            with open(input_path, "w") as f:
+                f.writelines(tree_generator.generate_commands(names, count, seed=seed))
+            ftree = ft.GraphADT()
+            ftree.load_rows(rows)
+            with open(input_path) as f, open(os.devnull, "w") as out:
+                start = time.perf_counter()
+                processed = ft.process_commands(ftree, ft.parse_commands(f), out)
+            result["commands_per_sec"] = processed / (time.perf_counter() - start)
+            results.append(result)
+    return results
+
+
+def compare(results, previous, threshold=0.1):
+    """
+    Prints the metrics of results that regressed by more than threshold against previous results of the same size
+    :return: int
+        number of regressions
+    """
+    previous = {result["size"]: result for result in previous}
+    regressions = 0
+    for result in results:
+        for key, value in result.items():
+            old = previous.get(result["size"], {}).get(key)
+            if key in ("size", "people") or not old:
+                continue
+            # throughputs regress when they drop, times when they grow
+            change = (old - value) / old if key.endswith("per_sec") else (value - old) / old
+            if change > threshold:
+                print("REGRESSION size={} {}: {:.4g} -> {:.4g} ({:+.0%})".format(result["size"], key, old, value,
+                                                                                 change))
+                regressions += 1
+    return regressions
+
+
+# ad hoc benchmarks run by name with --bench
+BENCHMARKS = {"spouse": bench_spouse_resolution, "commands": bench_command_processing,
+              "cache": bench_relationship_cache, "memory": bench_memory, "load": bench_load,
+              "snapshot": bench_snapshot, "wal": bench_mutation_log, "parallel": bench_parallel,
+              "server": bench_server, "bulk": bench_bulk,
+              "siblings": bench_sibling_groups, "ancestry": bench_ancestry,
+              "descendants": bench_descendants, "metrics": bench_metrics,
+              "tokenizer": bench_tokenizer, "edges": bench_edges,
+              "add_children": bench_add_children, "views": bench_views,
+              "chains": bench_chains, "reverse": bench_reverse, "materialized": bench_materialized}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks of geektrust.py on synthetic family trees")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000], help="tree sizes of the suite")
+    parser.add_argument("--commands", type=int, default=200000, help="command lines of the suite input file")
+    parser.add_argument("--output", help="JSON file the suite results are written to")
+    parser.add_argument("--compare", help="JSON file of a previous run to report regressions against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as a regression")
+    parser.add_argument("--bench", nargs="+", choices=sorted(BENCHMARKS), help="ad hoc benchmarks run instead")
+    args = parser.parse_args()
+
+    if args.bench:
+        for bench in args.bench:
+            BENCHMARKS[bench]()
+        sys.exit(0)
+    suite_results = run_suite(tuple(args.sizes), args.commands)
+    print(json.dumps(suite_results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(suite_results, output_file, indent=2)
+    if args.compare:
+        with open(args.compare) as compare_file:
+            sys.exit(1 if compare(suite_results, json.load(compare_file), args.threshold) else 0)
@@ -0,0 +1,456 @@
+from array import array
+from itertools import accumulate, repeat
+
+import geektrust as ft
+import snapshot
+
+try:
+    import numpy
+except ImportError:
+    # bulk queries fall back to loops over the arrays
+    numpy = None
+
+
+def _expand(owners, offsets, values, rows):
+    """
+    Gathers the CSR rows values[offsets[row]:offsets[row + 1]] of NumPy array rows into one array
+    :return: tuple
+        (owners, values) where every value of a row is paired with the owner of the row
+    """
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    ends = numpy.cumsum(counts)
+    positions = numpy.arange(ends[-1] if len(ends) else 0) + numpy.repeat(starts - ends + counts, counts)
+    return numpy.repeat(owners, counts), values[positions]
+
+
+class BulkResult:
+    """
+    Class to represent the results of one relation for many names in compressed sparse row form: the results of
+    the name at index are the string ids values[offsets[index]:offsets[index + 1]].
+
+    Attributes:
+        offsets : array of int
+            start of the results of every name in values, plus the total number of results
+        values : array of int
+            string ids of the results of all names, decoded by string()
+        found : bytearray or array of bool
+            true for the names found in the tree, false for the others
+        string : function
+            returns the name of a string id
+
+    Methods:
+        ids(index):
+            Returns the string ids of the results of the name at index
+        names(index):
+            Returns the results of the name at index as get_relationship() of GraphADT would
+    """
+
+    def __init__(self, offsets, values, found, string):
+        self.offsets = offsets
+        self.values = values
+        self.found = found
+        self.string = string
+
+    def __len__(self):
+        return len(self.found)
+
+    def __iter__(self):
+        return (self.names(index) for index in range(len(self.found)))
+
+    def ids(self, index):
+        """
+        :param index: int
+            index of a name in the names queried
+        :return: array of int
+            string ids of the results of the name
+        """
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def names(self, index):
+        """
+        :param index: int
+            index of a name in the names queried
+        :return: None or list
+            None if the name was not found else list containing relation names of the name
+        """
+        if not self.found[index]:
+            return
+        return [self.string(string_id) for string_id in self.ids(index).tolist()]
+
+
+class ColumnarTree:
+    """
+    Class to represent a family tree as parent, spouse, gender and children arrays indexed by integer vertex ids,
+    the person ids of the tree, laid out as in a snapshot, to answer one relation for many names at once. Every
+    step of a RelationPath is taken for all names together, as a gather over the arrays, instead of walking the
+    vertices of every name.
+    Steps are NumPy array operations if numpy is installed and loops over the arrays otherwise.
+
+    The arrays are a copy of the tree they were built from: a ColumnarTree built from a GraphADT does not see the
+    children added to it later and has to be built again.
+
+    Attributes:
+        vectorized : bool
+            True if queries run on NumPy arrays
+        parent : array of int
+            vertex id of the parent of every vertex, -1 if none
+        spouse : array of int
+            vertex id of the spouse of every vertex, -1 if none
+        holder : array of int
+            vertex id of the vertex of every couple laid out with their children, the vertex itself if unmarried
+        gender : array of int
+            code of the gender of every vertex in snapshot.GENDERS
+        child_offsets, children : arrays of int
+            children of vertex id are children[child_offsets[id]:child_offsets[id + 1]]
+
+    Methods:
+        from_graph(ftree), from_mapped(mapped_tree):
+            Build a ColumnarTree of a GraphADT or of a snapshot.MappedTree
+        generations():
+            Returns the generation of every vertex
+        query(names, relation):
+            Returns the BulkResult of relation for every name
+        query_ids(vertex_ids, relation):
+            Returns the BulkResult of relation for every vertex id
+    """
+
+    def __init__(self, parent, spouse, gender, child_offsets, children, string, lookup, vectorized=True):
+        """
+        :param string: function
+            returns the name of a string id, vertex ids being the string ids of their names
+        :param lookup: dict
+            vertex id every name and spouse name is resolved to, as by GraphADT.ids
+        :param vectorized: bool
+            False to loop over the arrays even if numpy is installed
+        """
+        self.parent = parent
+        self.spouse = spouse
+        self.gender = gender
+        self.child_offsets = child_offsets
+        self.children = children
+        self.string = string
+        self.lookup = lookup
+        self.vectorized = vectorized and numpy is not None
+        if self.vectorized:
+            # views of the same memory, no copy
+            self.parent, self.spouse, self.child_offsets, self.children = (
+                numpy.frombuffer(column, dtype=numpy.int32) for column in (parent, spouse, child_offsets, children))
+            self.gender = numpy.frombuffer(gender, dtype=numpy.uint8)
+            empty = self.child_offsets[1:] == self.child_offsets[:-1]
+            self.holder = numpy.where(empty & (self.spouse >= 0), self.spouse, numpy.arange(len(self.parent)))
+        else:
+            self.holder = array("i", [spouse_id if spouse_id >= 0 and child_offsets[vertex_id] == child_offsets[
+                vertex_id + 1] else vertex_id for vertex_id, spouse_id in enumerate(spouse)])
+        # children arrays filtered by gender code, built on first use
+        self.filtered_children = {None: (self.child_offsets, self.children)}
+        # first vertex id of the name of every vertex, built on first use
+        self.name_ids = None
+
+    @classmethod
+    def from_graph(cls, ftree, vectorized=True):
+        """
+        :param ftree: GraphADT
+        :param vectorized: bool
+            False to loop over the arrays even if numpy is installed
+        :return: ColumnarTree
+            arrays of ftree as it is now
+        """
+        strings, parent, spouse, gender, child_offsets, children = snapshot.columns(ftree)
+        return cls(parent, spouse, gender, child_offsets, children, strings.__getitem__, dict(ftree.ids), vectorized)
+
+    @classmethod
+    def from_mapped(cls, mapped_tree, vectorized=True):
+        """
+        :param mapped_tree: snapshot.MappedTree
+        :param vectorized: bool
+            False to loop over the arrays even if numpy is installed
+        :return: ColumnarTree
+            tree reading the mapped arrays in place, with a lookup of the names of the snapshot. It has to be
+            dropped before mapped_tree is closed.
+        """
+        string = mapped_tree.string
+        lookup = {string(vertex_id): vertex_id for vertex_id in mapped_tree.name_order}
+        # spouse names resolve to their spouse vertex first, as in GraphADT.ids
+        for vertex_id in mapped_tree.spouse_order:
+            spouse_id = mapped_tree.spouse[vertex_id]
+            lookup[string(spouse_id)] = spouse_id
+        return cls(mapped_tree.parent, mapped_tree.spouse, mapped_tree.gender, mapped_tree.child_offsets,
+                   mapped_tree.children, string, lookup, vectorized)
+
+    def _children(self, gender):
+        """
+        :param gender: str or None
+            gender of the children kept, None for all
+        :return: tuple
+            (child_offsets, children) arrays of the children of the given gender
+        """
+        if gender not in self.filtered_children and self.vectorized:
+            kept = self.gender[self.children] == snapshot.GENDERS.index(gender)
+            offsets = numpy.concatenate(([0], numpy.cumsum(kept)))[self.child_offsets]
+            self.filtered_children[gender] = (offsets, self.children[kept])
+        elif gender not in self.filtered_children:
+            code = snapshot.GENDERS.index(gender)
+            offsets = array("i", [0])
+            kept = array("i")
+            child_offsets, children, genders = self.child_offsets, self.children, self.gender
+            for vertex_id in range(len(self.parent)):
+                kept.extend(child for child in children[child_offsets[vertex_id]:child_offsets[vertex_id + 1]]
+                            if genders[child] == code)
+                offsets.append(len(kept))
+            self.filtered_children[gender] = (offsets, kept)
+        return self.filtered_children[gender]
+
+    def _step(self, step, owners, vertex_ids):
+        """
+        Takes a PathStep from all vertex_ids at once
+        :param owners: list of int
+            index of the name every vertex id was reached from, in ascending order
+        :param vertex_ids: list of int
+            vertex ids reached so far
+        :return: tuple
+            (owners, vertex_ids) reached by the step, still in ascending order of owners
+        """
+        parent = self.parent
+        next_owners = []
+        next_ids = []
+        if step.kind == ft.PARENT:
+            gender, spouse = self.gender, self.spouse
+            code = snapshot.GENDERS.index(step.gender) if step.gender is not None else -1
+            for owner, vertex_id in zip(owners, vertex_ids):
+                parent_id = parent[vertex_id]
+                if parent_id >= 0 and code >= 0 and gender[parent_id] != code:
+                    # the parent of a given gender is the parent vertex or its spouse
+                    parent_id = spouse[parent_id]
+                if parent_id >= 0 and (code < 0 or gender[parent_id] == code):
+                    next_owners.append(owner)
+                    next_ids.append(parent_id)
+            return next_owners, next_ids
+        child_offsets, children = self._children(step.gender)
+        if step.kind == ft.CHILDREN:
+            holder = self.holder
+            for owner, vertex_id in zip(owners, vertex_ids):
+                start, end = child_offsets[holder[vertex_id]], child_offsets[holder[vertex_id] + 1]
+                if start < end:
+                    next_ids.extend(children[start:end])
+                    next_owners.extend([owner] * (end - start))
+            return next_owners, next_ids
+        # siblings of the name of the vertex, such as a vertex it replaced, are left out with it
+        name_ids = self._name_ids()
+        for owner, vertex_id in zip(owners, vertex_ids):
+            parent_id = parent[vertex_id]
+            if parent_id < 0:
+                continue
+            name_id = name_ids[vertex_id]
+            siblings = [child for child in children[child_offsets[parent_id]:child_offsets[parent_id + 1]]
+                        if name_ids[child] != name_id]
+            next_ids.extend(siblings)
+            next_owners.extend([owner] * len(siblings))
+        return next_owners, next_ids
+
+    def _step_vectorized(self, step, owners, vertex_ids):
+        """
+        Same as _step() on NumPy arrays of owners and vertex_ids
+        """
+        if step.kind == ft.PARENT:
+            parent_ids = self.parent[vertex_ids]
+            if step.gender is None:
+                kept = parent_ids >= 0
+                return owners[kept], parent_ids[kept]
+            code = snapshot.GENDERS.index(step.gender)
+            # the parent of a given gender is the parent vertex or its spouse, ids of -1 being masked out
+            parent_ids = numpy.where((parent_ids >= 0) & (self.gender[parent_ids] != code), self.spouse[parent_ids],
+                                     parent_ids)
+            kept = (parent_ids >= 0) & (self.gender[parent_ids] == code)
+            return owners[kept], parent_ids[kept]
+        child_offsets, children = self._children(step.gender)
+        if step.kind == ft.CHILDREN:
+            return _expand(owners, child_offsets, children, self.holder[vertex_ids])
+        parent_ids = self.parent[vertex_ids]
+        kept = parent_ids >= 0
+        owners, vertex_ids, parent_ids = owners[kept], vertex_ids[kept], parent_ids[kept]
+        next_owners, next_ids = _expand(owners, child_offsets, children, parent_ids)
+        name_ids = self._name_ids()
+        kept = name_ids[next_ids] != numpy.repeat(name_ids[vertex_ids],
+                                                  child_offsets[parent_ids + 1] - child_offsets[parent_ids])
+        return next_owners[kept], next_ids[kept]
+
+    def evaluate(self, path, owners, vertex_ids):
+        """
+        Walks a RelationPath from all vertex_ids at once
+        :return: tuple
+            (owners, string ids) of the names (or spouse names) reached by the path, in ascending order of owners
+        """
+        step_function = self._step_vectorized if self.vectorized else self._step
+        for step in path.steps:
+            if not len(vertex_ids):
+                break
+            owners, vertex_ids = step_function(step, owners, vertex_ids)
+        if path.spouses and self.vectorized:
+            spouse_ids = self.spouse[vertex_ids]
+            kept = spouse_ids >= 0
+            return owners[kept], spouse_ids[kept]
+        if path.spouses:
+            spouse = self.spouse
+            pairs = [(owner, spouse[vertex_id]) for owner, vertex_id in zip(owners, vertex_ids)
+                     if spouse[vertex_id] >= 0]
+            return [owner for owner, _ in pairs], [string_id for _, string_id in pairs]
+        return owners, vertex_ids
+
+    def _name_ids(self):
+        """
+        :return: array of int
+            first vertex id of the name of every vertex, vertices replaced by a vertex of the same name and spouse
+            vertices sharing a name with a vertex having the same name id
+        """
+        if self.name_ids is None:
+            first = {}
+            name_ids = array("i", [first.setdefault(self.string(vertex_id), vertex_id)
+                                   for vertex_id in range(len(self.parent))])
+            self.name_ids = numpy.frombuffer(name_ids, dtype=numpy.int32) if self.vectorized else name_ids
+        return self.name_ids
+
+    def _group(self, count, parts, found):
+        """
+        Gathers the (owners, string ids) parts of count names into a BulkResult, the names of the spouse part
+        already reached by the first part of the same owner being dropped
+        """
+        if len(parts) > 1 and self.vectorized:
+            size = len(self.parent)
+            name_ids = self._name_ids()
+            reached = parts[0][0].astype(numpy.int64) * size + name_ids[parts[0][1]]
+            owners, values = parts[1]
+            kept = ~numpy.isin(owners.astype(numpy.int64) * size + name_ids[values], reached)
+            parts = [parts[0], (owners[kept], values[kept])]
+        elif len(parts) > 1:
+            name_ids = self._name_ids()
+            reached = {(owner, name_ids[string_id]) for owner, string_id in zip(*parts[0])}
+            pairs = [(owner, string_id) for owner, string_id in zip(*parts[1])
+                     if (owner, name_ids[string_id]) not in reached]
+            parts = [parts[0], ([owner for owner, _ in pairs], [string_id for _, string_id in pairs])]
+        if self.vectorized:
+            owners = numpy.concatenate([part[0] for part in parts] + [numpy.zeros(0, dtype=numpy.intp)])
+            values = numpy.concatenate([part[1] for part in parts] + [numpy.zeros(0, dtype=numpy.int32)])
+            if len(parts) > 1:
+                order = numpy.argsort(owners, kind="stable")
+                owners, values = owners[order], values[order]
+            offsets = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(owners, minlength=count))))
+            return BulkResult(offsets, values, found, self.string)
+        sizes = [0] * count
+        for owners, _ in parts:
+            for owner in owners:
+                sizes[owner] += 1
+        offsets = array("i", [0])
+        offsets.extend(accumulate(sizes))
+        parts = [part for part in parts if part[0]]
+        if len(parts) == 1:
+            # a single part is already in ascending order of owners
+            return BulkResult(offsets, array("i", parts[0][1]), found, self.string)
+        values = array("i", bytes(4 * offsets[-1]))
+        positions = list(offsets[:-1])
+        for owners, string_ids in parts:
+            for owner, string_id in zip(owners, string_ids):
+                values[positions[owner]] = string_id
+                positions[owner] += 1
+        return BulkResult(offsets, values, found, self.string)
+
+    def query(self, names, relation):
+        """
+        Answers relation for every name at once, as get_relationship() of GraphADT answers it for one name
+        :param names: list of str
+            names and spouse names
+        :param relation: str
+            relation registered in geektrust.RELATIONS
+        :return: BulkResult
+            results of every name, at the index of the name
+        """
+        if self.vectorized:
+            codes = numpy.fromiter(map(self.lookup.get, names, repeat(-1)), dtype=numpy.int64, count=len(names))
+            found = codes >= 0
+            owners = numpy.flatnonzero(found)
+            vertex_ids = codes[owners]
+        else:
+            owners, vertex_ids = [], []
+            found = bytearray(len(names))
+            for owner, vertex_id in enumerate(map(self.lookup.get, names)):
+                if vertex_id is not None:
+                    owners.append(owner)
+                    vertex_ids.append(vertex_id)
+                    found[owner] = 1
+        return self._query(len(names), owners, vertex_ids, found, relation)
+
+    def query_ids(self, vertex_ids, relation):
+        """
+        Answers relation for every vertex id at once, as for the names of the vertices
+        :param vertex_ids: iterable of int
+            vertex ids, e.g. of one generation
+        :param relation: str
+            relation registered in geektrust.RELATIONS
+        :return: BulkResult
+            results of every vertex id, at the index of the vertex id
+        """
+        if self.vectorized:
+            vertex_ids = numpy.asarray(vertex_ids, dtype=numpy.int64)
+            owners = numpy.arange(len(vertex_ids))
+        else:
+            vertex_ids = list(vertex_ids)
+            owners = list(range(len(vertex_ids)))
+        return self._query(len(vertex_ids), owners, vertex_ids, bytearray(b"\1") * len(vertex_ids), relation)
+
+    def _query(self, count, owners, vertex_ids, found, relation):
+        """
+        Walks relation from the vertex_ids of owners, then from their spouses for the names not reached yet
+        :return: BulkResult
+            results of every owner out of count
+        """
+        parts = []
+        paths = ft.RELATIONS.get(relation)
+        if paths is not None:
+            parts.append(self.evaluate(paths[0], owners, vertex_ids))
+        if paths is not None and paths[1] is not None and self.vectorized:
+            spouse_ids = self.spouse[vertex_ids]
+            married = spouse_ids >= 0
+            parts.append(self.evaluate(paths[1], owners[married], spouse_ids[married]))
+        elif paths is not None and paths[1] is not None:
+            spouse = self.spouse
+            pairs = [(owner, spouse[vertex_id]) for owner, vertex_id in zip(owners, vertex_ids)
+                     if spouse[vertex_id] >= 0]
+            parts.append(self.evaluate(paths[1], [owner for owner, _ in pairs], [spouse_id for _, spouse_id in pairs]))
+        return self._group(count, parts, found)
+
+    def generations(self):
+        """
+        :return: array of int
+            generation of every vertex, 0 for the roots of the tree. A spouse without parent married to a vertex
+            with one has the generation of that vertex.
+        """
+        generation = array("i", [0]) * len(self.parent)
+        parent, spouse = self.parent, self.spouse
+        if self.vectorized:
+            generation = numpy.frombuffer(generation, dtype=numpy.int32)
+            married_in = (parent < 0) & (spouse >= 0)
+            married_in[married_in] = parent[spouse[married_in]] >= 0
+            level = numpy.flatnonzero((parent < 0) & ~married_in)
+            depth = 0
+            while len(level):
+                partners = spouse[level]
+                partners = partners[partners >= 0]
+                level = numpy.concatenate((level, partners[married_in[partners]]))
+                generation[level] = depth
+                level = _expand(level, self.child_offsets, self.children, level)[1]
+                depth += 1
+            return generation
+        child_offsets, children = self.child_offsets, self.children
+        married_in = [parent[vertex_id] < 0 and spouse_id >= 0 and parent[spouse_id] >= 0
+                      for vertex_id, spouse_id in enumerate(spouse)]
+        level = [vertex_id for vertex_id in range(len(parent)) if parent[vertex_id] < 0 and not married_in[vertex_id]]
+        depth = 0
+        while level:
+            level += [spouse[vertex_id] for vertex_id in level
+                      if spouse[vertex_id] >= 0 and married_in[spouse[vertex_id]]]
+            for vertex_id in level:
+                generation[vertex_id] = depth
+            level = [child for vertex_id in level
+                     for child in children[child_offsets[vertex_id]:child_offsets[vertex_id + 1]]]
+            depth += 1
+        return generation
@@ -1,31 +1,90 @@
+import bisect
+import csv
+import gc
+import itertools
+import json
+import multiprocessing
+import operator
+import os
 import sys
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
 
 
 class Vertex:
     """
-    Class to represent a vertex
+    Class to represent a vertex. Attributes are kept in __slots__ so that a vertex carries no __dict__.
+    Spouses are vertices too: a vertex created with a spouse_name is married to a new vertex of that name, and both
+    are linked to each other by their spouse attribute. A couple shares its children lists, the children having
+    one of them as parent.
 
     Attributes:
-        data : dict
-            key, value pairs of info relating to a vertex
+        name : str
+            name of the vertex
+        id : int
+            person id of the vertex, its index in GraphADT.people
+        gender : str
+            interned gender of the vertex ("Male" or "Female")
+        spouse : Vertex or None
+            vertex the vertex is married to
+        spouse_name : str or None
+            name of the spouse of the vertex, read only
+        children : list or tuple
+            child vertices in the order they were added, an empty tuple until the first child is added
+        children_by_gender : dict or None
+            gender -> child vertices of that gender in the order they were added, None until the first child is added
+        parent : Vertex or None
+            parent vertex the vertex is a child of
 
     Methods:
         get_spouse_gender():
             Returns the spouse gender of Vertex
     """
 
+    __slots__ = ("name", "id", "gender", "spouse", "children", "children_by_gender", "parent")
+
     def __init__(self, data):
         """
-        Constructs all necessary attributes of Vertex object from data
+        Constructs all necessary attributes of Vertex object from data, and the vertex of its spouse if data has a
+        spouse_name
 
         :param data : dict
             key, value pairs of info relating to a vertex
         """
         self.name = data["name"]
-        self.gender = data["gender"]
-        self.spouse_name = data["spouse_name"]
-        self.children = []
-        self.incident_edges = {}
+        self.id = -1
+        # interned so that every vertex shares one string per gender and comparisons hit the identity check
+        self.gender = sys.intern(data["gender"])
+        self.spouse = None
+        self.children = ()
+        self.children_by_gender = None
+        self.parent = None
+        if data["spouse_name"] is not None:
+            self.spouse = Vertex({"name": data["spouse_name"], "gender": "Female" if self.gender == "Male" else "Male",
+                                  "spouse_name": None})
+            self.spouse.spouse = self
+
+    @property
+    def spouse_name(self):
+        """
+        Name of the spouse of the vertex, None if the vertex is not married
+        :return: str or None
+        """
+        if self.spouse is None:
+            return None
+        return self.spouse.name
+
+    @property
+    def incident_edges(self):
+        """
+        Incident edges of the vertex as a dict holding the parent vertex at key 0, empty if there is no parent
+        :return: dict
+        """
+        if self.parent is None:
+            return {}
+        return {0: self.parent}
 
     def get_spouse_gender(self):
         """
@@ -41,7 +100,7 @@ class Vertex:
 
 class Edge:
     """
-    Class to represent an Edge
+    Class to represent an Edge between 2 vertices. GraphADT keeps its edges in an EdgeStore instead.
 
     Attributes:
         start_vertex : vertex (dict)
@@ -50,9 +109,11 @@ class Edge:
             end point of the edge to be created
     """
 
+    __slots__ = ("start", "end")
+
     def __init__(self, start_vertex, end_vertex):
         """
-        Constructs an edge between 2 vertices given and updates incident edges of end vertex with start vertex
+        Constructs an edge between 2 vertices given and updates parent of end vertex with start vertex
         :param start_vertex : vertex (dict)
             starting point of the edge to be created
         :param end_vertex : vertex (dict)
@@ -60,7 +121,1560 @@ class Edge:
         """
         self.start = start_vertex
         self.end = end_vertex
-        self.end.incident_edges[0] = self.start
+        self.end.parent = self.start
+
+
+class EdgeStore:
+    """
+    Class to represent the parent-child edges of a tree by person ids: an array of the parent person id of every
+    person, -1 if none, indexed by person id. A child is looked up from the array, the children of a parent
+    through offsets into an array of children built from it on first use. Edges added to new children after the
+    build are kept per parent and read along with the built arrays, which are built again only once many edges
+    were added or when a child moves to another parent.
+
+    Attributes:
+        parents : array of int
+            person id -> person id of its parent, -1 if none
+        count : int
+            number of edges
+        offsets, children : array of int or None
+            children of person id are children[offsets[id]:offsets[id + 1]], in person id order, None until built
+        added : dict
+            parent person id -> ascending list of person ids of the children added since the build
+        pending : int
+            number of edges in added
+
+    Methods:
+        add(parent_id, child_id):
+            Stores an edge, replacing the edge of child_id if any
+        update(vertices):
+            Stores the edges of vertices to their parent
+        parent(child_id):
+            Returns the person id of the parent of child_id
+        children_of(parent_id):
+            Returns the person ids of the children of parent_id
+        columns():
+            Returns the parent and child person ids of all edges as 2 arrays
+    """
+
+    __slots__ = ("parents", "count", "offsets", "children", "added", "pending")
+
+    def __init__(self):
+        self.parents = array("i")
+        self.count = 0
+        self.offsets = None
+        self.children = None
+        self.added = {}
+        self.pending = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """
+        :return: generator of tuples
+            (parent person id, child person id) of every edge in child person id order
+        """
+        return ((parent_id, child_id) for child_id, parent_id in enumerate(self.parents) if parent_id >= 0)
+
+    def add(self, parent_id, child_id):
+        """
+        Stores an edge, replacing the edge of child_id if any
+        :param parent_id: int
+            person id of the parent
+        :param child_id: int
+            person id of the child
+        """
+        parents = self.parents
+        # the array covers the parent too, which may come after its children, for build() to count its children
+        size = max(child_id, parent_id) + 1
+        if size > len(parents):
+            parents.extend(array("i", [-1]) * (size - len(parents)))
+        previous = parents[child_id]
+        if previous == parent_id:
+            return
+        parents[child_id] = parent_id
+        if previous >= 0:
+            # the child is among the children of its previous parent in the built arrays
+            self.offsets = self.children = None
+            return
+        self.count += 1
+        if self.offsets is not None:
+            bisect.insort(self.added.setdefault(parent_id, []), child_id)
+            self.pending += 1
+
+    def update(self, vertices):
+        """
+        Stores the edges of vertices to their parent, in bulk
+        :param vertices: iterable of Vertex
+            vertices with a person id, those without parent are skipped
+        """
+        for vertex in vertices:
+            if vertex.parent is not None:
+                self.add(vertex.parent.id, vertex.id)
+
+    def parent(self, child_id):
+        """
+        :return: int
+            person id of the parent of child_id, -1 if none
+        """
+        if child_id < len(self.parents):
+            return self.parents[child_id]
+        return -1
+
+    def children_of(self, parent_id):
+        """
+        :return: array of int
+            person ids of the children of parent_id
+        """
+        # added edges are merged into the built arrays once they would cost more to read than a build
+        if self.offsets is None or self.pending << 3 > len(self.children) + 64:
+            self.build()
+        if parent_id + 1 >= len(self.offsets):
+            children = array("i")
+        else:
+            children = self.children[self.offsets[parent_id]:self.offsets[parent_id + 1]]
+        added = self.added.get(parent_id)
+        if added is None:
+            return children
+        if children and added[0] < children[-1]:
+            return array("i", sorted(itertools.chain(children, added)))
+        children.extend(added)
+        return children
+
+    def build(self):
+        """
+        Builds the offsets and children arrays with a counting sort of the edges by parent
+        """
+        offsets = array("i", [0]) * (len(self.parents) + 1)
+        for parent_id in self.parents:
+            if parent_id >= 0:
+                offsets[parent_id + 1] += 1
+        for index in range(1, len(offsets)):
+            offsets[index] += offsets[index - 1]
+        positions = offsets[:-1]
+        children = array("i", [0]) * self.count
+        for child_id, parent_id in enumerate(self.parents):
+            if parent_id >= 0:
+                children[positions[parent_id]] = child_id
+                positions[parent_id] += 1
+        self.offsets, self.children = offsets, children
+        self.added = {}
+        self.pending = 0
+
+    def columns(self):
+        """
+        :return: tuple of 2 arrays of int
+            parent and child person ids of every edge, in child person id order, to export the edges in bulk
+        """
+        child_ids = array("i", (child_id for child_id, parent_id in enumerate(self.parents) if parent_id >= 0))
+        return array("i", (self.parents[child_id] for child_id in child_ids)), child_ids
+
+
+def marry(vertex, spouse_vertex):
+    """
+    Links vertex and spouse_vertex to each other as spouses, sharing the children of either of them. Children
+    of spouse_vertex are moved to vertex if both have children.
+    :param vertex: Vertex
+        vertex getting married
+    :param spouse_vertex: Vertex
+        vertex it is married to
+    """
+    if spouse_vertex.children and vertex.children:
+        for child in list(spouse_vertex.children):
+            attach(vertex, child)
+    elif spouse_vertex.children:
+        vertex, spouse_vertex = spouse_vertex, vertex
+    vertex.spouse = spouse_vertex
+    spouse_vertex.spouse = vertex
+    spouse_vertex.children = vertex.children
+    spouse_vertex.children_by_gender = vertex.children_by_gender
+
+
+def children_holder(vertex):
+    """
+    Returns the vertex of a couple their children have as parent, vertex if the couple has no children
+    :param vertex: Vertex
+        vertex of the couple
+    :return: Vertex
+    """
+    if vertex.children:
+        return vertex.children[0].parent
+    return vertex
+
+
+def attach(parent_vertex, vertex):
+    """
+    Appends vertex to the children of parent_vertex, and to the children of its gender, and sets parent_vertex as
+    its parent. Leaves share the empty children tuple, the children lists are allocated with the first child and
+    shared with the spouse of parent_vertex.
+    :param parent_vertex: Vertex
+        vertex the child is added to
+    :param vertex: Vertex
+        child vertex
+    """
+    if parent_vertex.children:
+        parent_vertex.children.append(vertex)
+        group = parent_vertex.children_by_gender.get(vertex.gender)
+        if group is None:
+            parent_vertex.children_by_gender[vertex.gender] = [vertex]
+        else:
+            group.append(vertex)
+    else:
+        parent_vertex.children = [vertex]
+        parent_vertex.children_by_gender = {vertex.gender: [vertex]}
+        if parent_vertex.spouse is not None:
+            parent_vertex.spouse.children = parent_vertex.children
+            parent_vertex.spouse.children_by_gender = parent_vertex.children_by_gender
+    vertex.parent = parent_vertex
+
+
+class Siblings:
+    """
+    Class to represent a group of children of one parent without one of them, as a view of the group instead of
+    a copy of it. Vertices of the name of the vertex left out, such as a vertex it replaced that is still a child
+    of the parent, are left out too.
+
+    Attributes:
+        group : list
+            children of a parent, all of them or those of one gender
+        vertex : Vertex
+            child left out of the group
+        positions : list or None
+            ascending indexes in group of the vertices of the name of vertex, None until the view is first read
+    """
+
+    __slots__ = ("group", "vertex", "positions")
+
+    def __init__(self, group, vertex):
+        self.group = group
+        self.vertex = vertex
+        self.positions = None
+
+    def __len__(self):
+        return len(self.group) - len(self._positions())
+
+    def __iter__(self):
+        group = self.group
+        positions = self._positions()
+        if not positions:
+            return iter(group)
+        if len(positions) == 1:
+            index = positions[0]
+            return itertools.chain(itertools.islice(group, index), itertools.islice(group, index + 1, None))
+        name = self.vertex.name
+        return (item for item in group if item.name != name)
+
+    def __getitem__(self, index):
+        for position in self._positions():
+            if index < position:
+                break
+            index += 1
+        return self.group[index]
+
+    def _positions(self):
+        """
+        Finds the vertices left out in the group once per view
+        :return: list
+            ascending indexes in group of the vertices of the name of vertex
+        """
+        if self.positions is None:
+            name = self.vertex.name
+            self.positions = [index for index, item in enumerate(self.group) if item.name == name]
+        return self.positions
+
+
+class Slice:
+    """
+    Class to represent items[start:end] of a list as a view of the list instead of a copy of it
+
+    Attributes:
+        items : list
+            list viewed
+        start, end : int
+            bounds of the items viewed
+    """
+
+    __slots__ = ("items", "start", "end")
+
+    def __init__(self, items, start, end):
+        self.items = items
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        return itertools.islice(self.items, self.start, self.end)
+
+    def __getitem__(self, index):
+        return self.items[self.start + index]
+
+
+# kinds of PathStep
+PARENT = "parent"
+CHILDREN = "children"
+SIBLINGS = "siblings"
+
+
+class PathStep:
+    """
+    Class to represent a step of a relation path from a vertex to the next vertices
+
+    Attributes:
+        kind : str
+            PARENT, CHILDREN or SIBLINGS
+        gender : str or None
+            gender the next vertices must have, None for any gender
+
+    Methods:
+        __call__(vertex):
+            Returns the next vertices reached from vertex
+        inverse(vertex):
+            Returns the vertices the step reaches vertex from
+    """
+
+    __slots__ = ("kind", "gender")
+
+    def __init__(self, kind, gender=None):
+        """
+        Constructs a step of the given kind
+        :param kind: str
+            PARENT, CHILDREN or SIBLINGS
+        :param gender: str or None
+            gender the next vertices must have
+        """
+        self.kind = kind
+        self.gender = gender
+
+    def __call__(self, vertex):
+        """
+        Returns the next vertices reached from vertex: its parent, its children or the other children of its parent.
+        A parent of a given gender is the parent vertex or the spouse of the parent vertex.
+        :param vertex: Vertex
+            vertex the step is taken from
+        :return: tuple, list or Siblings
+            next vertices, not to be modified: children lists of vertices are returned as they are
+        """
+        gender = self.gender
+        if self.kind == PARENT:
+            parent_vertex = vertex.parent
+            if parent_vertex is None:
+                return ()
+            if gender is not None and parent_vertex.gender != gender:
+                parent_vertex = parent_vertex.spouse
+                if parent_vertex is None or parent_vertex.gender != gender:
+                    return ()
+            return (parent_vertex,)
+        if self.kind == CHILDREN:
+            if gender is None:
+                return vertex.children
+            if vertex.children_by_gender is None:
+                return ()
+            return vertex.children_by_gender.get(gender, ())
+        parent_vertex = vertex.parent
+        if parent_vertex is None:
+            return ()
+        if gender is None:
+            return Siblings(parent_vertex.children, vertex)
+        return Siblings(parent_vertex.children_by_gender.get(gender, ()), vertex)
+
+    def inverse(self, vertex):
+        """
+        Returns the vertices the step reaches vertex from: the children of vertex, its parent and the spouse of its
+        parent, or its siblings
+        :param vertex: Vertex
+            vertex reached by the step
+        :return: tuple, list or Siblings
+            previous vertices, not to be modified
+        """
+        gender = self.gender
+        if gender is not None and vertex.gender != gender:
+            return ()
+        if self.kind == PARENT:
+            # children have the vertex of a couple holding them as parent, and its spouse as parent of its gender
+            if gender is None and (not vertex.children or vertex.children[0].parent is not vertex):
+                return ()
+            return vertex.children
+        parent_vertex = vertex.parent
+        if parent_vertex is None:
+            return ()
+        if self.kind == CHILDREN:
+            # a couple shares its children
+            if parent_vertex.spouse is None:
+                return (parent_vertex,)
+            return parent_vertex, parent_vertex.spouse
+        return Siblings(parent_vertex.children, vertex)
+
+
+def parent_step(gender=None):
+    """
+    Returns a path step from a vertex to its parent, optionally to the parent of given gender, which is the parent
+    vertex or its spouse
+    :param gender: str or None
+        gender of the parent
+    :return: PathStep
+    """
+    return PathStep(PARENT, gender)
+
+
+def children_step(gender=None):
+    """
+    Returns a path step from a vertex to its children, optionally filtered by gender
+    :param gender: str or None
+        gender of children to be kept
+    :return: PathStep
+    """
+    return PathStep(CHILDREN, gender)
+
+
+def siblings_step(gender=None):
+    """
+    Returns a path step from a vertex to the other children of its parent, optionally filtered by gender
+    :param gender: str or None
+        gender of siblings to be kept
+    :return: PathStep
+    """
+    return PathStep(SIBLINGS, gender)
+
+
+class RelationPath:
+    """
+    Class to represent a relation as a path of steps walked from the vertex of the queried name
+
+    Attributes:
+        steps : tuple of PathStep
+            steps built with parent_step(), children_step() and siblings_step(), applied in order
+        spouses : bool
+            if True the spouse names of the vertices reached are returned instead of their names
+
+    Methods:
+        evaluate(vertex):
+            Walks the steps from vertex and returns the list of names reached
+        walk(vertices):
+            Walks the steps from a set of vertices at once and returns the vertices reached
+        sources(vertices):
+            Walks the steps backwards and returns the vertices the path reaches a set of vertices from
+        groups(vertex):
+            Walks the steps from vertex and returns the sequences of vertices returned by the last step
+    """
+
+    def __init__(self, *steps, spouses=False):
+        """
+        Constructs the path from the given steps
+        :param steps: PathStep
+            steps to be applied in order
+        :param spouses: bool
+            returns spouse names of the vertices reached when True
+        """
+        self.steps = steps
+        self.spouses = spouses
+
+    def groups(self, vertex):
+        """
+        Walks the steps from vertex as evaluate() does, without flattening what the last step returns
+        :param vertex: Vertex
+            vertex the path starts from
+        :return: list
+            sequences of vertices returned by the last step, one per vertex reached by the previous steps
+        """
+        vertices = (vertex,)
+        for step in self.steps[:-1]:
+            if len(vertices) == 1:
+                vertices = step(vertices[0])
+            else:
+                vertices = [item for current in vertices for item in step(current)]
+            if not vertices:
+                return []
+        last = self.steps[-1]
+        return [last(item) for item in vertices]
+
+    def evaluate(self, vertex):
+        """
+        Walks the steps from vertex, each step being applied to every vertex reached by the previous one
+        :param vertex: Vertex
+            vertex the path starts from
+        :return: list
+            names (or spouse names) of the vertices reached by the last step
+        """
+        vertices = (vertex,)
+        for step in self.steps:
+            if len(vertices) == 1:
+                vertices = step(vertices[0])
+            else:
+                vertices = [item for current in vertices for item in step(current)]
+            if not vertices:
+                return []
+        if self.spouses:
+            return [item.spouse.name for item in vertices if item.spouse is not None]
+        return [item.name for item in vertices]
+
+    def sources(self, vertices):
+        """
+        Walks the steps backwards from all of vertices at once, deduplicated after every step
+        :param vertices: sequence of Vertex
+            vertices reached by the path, whose spouse vertices were reached if spouses
+        :return: list
+            vertices the path reaches any of vertices from, each once
+        """
+        if self.spouses:
+            vertices = [item.spouse for item in vertices if item.spouse is not None]
+        for step in reversed(self.steps):
+            vertices = list(dict.fromkeys(itertools.chain.from_iterable(map(step.inverse, vertices))))
+            if not vertices:
+                break
+        return vertices
+
+    def walk(self, vertices):
+        """
+        Walks the steps from all of vertices at once, the vertices reached by a step being deduplicated before the
+        next step, so that a vertex reached from several vertices is walked from once
+        :param vertices: sequence of Vertex
+            vertices the path starts from, each once
+        :return: sequence
+            vertices reached by the last step, or their spouse vertices, each once, not to be modified
+        """
+        for step in self.steps:
+            if len(vertices) == 1:
+                vertices = step(vertices[0])
+            else:
+                vertices = list(dict.fromkeys(itertools.chain.from_iterable(map(step, vertices))))
+            if not vertices:
+                return ()
+        if self.spouses:
+            return [item.spouse for item in vertices if item.spouse is not None]
+        return vertices
+
+
+# name of a vertex
+_NAME = operator.attrgetter("name")
+# kinds of the parts of a RelationView: names, vertices whose names are the result, or vertices whose spouse
+# names are the result
+NAMES = "names"
+VERTICES = "vertices"
+SPOUSE_NAMES = "spouse_names"
+
+
+class RelationView:
+    """
+    Class to represent the result of a relation as a lazy view of the vertices reached instead of a list of their
+    names. Names are produced one at a time when the view is iterated, so that the size of the result, a page of
+    it or whether it is empty are known without building the list, and the names stream into the output line.
+    A view reads the children lists of the tree and is valid until the tree is changed.
+
+    Attributes:
+        parts : list of tuples
+            (groups, kind) where groups are sequences of vertices, or of names for kind NAMES, and kind is NAMES,
+            VERTICES or SPOUSE_NAMES. Names of a part follow those of the previous parts if not among them.
+
+    Methods:
+        __len__():
+            Returns the number of names
+        __bool__():
+            Returns True if there is any name
+        __contains__(name):
+            Returns True if name is in the result
+        __iter__():
+            Returns an iterator of the names
+        page(offset, limit):
+            Returns a list of at most limit names from offset
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, groups, kind=VERTICES):
+        """
+        Constructs a view of a first part
+        :param groups: list
+            sequences of vertices or names
+        :param kind: str
+            NAMES, VERTICES or SPOUSE_NAMES
+        """
+        self.parts = [(groups, kind)]
+
+    def extend(self, groups, kind=VERTICES):
+        """
+        Adds a part whose names follow those of the view that are not among them. A part of the same groups as
+        the first part adds no name and is left out.
+        :param groups: list
+            sequences of vertices or names
+        :param kind: str
+            NAMES, VERTICES or SPOUSE_NAMES
+        """
+        first_groups, first_kind = self.parts[0]
+        if kind != first_kind or len(groups) != len(first_groups) or any(
+                group is not first_group for group, first_group in zip(groups, first_groups)):
+            self.parts.append((groups, kind))
+
+    @staticmethod
+    def names(groups, kind):
+        """
+        :return: iterator
+            names of a part
+        """
+        if kind == NAMES:
+            return itertools.chain.from_iterable(groups)
+        if kind == VERTICES:
+            return map(_NAME, groups[0] if len(groups) == 1 else itertools.chain.from_iterable(groups))
+        return (item.spouse.name for group in groups for item in group if item.spouse is not None)
+
+    def __iter__(self):
+        if len(self.parts) == 1:
+            return self.names(*self.parts[0])
+        return self.distinct()
+
+    def distinct(self):
+        """
+        :return: generator
+            names of the first part, then names of the next parts not among the names of the parts before them
+        """
+        reached = set()
+        for groups, kind in self.parts:
+            names = []
+            for name in self.names(groups, kind):
+                if name not in reached:
+                    names.append(name)
+                    yield name
+            reached.update(names)
+
+    def __len__(self):
+        if len(self.parts) == 1:
+            groups, kind = self.parts[0]
+            if kind != SPOUSE_NAMES:
+                return sum(map(len, groups))
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        if len(self.parts) == 1 and self.parts[0][1] != SPOUSE_NAMES:
+            return any(self.parts[0][0])
+        for _ in self:
+            return True
+        return False
+
+    def __contains__(self, name):
+        return any(item == name for item in self)
+
+    def page(self, offset=0, limit=None):
+        """
+        :param offset: int
+            number of names skipped
+        :param limit: int or None
+            maximum number of names returned, None for all the names after offset
+        :return: list
+            names from offset. Groups of vertices are indexed from offset without walking them when possible, so
+            that a page costs its size
+        """
+        if len(self.parts) == 1 and self.parts[0][1] != SPOUSE_NAMES:
+            groups, kind = self.parts[0]
+            items = []
+            for group in groups:
+                size = len(group)
+                if offset >= size:
+                    offset -= size
+                    continue
+                end = size if limit is None else min(size, offset + limit - len(items))
+                if isinstance(group, (list, tuple)):
+                    items.extend(group[offset:end])
+                else:
+                    # Slice and Siblings views are indexed in O(1)
+                    items.extend(map(group.__getitem__, range(offset, end)))
+                offset = 0
+                if limit is not None and len(items) >= limit:
+                    break
+            return items if kind == NAMES else list(map(_NAME, items))
+        return list(itertools.islice(self, offset, None if limit is None else offset + limit))
+
+
+# relation name -> (path walked from a vertex, path walked from the spouse of the vertex or None)
+RELATIONS = {}
+# (relations, leaf) -> walks of child_walks(), and relations -> relations of beyond_family(), dropped whenever a
+# relation is registered
+_CHILD_WALKS = {}
+_BEYOND_FAMILY = {}
+
+
+def register_relation(relation, path, spouse_path=None):
+    """
+    Registers a relation to be answered by GraphADT.get_relationship()
+    :param relation: str
+        relation name used in GET_RELATIONSHIP
+    :param path: RelationPath
+        path walked when the name queried is a vertex
+    :param spouse_path: RelationPath or None
+        path walked from the spouse of the name queried, its results following those of path. None if the relation
+        does not go through spouses
+    """
+    RELATIONS[relation] = (path, spouse_path)
+    _CHILD_WALKS.clear()
+    _BEYOND_FAMILY.clear()
+
+
+# Father's brother is Paternal Uncle and Mother's brother is Maternal Uncle
+register_relation('Paternal-Uncle', RelationPath(parent_step('Male'), siblings_step('Male')))
+register_relation('Maternal-Uncle', RelationPath(parent_step('Female'), siblings_step('Male')))
+register_relation('Paternal-Aunt', RelationPath(parent_step('Male'), siblings_step('Female')))
+register_relation('Maternal-Aunt', RelationPath(parent_step('Female'), siblings_step('Female')))
+# Spouses share the children of the vertex they are married to
+register_relation('Son', RelationPath(children_step('Male')), RelationPath(children_step('Male')))
+register_relation('Daughter', RelationPath(children_step('Female')), RelationPath(children_step('Female')))
+register_relation('Siblings', RelationPath(siblings_step()))
+register_relation('Brother', RelationPath(siblings_step('Male')))
+register_relation('Sister', RelationPath(siblings_step('Female')))
+# Brother's spouse or Spouse's sister is Sister-In-Law and Sister's spouse or Spouse's brother is Brother-In-Law
+register_relation('Sister-In-Law', RelationPath(siblings_step('Male'), spouses=True),
+                  RelationPath(siblings_step('Female')))
+register_relation('Brother-In-Law', RelationPath(siblings_step('Female'), spouses=True),
+                  RelationPath(siblings_step('Male')))
+register_relation('Grandchild', RelationPath(children_step(), children_step()),
+                  RelationPath(children_step(), children_step()))
+register_relation('Cousin', RelationPath(parent_step(), siblings_step(), children_step()))
+register_relation('Nephew', RelationPath(siblings_step(), children_step('Male')))
+
+
+def child_walks(relations, leaf=True):
+    """
+    Returns the walks finding the people whose results of relations change when a vertex gets a parent: the
+    vertices from which a prefix of a relation path reaches the vertex, found by walking the prefix backwards with
+    the inverse of its last step first. Prefixes sharing their last steps share the start of their walk.
+    :param relations: tuple of str
+        relations of RELATIONS
+    :param leaf: bool
+        True if the vertex has no spouse and no children: it is then never in the result of a path returning
+        spouse names, and a walk going on from it with a children step reaches nothing new
+    :return: list
+        (index of the walk the walk goes on from, step inverted last, positions in relations of the results of the
+        vertices reached, positions in relations of the results of their spouses) of every walk. Walks come after
+        the walk they go on from, index 0 being the vertex itself and walk i being at i - 1.
+    """
+    key = (relations, leaf)
+    walks = _CHILD_WALKS.get(key)
+    if walks is not None:
+        return walks
+    # reversed steps -> [step inverted last, positions of the vertices reached, positions of their spouses]
+    walks = {}
+    for position, relation in enumerate(relations):
+        for path, slot in zip(RELATIONS[relation], (1, 2)):
+            if path is None:
+                continue
+            for end in range(1, len(path.steps) + (0 if leaf and path.spouses else 1)):
+                if leaf and end < len(path.steps) and path.steps[end].kind == CHILDREN:
+                    continue
+                steps = path.steps[end - 1::-1]
+                for length in range(1, end + 1):
+                    walk = tuple((step.kind, step.gender) for step in steps[:length])
+                    if walk not in walks:
+                        walks[walk] = [steps[length - 1], set(), set()]
+                walks[walk][slot].add(position)
+    order = sorted(walks, key=len)
+    index = {walk: position for position, walk in enumerate(order, 1)}
+    index[()] = 0
+    walks = _CHILD_WALKS[key] = [(index[walk[:-1]], *walks[walk]) for walk in order]
+    return walks
+
+
+def beyond_family(relations):
+    """
+    Returns the relations whose results may change outside GraphADT.family_ids() of a new leaf. Every walk of
+    child_walks() is followed as (generations up, generations down) from the leaf: the family of the leaf is the
+    leaf and its children, its parent, siblings and their children, its grandparent, uncles and aunts, cousins and
+    all their spouses.
+    :param relations: tuple of str
+        relations of RELATIONS
+    :return: tuple of str
+        relations of relations reaching people outside the family of a new leaf
+    """
+    beyond = _BEYOND_FAMILY.get(relations)
+    if beyond is not None:
+        return beyond
+    walks = child_walks(relations)
+    places = [(0, 0)]
+    beyond = set()
+    for previous_walk, step, positions, spouse_positions in walks:
+        up, down = places[previous_walk]
+        # inverse steps: a child goes to its parent, a sibling to the other children of its parent, a parent to
+        # its children
+        if step.kind == CHILDREN:
+            place = (up, down - 1) if down else (up + 1, 0)
+        elif step.kind == SIBLINGS:
+            place = (up, down) if down else (up + 1, 1)
+        else:
+            place = (up, down + 1)
+        places.append(place)
+        up, down = place
+        if up > 2 or down > (1 if up == 0 else 2):
+            beyond.update(positions, spouse_positions)
+    beyond = _BEYOND_FAMILY[relations] = tuple(relations[position] for position in sorted(beyond))
+    return beyond
+
+
+def changed_results(vertices, relations, persons):
+    """
+    Returns the people whose results of relations change when vertices get their parent, by walking the relation
+    paths backwards from the vertices. The results of a person change only if the walk of its relation goes through
+    one of the vertices.
+    :param vertices: sequence of Vertex
+        vertices attached to their parent, each once
+    :param relations: tuple of str
+        relations of RELATIONS
+    :param persons: container of int
+        person ids whose results are kept, other people are left out
+    :return: dict
+        person id -> set of positions in relations of the results changed
+    """
+    leaf = True
+    changed = {}
+    for vertex in vertices:
+        for item in (vertex, vertex.spouse):
+            # the results of the vertex and of its spouse change when the vertex gets a parent
+            if item is not None and item.id in persons:
+                changed[item.id] = set(range(len(relations)))
+        if vertex.children or vertex.spouse is not None:
+            leaf = False
+    # vertices every walk reaches
+    reached = [vertices]
+    for previous_walk, step, positions, spouse_positions in child_walks(relations, leaf):
+        previous = reached[previous_walk]
+        if len(previous) == 1:
+            sources = step.inverse(previous[0])
+        elif previous:
+            sources = list(dict.fromkeys(itertools.chain.from_iterable(map(step.inverse, previous))))
+        else:
+            sources = ()
+        reached.append(sources)
+        for item in sources:
+            if positions and item.id in persons:
+                changed.setdefault(item.id, set()).update(positions)
+            # paths from the spouse of a person are walked backwards to the spouse
+            if spouse_positions and item.spouse is not None and item.spouse.id in persons:
+                changed.setdefault(item.spouse.id, set()).update(spouse_positions)
+    return changed
+
+
+# relations answered by the ancestry index of GraphADT: 'Ancestor-N' for the Nth ancestor (Ancestor-1 is the parent),
+# and relations between 2 names given after the relation name: their lowest common ancestor and degree of kinship
+ANCESTOR = "Ancestor-"
+COMMON_ANCESTOR = "Common-Ancestor"
+KINSHIP = "Kinship"
+# relations answered by the descendant index of GraphADT: descendants of all or one gender, their number, and
+# 'Is-Descendant-Of other_name'
+DESCENDANTS = {"Descendants": None, "Male-Descendants": "Male", "Female-Descendants": "Female"}
+DESCENDANT_COUNT = "Descendant-Count"
+IS_DESCENDANT = "Is-Descendant-Of"
+# separator of the relations of a chained relation expression: 'Son/Daughter' are the daughters of the sons
+CHAIN = "/"
+
+
+def ancestor_generations(relation):
+    """
+    :param relation: str
+        relation name
+    :return: int or None
+        N of an 'Ancestor-N' relation with N > 0, None for any other relation
+    """
+    if relation.startswith(ANCESTOR):
+        generations = relation[len(ANCESTOR):]
+        if generations.isdecimal() and int(generations) > 0:
+            return int(generations)
+
+
+class AncestryIndex:
+    """
+    Class to represent a binary lifting index of the ancestors of vertices: for every vertex indexed, its depth
+    and its ancestors 1, 2, 4, 8, ... generations up, so that the Nth ancestor and the lowest common ancestor of
+    2 vertices are found in O(log depth) steps. Vertices are indexed from the entries of their parent, when they
+    are first queried or when they are added as a leaf.
+
+    Attributes:
+        depth : dict
+            vertex -> number of generations between the vertex and the root of its tree
+        jumps : dict
+            vertex -> list of ancestors, jumps[vertex][k] being the ancestor 2 ** k generations up
+
+    Methods:
+        add(vertex):
+            Indexes vertex and its ancestors not indexed yet
+        ancestor(vertex, generations):
+            Returns the ancestor of vertex the given number of generations up
+        common_ancestor(vertex, other):
+            Returns the lowest common ancestor of 2 vertices
+        kinship(vertex, other):
+            Returns the number of parent-child links between 2 vertices
+    """
+
+    def __init__(self):
+        self.depth = {}
+        self.jumps = {}
+
+    def add(self, vertex):
+        """
+        Indexes vertex and its ancestors not indexed yet, walking the parent links up to the first one indexed
+        :param vertex: Vertex
+            vertex to be indexed
+        :return: int
+            depth of vertex
+        """
+        depth, all_jumps = self.depth, self.jumps
+        chain = []
+        item = vertex
+        while item is not None and item not in depth:
+            chain.append(item)
+            item = item.parent
+        for item in reversed(chain):
+            parent_vertex = item.parent
+            if parent_vertex is None:
+                depth[item] = 0
+                all_jumps[item] = []
+                continue
+            depth[item] = depth[parent_vertex] + 1
+            # the ancestor 2 ** (k + 1) generations up is the ancestor 2 ** k generations up of the one 2 ** k up
+            jumps = [parent_vertex]
+            while len(jumps) - 1 < len(all_jumps[jumps[-1]]):
+                jumps.append(all_jumps[jumps[-1]][len(jumps) - 1])
+            all_jumps[item] = jumps
+        return depth[vertex]
+
+    def ancestor(self, vertex, generations):
+        """
+        :param vertex: Vertex
+        :param generations: int
+            number of generations up, 1 for the parent
+        :return: Vertex or None
+            ancestor of vertex, None if the tree of vertex is not that deep
+        """
+        if generations > self.add(vertex):
+            return None
+        level = 0
+        while generations:
+            if generations & 1:
+                vertex = self.jumps[vertex][level]
+            generations >>= 1
+            level += 1
+        return vertex
+
+    def common_ancestor(self, vertex, other):
+        """
+        :param vertex: Vertex
+        :param other: Vertex
+        :return: Vertex or None
+            deepest vertex that is an ancestor of (or is) both vertices, None if they are in different trees
+        """
+        depth, other_depth = self.add(vertex), self.add(other)
+        if depth < other_depth:
+            vertex, other, depth, other_depth = other, vertex, other_depth, depth
+        vertex = self.ancestor(vertex, depth - other_depth)
+        if vertex is other:
+            return vertex
+        # both vertices have the same depth and so the same number of jumps, the largest jumps that do not meet
+        # are taken until the parents meet
+        for level in reversed(range(len(self.jumps[vertex]))):
+            jumps, other_jumps = self.jumps[vertex], self.jumps[other]
+            if level < len(jumps) and jumps[level] is not other_jumps[level]:
+                vertex, other = jumps[level], other_jumps[level]
+        return vertex.parent
+
+    def kinship(self, vertex, other):
+        """
+        :param vertex: Vertex
+        :param other: Vertex
+        :return: int or None
+            degree of kinship as the number of parent-child links on the path between the vertices through their
+            lowest common ancestor (1 for parent and child, 2 for siblings, 4 for cousins), None if not related
+        """
+        ancestor = self.common_ancestor(vertex, other)
+        if ancestor is None:
+            return None
+        return self.depth[vertex] + self.depth[other] - 2 * self.depth[ancestor]
+
+
+# distance between consecutive labels of DescendantIndex after a relabelling, leaving room for the labels of the
+# leaves inserted later, and largest interval given to an inserted leaf, so that a parent has room for 2 ** 31
+# children added one after the other and inserted leaves have room for 16 generations of descendants
+LABEL_SPACING = 1 << 128
+LEAF_SPACING = 1 << 96
+# largest number of pending labels of a gender inserted one by one into the order of DescendantIndex, more are merged
+PENDING_INSERTS = 16
+
+
+class DescendantIndex:
+    """
+    Class to represent an interval labelling of the vertices of a tree: a depth-first walk gives every vertex an
+    enter label before those of its descendants and an exit label after them, so that the descendants of a vertex
+    are the vertices whose enter label lies in its interval. Descendant tests take O(1) and descendant counts
+    O(log n) with a binary search in the vertices sorted by enter label.
+
+    Labels are spaced out so that a leaf added to a parent takes 2 labels from the gap between the last label
+    inside the interval of the parent and its exit label. When a gap is used up, every vertex is labelled again.
+    The labels of added leaves are kept pending and put into order when it is next read, so that adding a leaf
+    takes O(1) and a run of additions costs one merge.
+
+    Attributes:
+        enter, exit : dict
+            vertex -> label
+        order : dict
+            gender (None for all) -> (enter labels in ascending order, vertices in the same order)
+        pending : dict
+            gender (None for all) -> (enter label, vertex) of the leaves not in order yet
+        relabels : int
+            number of times every vertex was labelled
+
+    Methods:
+        relabel():
+            Labels every vertex of the tree again
+        add_leaf(vertex):
+            Labels a vertex added as the last child of an indexed parent
+        add_leaves(vertices):
+            Labels vertices added as the last children of indexed parents
+        flush():
+            Puts the labels of the pending leaves into order
+        is_descendant(vertex, other):
+            Returns True if vertex is a descendant of other
+        count(vertex, gender):
+            Returns the number of descendants of vertex
+        descendants(vertex, gender):
+            Returns the descendants of vertex in depth-first order
+    """
+
+    def __init__(self, vertices):
+        """
+        Labels the trees of vertices
+        :param vertices: dict
+            vertices of GraphADT
+        """
+        self.vertices = vertices
+        self.enter = {}
+        self.exit = {}
+        self.order = {}
+        self.pending = {}
+        self.relabels = 0
+        self.relabel()
+
+    def relabel(self):
+        """
+        Labels every vertex of the trees of self.vertices, including the replaced vertices still in the trees
+        """
+        roots = []
+        seen = set()
+        for vertex in self.vertices.values():
+            while vertex not in seen:
+                seen.add(vertex)
+                if vertex.parent is None:
+                    roots.append(vertex)
+                    break
+                vertex = vertex.parent
+        enter, exit_label, order = {}, {}, {None: ([], [])}
+        label = 0
+        for root in roots:
+            stack = [(root, False)]
+            while stack:
+                vertex, done = stack.pop()
+                label += LABEL_SPACING
+                if done:
+                    exit_label[vertex] = label
+                    continue
+                enter[vertex] = label
+                for gender in (None, vertex.gender):
+                    if gender not in order:
+                        order[gender] = ([], [])
+                    order[gender][0].append(label)
+                    order[gender][1].append(vertex)
+                stack.append((vertex, True))
+                # children shared with a spouse are labelled under the spouse they have as parent
+                stack.extend((child, False) for child in reversed(vertex.children) if child.parent is vertex)
+        self.enter, self.exit, self.order = enter, exit_label, order
+        self.pending = {}
+        self.relabels += 1
+
+    def add_leaf(self, vertex):
+        """
+        Labels vertex, the last child of its indexed parent and without children, inside the interval of the
+        parent after its other descendants. Relabels every vertex if there is no room left.
+        :param vertex: Vertex
+            vertex to be labelled
+        """
+        parent_vertex = vertex.parent
+        siblings = parent_vertex.children
+        # last label inside the interval of the parent
+        last = self.exit[siblings[-2]] if len(siblings) > 1 else self.enter[parent_vertex]
+        gap = self.exit[parent_vertex] - last
+        if gap < 3:
+            self.relabel()
+            return
+        # the leaf leaves most of the gap to the next children of the parent and a part to its own children
+        step = max(min(gap >> 6, LEAF_SPACING), 1)
+        self.enter[vertex] = last + step
+        self.exit[vertex] = last + 2 * step
+        for gender in (None, vertex.gender):
+            self.pending.setdefault(gender, []).append((last + step, vertex))
+
+    def add_leaves(self, vertices):
+        """
+        Labels vertices, leaves appended in order to the children of indexed parents, as add_leaf() would one
+        after the other. Relabels every vertex if there is no room left.
+        :param vertices: list of Vertex
+            vertices to be labelled, in the order they were appended
+        """
+        added = {}
+        for vertex in vertices:
+            added[vertex.parent] = added.get(vertex.parent, 0) + 1
+        # parent -> last label inside its interval
+        last = {}
+        for parent_vertex, count in added.items():
+            siblings = parent_vertex.children
+            before = len(siblings) - count
+            last[parent_vertex] = self.exit[siblings[before - 1]] if before > 0 else self.enter[parent_vertex]
+        for vertex in vertices:
+            parent_vertex = vertex.parent
+            gap = self.exit[parent_vertex] - last[parent_vertex]
+            if gap < 3:
+                self.relabel()
+                return
+            step = max(min(gap >> 6, LEAF_SPACING), 1)
+            self.enter[vertex] = last[parent_vertex] + step
+            self.exit[vertex] = last[parent_vertex] = last[parent_vertex] + 2 * step
+            for gender in (None, vertex.gender):
+                self.pending.setdefault(gender, []).append((last[parent_vertex] - step, vertex))
+
+    def flush(self):
+        """
+        Puts the labels of the pending leaves into order, one list insertion per leaf for a few leaves and one
+        merge per gender otherwise
+        """
+        pending, self.pending = self.pending, {}
+        for gender, items in pending.items():
+            items.sort(key=lambda item: item[0])
+            labels, order_vertices = self.order.get(gender, ([], []))
+            if len(items) <= PENDING_INSERTS:
+                for label, vertex in items:
+                    position = bisect.bisect_left(labels, label)
+                    labels.insert(position, label)
+                    order_vertices.insert(position, vertex)
+                self.order[gender] = (labels, order_vertices)
+                continue
+            merged_labels, merged_vertices = [], []
+            start = 0
+            for label, vertex in items:
+                position = bisect.bisect_left(labels, label, start)
+                merged_labels.extend(labels[start:position])
+                merged_vertices.extend(order_vertices[start:position])
+                merged_labels.append(label)
+                merged_vertices.append(vertex)
+                start = position
+            merged_labels.extend(labels[start:])
+            merged_vertices.extend(order_vertices[start:])
+            self.order[gender] = (merged_labels, merged_vertices)
+
+    def is_descendant(self, vertex, other):
+        """
+        :return: bool
+            True if vertex is a child, grandchild, ... of other
+        """
+        return self.enter[other] < self.enter[vertex] < self.exit[other]
+
+    def _range(self, vertex, gender):
+        """
+        :return: tuple
+            (start, end) of the descendants of vertex in the vertices of order[gender]
+        """
+        if self.pending:
+            self.flush()
+        labels = self.order.get(gender, ((),))[0]
+        return bisect.bisect_right(labels, self.enter[vertex]), bisect.bisect_left(labels, self.exit[vertex])
+
+    def count(self, vertex, gender=None):
+        """
+        :param vertex: Vertex
+        :param gender: str or None
+            gender of the descendants counted, None for all
+        :return: int
+            number of descendants of vertex
+        """
+        start, end = self._range(vertex, gender)
+        return end - start
+
+    def descendants(self, vertex, gender=None):
+        """
+        :param vertex: Vertex
+        :param gender: str or None
+            gender of the descendants returned, None for all
+        :return: Slice
+            descendants of vertex in depth-first order, as a view of order valid until a vertex is labelled
+        """
+        start, end = self._range(vertex, gender)
+        if start >= end:
+            return ()
+        return Slice(self.order[gender][1], start, end)
+
+
+# default number of (name, relation) results kept by the relationship cache of GraphADT
+CACHE_SIZE = 65536
+
+
+class RelationshipCache:
+    """
+    Class to represent a bounded least recently used cache of get_relationship() results keyed on
+    (person id, relation), person ids being those of GraphADT.ids
+
+    Attributes:
+        size : int
+            maximum number of results kept before the least recently used one is evicted
+        hits, misses, evictions : int
+            counters to tune size with
+
+    Methods:
+        get(key, default):
+            Returns the result cached for key and marks it as recently used, default if not cached
+        put(key, result):
+            Caches result for key, evicting the least recently used result if size is exceeded
+        invalidate(persons):
+            Drops the results of every relation of the given person ids
+        clear():
+            Drops all results
+        stats():
+            Returns the counters as a dict
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        """
+        Constructs an empty cache of the given size
+        :param size: int
+            maximum number of results kept
+        """
+        self.size = size
+        self.entries = OrderedDict()
+        # person id -> relations of the person cached in entries
+        self.relations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Returns the result cached for key and marks it as recently used
+        :param key: tuple
+            (person id, relation)
+        :param default:
+            returned if key is not cached
+        :return: cached result or default
+        """
+        result = self.entries.get(key, default)
+        if result is default:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        """
+        Caches result for key, evicting the least recently used result if size is exceeded
+        :param key: tuple
+            (person id, relation)
+        :param result: list
+            result of get_relationship()
+        """
+        self.entries[key] = result
+        self.relations.setdefault(key[0], set()).add(key[1])
+        if len(self.entries) > self.size:
+            (person, relation), _ = self.entries.popitem(last=False)
+            relations = self.relations[person]
+            relations.discard(relation)
+            if not relations:
+                del self.relations[person]
+            self.evictions += 1
+
+    def invalidate(self, persons):
+        """
+        Drops the results of every relation of the given person ids
+        :param persons: iterable of int
+            person ids whose cached results are stale
+        """
+        for person in persons:
+            relations = self.relations.pop(person, None)
+            if relations is not None:
+                for relation in relations:
+                    del self.entries[(person, relation)]
+
+    def clear(self):
+        """
+        Drops all results
+        """
+        self.entries.clear()
+        self.relations.clear()
+
+    def stats(self):
+        """
+        :return: dict
+            size, number of results cached and hits, misses, evictions counters
+        """
+        return {"size": self.size, "entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+class MaterializedViews:
+    """
+    Class to represent the results of relations of RELATIONS materialized for a set of watched names, so that
+    reading them is a lookup. The results of a person are kept in one list, in the order of relations, each result
+    a tuple of names. When a child is added only the results whose walk goes through the child are evaluated
+    again, see changed_results().
+
+    Attributes:
+        ftree : GraphADT
+            tree the results are evaluated on
+        relations : tuple of str
+            relations materialized
+        names : dict
+            watched name -> person id
+        entries : dict
+            person id -> list of results of the person, in the order of relations
+        inserts : int
+            number of children added since the views were created
+        recomputed : int
+            number of results evaluated again after children were added
+        fanouts : dict
+            number of results a child addition changed -> number of child additions
+
+    Methods:
+        evaluate(person):
+            Returns the results of a person id, in the order of relations
+        watch(names):
+            Materializes the relations of names
+        get(person, relation):
+            Returns the materialized result of a person id, None if not materialized
+        children_added(vertices):
+            Evaluates again the results changed by new leaves
+        sync(names):
+            Materializes the relations of watched names whose person id changed
+        refresh():
+            Evaluates every result again
+        stats():
+            Returns the memory and update fan-out of the views as a dict
+    """
+
+    def __init__(self, ftree, relations=None):
+        """
+        Constructs empty views of relations over ftree
+        :param ftree: GraphADT
+            tree the results are evaluated on
+        :param relations: iterable of str or None
+            relations of RELATIONS to be materialized, all relations of RELATIONS if None
+        """
+        self.ftree = ftree
+        self.relations = tuple(RELATIONS if relations is None else relations)
+        for relation in self.relations:
+            if relation not in RELATIONS:
+                raise ValueError("{} is not a relation of RELATIONS".format(relation))
+        self.index = {relation: position for position, relation in enumerate(self.relations)}
+        self.names = {}
+        self.entries = {}
+        self.inserts = 0
+        self.recomputed = 0
+        self.fanouts = {}
+
+    def evaluate(self, person):
+        """
+        :param person: int
+            person id of ids
+        :return: list
+            results of the person, in the order of relations
+        """
+        return [tuple(self.ftree.evaluate_person(person, relation)) for relation in self.relations]
+
+    def watch(self, names):
+        """
+        Materializes the relations of names, names not found in the tree are skipped
+        :param names: iterable of str
+            names or spouse names to be watched
+        :return: int
+            number of names watched
+        """
+        ids = self.ftree.ids
+        count = 0
+        for name in names:
+            person = ids.get(name)
+            if person is None:
+                continue
+            self.names[name] = person
+            if person not in self.entries:
+                self.entries[person] = self.evaluate(person)
+            count += 1
+        return count
+
+    def get(self, person, relation):
+        """
+        :param person: int
+            person id of ids
+        :param relation: str
+            relation name
+        :return: tuple or None
+            materialized names of the relation of the person, None if not materialized
+        """
+        results = self.entries.get(person)
+        if results is None:
+            return
+        position = self.index.get(relation)
+        if position is None:
+            return
+        return results[position]
+
+    def children_added(self, vertices):
+        """
+        Evaluates again the results changed by vertices attached to their parent, found by changed_results()
+        :param vertices: list of Vertex
+            vertices attached to their parent
+        """
+        entries = self.entries
+        changed = {}
+        for vertex in vertices:
+            affected = changed_results((vertex,), self.relations, entries)
+            fanout = sum(len(positions) for positions in affected.values())
+            self.fanouts[fanout] = self.fanouts.get(fanout, 0) + 1
+            for person, positions in affected.items():
+                changed.setdefault(person, set()).update(positions)
+        self.inserts += len(vertices)
+        evaluate_person = self.ftree.evaluate_person
+        relations = self.relations
+        for person, positions in changed.items():
+            results = entries[person]
+            for position in positions:
+                results[position] = tuple(evaluate_person(person, relations[position]))
+            self.recomputed += len(positions)
+
+    def sync(self, names):
+        """
+        Materializes the relations of the watched names among names whose person id changed, after a vertex
+        replaced a vertex of the same name
+        :param names: iterable of str or None
+            names whose person id may have changed
+        """
+        for name in names:
+            person = self.names.get(name)
+            if person is not None and self.ftree.ids.get(name) != person:
+                del self.names[name]
+                if person not in self.names.values():
+                    del self.entries[person]
+                self.watch((name,))
+
+    def refresh(self):
+        """
+        Evaluates every result again, after the tree was changed in bulk
+        """
+        names = list(self.names)
+        self.names.clear()
+        self.entries.clear()
+        self.watch(names)
+
+    def stats(self):
+        """
+        Memory is counted for the containers of the views: the names of the results are those of the vertices
+        and are not copied.
+        :return: dict
+            number of names watched, persons and results materialized, names in the results, bytes of the views,
+            number of child additions, results evaluated again and the largest and mean number of results changed
+            by a child addition
+        """
+        size = sys.getsizeof(self.names) + sys.getsizeof(self.entries)
+        names = 0
+        for results in self.entries.values():
+            # empty results are the same empty tuple
+            size += sys.getsizeof(results) + sum(sys.getsizeof(result) for result in results if result)
+            names += sum(len(result) for result in results)
+        additions = sum(self.fanouts.values())
+        return {"names": len(self.names), "persons": len(self.entries),
+                "results": len(self.entries) * len(self.relations), "result_names": names, "bytes": size,
+                "inserts": self.inserts, "recomputed": self.recomputed, "max_fanout": max(self.fanouts, default=0),
+                "mean_fanout": sum(fanout * count for fanout, count in self.fanouts.items()) / additions
+                if additions else 0.0}
+
+
+# marks a (name, relation) that is not in the relationship cache
+_NOT_CACHED = object()
+# roles of a person id in GraphADT.roles: the vertex of its name in vertices, and the spouse vertex its name
+# resolves to as a spouse name
+_NAMED = 1
+_SPOUSE = 2
+
+
+class VertexNames(Mapping):
+    """
+    Class to represent the vertices dict of a GraphADT, name -> vertex of that name, as a read-only view of its
+    ids table so that every name is held once. The vertex of a name is the person its id points to, unless the
+    name resolves to a spouse vertex first, the vertex of the name being then in GraphADT.hidden.
+
+    Attributes:
+        ftree : GraphADT
+            tree whose names are viewed
+    """
+
+    __slots__ = ("ftree",)
+
+    def __init__(self, ftree):
+        self.ftree = ftree
+
+    def get(self, name, default=None):
+        ftree = self.ftree
+        person = ftree.ids.get(name)
+        if person is None:
+            return default
+        if ftree.roles[person] & _NAMED:
+            return ftree.people[person]
+        return ftree.hidden.get(name, default)
+
+    def __getitem__(self, name):
+        vertex = self.get(name)
+        if vertex is None:
+            raise KeyError(name)
+        return vertex
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __iter__(self):
+        ftree = self.ftree
+        roles, hidden = ftree.roles, ftree.hidden
+        return (name for name, person in ftree.ids.items() if roles[person] & _NAMED or name in hidden)
+
+    def __len__(self):
+        return self.ftree.named_count
+
+
+class SpouseNames(Mapping):
+    """
+    Class to represent the spouse index of a GraphADT, spouse name -> vertex married to it, as a read-only view of
+    its ids table, where a spouse name resolves to the spouse vertex of that name
+
+    Attributes:
+        ftree : GraphADT
+            tree whose spouse names are viewed
+    """
+
+    __slots__ = ("ftree",)
+
+    def __init__(self, ftree):
+        self.ftree = ftree
+
+    def get(self, name, default=None):
+        ftree = self.ftree
+        person = ftree.ids.get(name)
+        if person is None or not ftree.roles[person] & _SPOUSE:
+            return default
+        return ftree.people[person].spouse
+
+    def __getitem__(self, name):
+        vertex = self.get(name)
+        if vertex is None:
+            raise KeyError(name)
+        return vertex
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __iter__(self):
+        roles = self.ftree.roles
+        return (name for name, person in self.ftree.ids.items() if roles[person] & _SPOUSE)
+
+    def __len__(self):
+        return self.ftree.spouse_count
 
 
 class GraphADT:
@@ -72,29 +1686,128 @@ class GraphADT:
         Creates vertex(data) and adds it to vertices dict of Graph obj.
 
     add_edge(source, endpoint)
-        Creates an edge between source and endpoint vertices and adds this edge to edges dict of Graph obj
+        Creates an edge between source and endpoint vertices and adds this edge to the edge store of Graph obj
+
+    add_person(vertex)
+        Gives vertex and its spouse vertex person ids.
+
+    set_vertex(vertex)
+        Makes vertex the vertex of its name in vertices.
+
+    set_spouse(vertex)
+        Adds vertex to the spouse index under the name of its spouse.
+
+    drop_spouse(vertex)
+        Removes a vertex being replaced from the spouse index.
+
+    merge(other)
+        Merges the people of another tree into the tree, people of the same name being the same person.
+
+    merge_person(other_vertex)
+        Returns the vertex of the tree of the same name as a vertex of another tree.
 
     spouse_search(name)
         Checks if the name is spouse_name of any the vertices and return True if found. Else False
 
     get_spouse_name(name)
-        Searches and returns the vertex name if the name is spouse_name of any vertex of Graph obj.
+        Returns the vertex name if the name is spouse_name of any vertex of Graph obj.
 
     add_child(mother_name, name, gender)
         creates a vertex(name) and edge between mother_name and name with given gender only if mother_name
         is a valid female vertex with spouse or if mother_name is spouse of a valid male vertex.
 
-    get_relationship(name, relation)
-        For the given relation, appends a result array with names of vertices that match the relation
-        between all vertices and name vertex.
+    add_children(rows)
+        Adds (mother_name, name, gender) rows with add_child() statuses, updating indexes once per batch.
+
+    resolve_mother(mother_name)
+        Returns the vertex holding the children of mother_name, or the status of a failed child addition.
+
+    children_added(children)
+        Updates the edge store, the cache, the descendant index and the materialized views after children were
+        attached.
+
+    watch(names, relations)
+        Materializes the relations of names, results being patched as children are added.
+
+    get_relationship(name, relation, other)
+        For the given relation registered in RELATIONS, returns a result array with names of vertices that match
+        the relation between all vertices and name vertex. Results are cached until an added child changes them.
+        Results of the names watched with watch() are read from their materialized views.
+        Ancestor-N, Common-Ancestor and Kinship (with the other name) are answered by the ancestry index,
+        Descendants, Male-Descendants, Female-Descendants, Descendant-Count and Is-Descendant-Of (with the other
+        name) by the descendant index. Chains of relations such as Son/Daughter are answered by a ChainPlanner.
+
+    evaluate_relationship(name, relation, other)
+        Computes get_relationship(name, relation, other) without the cache.
+
+    relationship_view(name, relation, other)
+        Same as get_relationship() returning a RelationView evaluated lazily.
+
+    reverse_relationship(name, relation)
+        Returns the names whose relation includes name, walking the relation backwards from name.
+
+    reverse_vertices(vertices, relation)
+        Returns the vertices whose relation reaches any of vertices.
+
+    ancestry_index()
+        Returns the ancestry index of the tree, created on first use.
+
+    descendant_index()
+        Returns the descendant index of the tree, created on first use.
+
+    family_ids(vertex)
+        Returns the person ids whose relations may include vertex or change when vertex gets a parent.
+
+    invalidate(vertices)
+        Drops the cached results changed by vertices getting their parent.
+
+    evaluate_person(person, relation, other)
+        Computes the relation of a person id without the cache.
+
+    evaluate_view(person, relation, other)
+        Computes the relation of a person id without the cache as a RelationView.
+
+    load(path)
+        Loads a whole tree from a CSV or JSON-lines file in one pass.
+
+    load_rows(rows)
+        Adds vertices and their parent edges in bulk.
+
+    load_people(people, named, married)
+        Adds vertices already linked to their family, such as the vertices of a snapshot.
     """
 
-    def __init__(self):
+    def __init__(self, cache_size=CACHE_SIZE):
         """
-        Constructs GraphADT with initial dict of empty vertices and edges
+        Constructs GraphADT with an empty edge store of parent-child edges and an empty name table.
+        Every vertex, spouse vertices included, gets a person id, its index in people. ids is the single table of
+        the names of the tree, interning them to person ids, spouse names to the id of their own vertex, so that a
+        queried name is resolved with one lookup and everything past it runs on ints and vertices. The vertices
+        dict (name -> vertex) and the spouse index (spouse_name -> vertex it is married to, vertex to spouse being
+        vertex.spouse) are read-only views of ids, the role of every person id telling which names point to it.
+        :param cache_size: int
+            number of get_relationship() results cached. 0 disables the cache
         """
-        self.vertices = {}
-        self.edges = {}
+        self.edges = EdgeStore()
+        self.people = []
+        self.ids = {}
+        # _NAMED and _SPOUSE bits of every person id
+        self.roles = bytearray()
+        # name -> vertex of the name, for the names resolving to the spouse vertex of another person first
+        self.hidden = {}
+        self.named_count = 0
+        self.spouse_count = 0
+        self.vertices = VertexNames(self)
+        self.spouses = SpouseNames(self)
+        self.cache = RelationshipCache(cache_size) if cache_size > 0 else None
+        # mutation log every successful add_child() is appended to, see wal.MutationLog
+        self.log = None
+        # index of ancestors created by the first ancestry query, see ancestry_index()
+        self.ancestry = None
+        # index of descendants created by the first descendant query, see descendant_index()
+        self.descendants = None
+        # results materialized for the names watched, see watch()
+        self.materialized = None
 
     def add_vertex(self, data):
         """
@@ -103,12 +1816,117 @@ class GraphADT:
             key, value pairs of info relating to a vertex
         :return: Updated Graph obj
         """
-        self.vertices[data["name"]] = Vertex(data)
+        vertex = Vertex(data)
+        self.add_person(vertex)
+        previous = self.vertices.get(vertex.name)
+        # drops the spouse entry of a vertex being replaced so that the index never points to a stale vertex
+        if previous is not None:
+            self.drop_spouse(previous)
+        self.set_vertex(vertex)
+        if vertex.spouse is not None:
+            self.set_spouse(vertex)
+        # names of a new vertex get new person ids, with no cached results, but a replaced vertex stays a child
+        # of its parent, so any cached result may refer to it
+        if self.cache is not None and previous is not None:
+            self.cache.clear()
+        if self.materialized is not None and previous is not None:
+            self.materialized.sync((vertex.name, previous.spouse_name))
         return self
 
+    def add_person(self, vertex):
+        """
+        Gives vertex, and its spouse vertex if any, the next person ids
+        :param vertex: Vertex
+            new vertex
+        """
+        vertex.id = len(self.people)
+        self.people.append(vertex)
+        self.roles.append(0)
+        if vertex.spouse is not None and vertex.spouse.id < 0:
+            vertex.spouse.id = len(self.people)
+            self.people.append(vertex.spouse)
+            self.roles.append(0)
+
+    def set_vertex(self, vertex):
+        """
+        Makes vertex the vertex of its name in vertices, in place of the vertex of the same name if any. A spouse
+        name resolves to its spouse vertex before the vertex of the same name.
+        :param vertex: Vertex
+            vertex with a person id
+        """
+        name = vertex.name
+        ids = self.ids
+        roles = self.roles
+        person = ids.get(name)
+        if person is None:
+            ids[name] = vertex.id
+            roles[vertex.id] |= _NAMED
+            self.named_count += 1
+            return
+        previous = self.people[person] if roles[person] & _NAMED else self.hidden.get(name)
+        if previous is None:
+            self.named_count += 1
+        else:
+            roles[previous.id] &= ~_NAMED
+        roles[vertex.id] |= _NAMED
+        if not roles[person] & _SPOUSE:
+            ids[name] = vertex.id
+        elif person == vertex.id:
+            self.hidden.pop(name, None)
+        else:
+            self.hidden[name] = vertex
+
+    def set_spouse(self, vertex):
+        """
+        Adds vertex to the spouse index under the name of its spouse vertex, unless a vertex is married to that
+        name already
+        :param vertex: Vertex
+            married vertex
+        :return: Vertex
+            vertex married to the name in the spouse index
+        """
+        spouse_vertex = vertex.spouse
+        name = spouse_vertex.name
+        ids = self.ids
+        roles = self.roles
+        person = ids.get(name)
+        if person is not None and roles[person] & _SPOUSE:
+            return self.people[person].spouse
+        roles[spouse_vertex.id] |= _SPOUSE
+        self.spouse_count += 1
+        if person is not None and person != spouse_vertex.id:
+            self.hidden[name] = self.people[person]
+        ids[name] = spouse_vertex.id
+        return vertex
+
+    def drop_spouse(self, vertex):
+        """
+        Removes vertex, a vertex being replaced, from the spouse index if the index points to it under its spouse
+        name. The first other vertex married to that name takes its place, as a search of vertices would find it,
+        else the name resolves again to the vertex of that name if any.
+        :param vertex: Vertex
+            vertex being replaced, still in vertices
+        """
+        spouse_name = vertex.spouse_name
+        if spouse_name is None or self.spouses.get(spouse_name) is not vertex:
+            return
+        person = self.ids[spouse_name]
+        self.roles[person] &= ~_SPOUSE
+        self.spouse_count -= 1
+        named = self.people[person] if self.roles[person] & _NAMED else self.hidden.pop(spouse_name, None)
+        if named is None:
+            del self.ids[spouse_name]
+        else:
+            self.ids[spouse_name] = named.id
+        # vertices sharing a spouse name are rare, they are looked for only when the indexed one is replaced
+        married = next((other for other in self.vertices.values()
+                        if other is not vertex and other.spouse_name == spouse_name), None)
+        if married is not None:
+            self.set_spouse(married)
+
     def add_edge(self, source, endpoint):
         """
-        Creates an edge between source and endpoint vertices and adds this edge to edges dict of Graph obj
+        Creates an edge between source and endpoint vertices and adds this edge to the edge store of Graph obj
         Updates children of source as endpoint vertex.
         :param source : Vertex (dict)
             starting point of the edge to be created
@@ -116,10 +1934,73 @@ class GraphADT:
             end point of the edge to be created
         :return : Updated Graph obj
         """
-        self.edges[source] = Edge(source, endpoint)
-        source.children.append(endpoint)
+        attach(source, endpoint)
+        self.edges.add(source.id, endpoint.id)
+        self.invalidate((endpoint,))
+        if self.ancestry is not None:
+            if endpoint in self.ancestry.depth:
+                # endpoint was indexed as a root, with its descendants
+                self.ancestry = None
+            else:
+                self.ancestry.add(endpoint)
+        if self.descendants is not None:
+            if endpoint.children or endpoint in self.descendants.enter or source not in self.descendants.enter:
+                # only leaves added to indexed vertices are labelled in place
+                self.descendants = None
+            else:
+                self.descendants.add_leaf(endpoint)
+        if self.materialized is not None:
+            self.materialized.children_added([endpoint])
         return self
 
+    def family_ids(self, vertex):
+        """
+        Returns the person ids whose relations may include vertex, or may change when vertex gets a parent:
+        vertex, its children, parent, grandparents, siblings, uncles and aunts, their children and all their spouses.
+        :param vertex: Vertex
+            vertex whose family is to be returned
+        :return: list
+            person ids of vertices and of spouse names of the family
+        """
+        family = [vertex]
+        family.extend(vertex.children)
+        parent_vertex = vertex.parent
+        if parent_vertex is not None:
+            family.append(parent_vertex)
+            for sibling in parent_vertex.children:
+                family.append(sibling)
+                family.extend(sibling.children)
+            # a spouse who married into the tree has the parents of a merged tree
+            for grandparent in (parent_vertex.parent, parent_vertex.spouse and parent_vertex.spouse.parent):
+                if grandparent is not None:
+                    family.append(grandparent)
+                    for uncle in grandparent.children:
+                        family.append(uncle)
+                        family.extend(uncle.children)
+        persons = [item.id for item in family]
+        persons.extend(item.spouse.id for item in family if item.spouse is not None)
+        return persons
+
+    def invalidate(self, vertices):
+        """
+        Drops the cached results changed by vertices getting their parent: every result of the family_ids() of the
+        vertices, which covers the relations of RELATIONS that stay within the family of a new child, and the
+        results changed_results() finds for the other relations
+        :param vertices: sequence of Vertex
+            vertices attached to their parent
+        """
+        cache = self.cache
+        if cache is None or not cache.relations:
+            return
+        relations = tuple(RELATIONS)
+        if all(not vertex.children and vertex.spouse is None for vertex in vertices):
+            relations = beyond_family(relations)
+        if relations:
+            cache.invalidate(changed_results(vertices, relations, cache.relations))
+        # the family of the last child added to a parent covers the families of its siblings
+        for vertex in {vertex.parent: vertex for vertex in vertices}.values():
+            cache.invalidate(self.family_ids(vertex))
+
     def spouse_search(self, name):
         """
         Checks if the name is spouse_name of any the vertices and return True if found. Else False
@@ -128,14 +2009,11 @@ class GraphADT:
         :return: bool
             True if name is spouse name of any vertex else False
         """
-        for key in self.vertices:
-            if self.vertices[key].spouse_name == name:
-                return True
-        return False
+        return name in self.spouses
 
     def get_spouse_name(self, name):
         """
-        Searches and returns the vertex.name if the name is spouse_name of any vertex of Graph obj.
+        Returns the vertex.name if the name is spouse_name of any vertex of Graph obj using the spouse index.
 
         :param name: str
             spouse name of vertex to be searched
@@ -143,15 +2021,222 @@ class GraphADT:
             vertex.name whose spouse_name == name
             Else: Empty str
         """
-        for key in self.vertices:
-            if self.vertices[key].spouse_name == name:
-                return self.vertices[key].name
-        return ''
+        vertex = self.spouses.get(name)
+        if vertex is None:
+            return ''
+        return vertex.name
+
+    def load(self, path):
+        """
+        Loads a whole tree from a CSV file with a header of name,gender,spouse_name,parent or from a JSON-lines
+        file (.jsonl) of objects with the same keys. The file is streamed row by row.
+        :param path: str
+            path of the file to be loaded
+        :return: dict
+            number of rows loaded, seconds taken and rows per second
+        """
+        start = time.perf_counter()
+        with open(path, newline="") as f:
+            if path.endswith(".jsonl"):
+                rows = (json.loads(line) for line in f if line.strip())
+                count = self.load_rows((row["name"], row["gender"], row.get("spouse_name"), row.get("parent"))
+                                       for row in rows)
+            else:
+                reader = csv.reader(f)
+                columns = next(reader)
+                name, gender, spouse_name, parent = (columns.index(column)
+                                                     for column in ("name", "gender", "spouse_name", "parent"))
+                count = self.load_rows((row[name], row[gender], row[spouse_name] or None, row[parent] or None)
+                                       for row in reader)
+        seconds = time.perf_counter() - start
+        return {"rows": count, "seconds": seconds, "rows_per_sec": count / seconds if seconds else 0.0}
+
+    def load_rows(self, rows):
+        """
+        Adds vertices and their parent edges in bulk. Vertices are attached to their parent directly and the
+        edge store and cache are updated once at the end instead of per edge. A row may come before the row
+        of its parent, parent may also be the spouse_name of a vertex.
+        :param rows: iterable of tuples
+            (name, gender, spouse_name or None, parent name or None) of vertices with unique names
+        :return: int
+            number of rows loaded
+        """
+        vertex_named = self.vertices.get
+        spouse_named = self.spouses.get
+        set_vertex = self.set_vertex
+        set_spouse = self.set_spouse
+        people = self.people
+        roles = self.roles
+        ids = self.ids
+        first_person = len(people)
+        pending = []
+        count = 0
+        named = married = 0
+        # the cyclic garbage collector would rescan every vertex allocated so far many times during the load
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for name, gender, spouse_name, parent_name in rows:
+                vertex = Vertex({"name": name, "gender": gender, "spouse_name": spouse_name})
+                vertex.id = person = len(people)
+                people.append(vertex)
+                # a new name is interned directly, a known one may be hidden behind a spouse vertex
+                if name in ids:
+                    roles.append(0)
+                    set_vertex(vertex)
+                else:
+                    ids[name] = person
+                    roles.append(_NAMED)
+                    named += 1
+                if spouse_name is not None:
+                    vertex.spouse.id = person + 1
+                    people.append(vertex.spouse)
+                    if spouse_name in ids:
+                        roles.append(0)
+                        set_spouse(vertex)
+                    else:
+                        ids[spouse_name] = person + 1
+                        roles.append(_SPOUSE)
+                        married += 1
+                count += 1
+                if parent_name is None:
+                    continue
+                parent = ids.get(parent_name)
+                if parent is None:
+                    # parent row comes later in the file
+                    pending.append((parent_name, vertex))
+                    continue
+                if roles[parent] & _NAMED:
+                    attach(people[parent], vertex)
+                else:
+                    attach(vertex_named(parent_name) or spouse_named(parent_name), vertex)
+            for parent_name, vertex in pending:
+                parent_vertex = vertex_named(parent_name) or spouse_named(parent_name)
+                if parent_vertex is None:
+                    raise ValueError("Parent {} of {} not found".format(parent_name, vertex.name))
+                attach(parent_vertex, vertex)
+        finally:
+            self.named_count += named
+            self.spouse_count += married
+            if collecting:
+                gc.enable()
+        self.edges.update(itertools.islice(people, first_person, None))
+        if self.cache is not None:
+            self.cache.clear()
+        self.ancestry = None
+        self.descendants = None
+        if self.materialized is not None:
+            self.materialized.refresh()
+        return count
+
+    def load_people(self, people, named, married):
+        """
+        Adds vertices already linked to their parents, spouses and children, such as the vertices of a snapshot
+        of a merged tree, whose spouse vertices may have a parent of their own.
+        :param people: list of Vertex
+            vertices of all people in person id order, spouse vertices included
+        :param named: iterable of int
+            indexes in people of the vertices of vertices dict
+        :param married: iterable of int
+            indexes in people of the vertices of the spouse index
+        :return: int
+            number of people loaded
+        """
+        first_person = len(self.people)
+        for vertex in people:
+            vertex.id = len(self.people)
+            self.people.append(vertex)
+        self.roles.extend(bytes(len(people)))
+        for index in named:
+            self.set_vertex(people[index])
+        for index in married:
+            self.set_spouse(people[index])
+        self.edges.update(itertools.islice(self.people, first_person, None))
+        if self.cache is not None:
+            self.cache.clear()
+        self.ancestry = None
+        self.descendants = None
+        if self.materialized is not None:
+            self.materialized.refresh()
+        return len(people)
+
+    def merge(self, other):
+        """
+        Merges the people of other into the tree, parents before their children. People are identified by name:
+        a person of other whose name is a name or a spouse name of the tree is the same person, and gets the
+        parent, spouse and children other has for them. A spouse who married into the tree becomes a vertex of
+        the tree with the family other has for them. Children of a couple are attached to the vertex of the couple
+        holding their children in the tree. A conflicting person raises ValueError, the people merged before it
+        staying in the tree with the cache, indexes and materialized views updated.
+        :param other: GraphADT
+            tree to be merged, left unchanged
+        :return: int
+            number of people added to the tree
+        """
+        order = [vertex for vertex in other.vertices.values() if vertex.parent is None]
+        index = 0
+        while index < len(order):
+            order.extend(order[index].children)
+            index += 1
+        count = len(self.people)
+        try:
+            for other_vertex in order:
+                vertex = self.merge_person(other_vertex)
+                if vertex.name not in self.vertices:
+                    self.set_vertex(vertex)
+                if other_vertex.parent is not None:
+                    parent_vertex = self.people[self.ids[other_vertex.parent.name]]
+                    if vertex.parent is None:
+                        holder = children_holder(parent_vertex)
+                        attach(holder, vertex)
+                        self.edges.add(holder.id, vertex.id)
+                    elif vertex.parent is not parent_vertex and vertex.parent is not parent_vertex.spouse:
+                        raise ValueError("{} has parent {} and {}".format(vertex.name, vertex.parent.name,
+                                                                          parent_vertex.name))
+                if other_vertex.spouse is not None:
+                    spouse_vertex = self.merge_person(other_vertex.spouse)
+                    if vertex.spouse is None and spouse_vertex.spouse is None:
+                        marry(vertex, spouse_vertex)
+                        # children of the spouse vertex may have been moved to vertex
+                        self.edges.update(vertex.children)
+                        self.set_spouse(vertex)
+                    elif vertex.spouse is not spouse_vertex:
+                        raise ValueError("{} and {} are married to others".format(vertex.name, spouse_vertex.name))
+        finally:
+            # people merged before a conflict stay in the tree
+            if self.cache is not None:
+                self.cache.clear()
+            self.ancestry = None
+            self.descendants = None
+            if self.materialized is not None:
+                self.materialized.refresh()
+        return len(self.people) - count
+
+    def merge_person(self, other_vertex):
+        """
+        Returns the vertex of the tree of the same name as a vertex of another tree, created if the name is not
+        a name or a spouse name of the tree
+        :param other_vertex: Vertex
+            vertex of another tree
+        :return: Vertex
+        """
+        person = self.ids.get(other_vertex.name)
+        if person is None:
+            vertex = Vertex({"name": other_vertex.name, "gender": other_vertex.gender, "spouse_name": None})
+            self.add_person(vertex)
+            self.ids[vertex.name] = vertex.id
+            return vertex
+        vertex = self.people[person]
+        if vertex.gender != other_vertex.gender:
+            raise ValueError("{} is {} and {}".format(vertex.name, vertex.gender, other_vertex.gender))
+        return vertex
 
     def add_child(self, mother_name, name, gender):
         """
         creates a vertex(name) and edge between mother_name and name with given gender only if mother_name
-        is a valid female vertex with spouse or if mother_name is spouse of a valid male vertex.
+        is a valid female vertex with spouse or if mother_name is spouse of a valid male vertex. The child is
+        attached to the vertex of the couple holding their children.
+        Successful additions are appended to the mutation log if one is attached.
 
         :param mother_name: str
             parent name to add the child to
@@ -163,13 +2248,16 @@ class GraphADT:
             status of child addition to mother_name(1/-1/0)
         """
         # checks if mother_name is in vertices dict and gender of mother_name is Male or not
-        if mother_name in self.vertices and self.vertices[mother_name].gender == 'Male':
+        mother = self.vertices.get(mother_name)
+        if mother is not None and mother.gender == 'Male':
             return -1
-        elif mother_name in self.vertices:
+        elif mother is not None:
             # checks if spouse of mother exists or not and adds child
-            if self.vertices[mother_name].spouse_name is not None:
+            if mother.spouse_name is not None:
                 self.add_vertex(data={"name": name, "spouse_name": None, "gender": gender})
-                self.add_edge(self.vertices[mother_name], self.vertices[name])
+                self.add_edge(children_holder(self.vertices[mother_name]), self.vertices[name])
+                if self.log is not None:
+                    self.log.append(mother_name, name, gender)
                 return 1
             else:
                 return -1
@@ -179,208 +2267,641 @@ class GraphADT:
                 return -1
             else:
                 self.add_vertex(data={"name": name, "spouse_name": None, "gender": gender})
-                self.add_edge(self.vertices[self.get_spouse_name(mother_name)], self.vertices[name])
+                spouse_name = self.get_spouse_name(mother_name)
+                # the child replaced the only vertex married to mother_name
+                if not spouse_name:
+                    return -1
+                self.add_edge(children_holder(self.vertices[spouse_name]), self.vertices[name])
+                if self.log is not None:
+                    self.log.append(mother_name, name, gender)
                 return 1
         return 0
 
-    def get_relationship(self, name, relation):
+    def add_children(self, rows):
+        """
+        Adds children in bulk, with the same statuses and tree as add_child() called for each row in order.
+        Every mother name is resolved once per batch to the vertex of the couple holding their children, or to
+        the status of a failed addition, and the children are attached directly. The edge store, the cache and
+        the descendant index are updated once for the whole batch, the ancestry index indexes the children when
+        they are queried.
+        Successful additions are appended to the mutation log if one is attached.
+
+        :param rows: iterable of tuples
+            (mother_name, name, gender) of children to be added
+        :return: array of int
+            status of every child addition (1/-1/0), in the order of rows
+        """
+        vertices = self.vertices
+        set_vertex = self.set_vertex
+        people = self.people
+        roles = self.roles
+        log = self.log
+        statuses = array("b")
+        # mother name -> vertex holding the children of the couple, or status of the addition
+        holders = {}
+        children = []
+        for mother_name, name, gender in rows:
+            if name in vertices:
+                # a child replacing a vertex of the same name changes the family of the replaced vertex
+                self.children_added(children)
+                children = []
+                holders.clear()
+                statuses.append(self.add_child(mother_name, name, gender))
+                continue
+            holder = holders.get(mother_name)
+            if holder is None:
+                holder = holders[mother_name] = self.resolve_mother(mother_name)
+            if holder.__class__ is int:
+                statuses.append(holder)
+                continue
+            vertex = Vertex({"name": name, "gender": gender, "spouse_name": None})
+            vertex.id = len(people)
+            people.append(vertex)
+            roles.append(0)
+            set_vertex(vertex)
+            attach(holder, vertex)
+            children.append(vertex)
+            # the child has no spouse and cannot be a mother
+            holders[name] = -1
+            if log is not None:
+                log.append(mother_name, name, gender)
+            statuses.append(1)
+        self.children_added(children)
+        return statuses
+
+    def resolve_mother(self, mother_name):
+        """
+        Resolves mother_name as add_child() does
+        :param mother_name: str
+            parent name to add children to
+        :return: Vertex or int
+            vertex of the couple holding their children, or status of a failed child addition (-1/0)
+        """
+        vertex = self.vertices.get(mother_name)
+        if vertex is not None:
+            if vertex.gender == 'Male' or vertex.spouse_name is None:
+                return -1
+            return children_holder(vertex)
+        vertex = self.spouses.get(mother_name)
+        if vertex is not None:
+            if vertex.gender == "Female":
+                return -1
+            return children_holder(vertex)
+        return 0
+
+    def children_added(self, children):
+        """
+        Updates the edge store, the cache, the descendant index and the materialized views after new leaves were
+        attached to their parent
+        :param children: list of Vertex
+            new vertices, in the order they were attached
+        """
+        if not children:
+            return
+        self.edges.update(children)
+        self.invalidate(children)
+        if self.descendants is not None:
+            if all(child.parent in self.descendants.enter for child in children):
+                self.descendants.add_leaves(children)
+            else:
+                self.descendants = None
+        if self.materialized is not None:
+            self.materialized.children_added(children)
+
+    def watch(self, names, relations=None):
+        """
+        Materializes the relations of names, so that get_relationship() of a watched name reads its result without
+        walking the tree. Adding a child evaluates again only the results of watched names it changes, loading or
+        merging people evaluates every result again. See MaterializedViews.stats() for their memory and the number
+        of results changed per child addition.
+        :param names: iterable of str
+            names or spouse names to be watched
+        :param relations: iterable of str or None
+            relations of RELATIONS to be materialized when the views are created, all of them if None
+        :return: int
+            number of names watched, names not found being skipped
+        """
+        if self.materialized is None:
+            self.materialized = MaterializedViews(self, relations)
+        return self.materialized.watch(names)
+
+    def get_relationship(self, name, relation, other=None):
+        """
+        For the given relation, returns a result array with names of vertices that match the relation
+        between all vertices and name vertex. Results of registered relations are served from the cache if enabled.
+        :param name: str
+            name of vertex whose relation to be returned
+        :param relation: str
+            relation name
+        :param other: str or None
+            second name of the relations between 2 names, Common-Ancestor and Kinship
+        :return: None or list
+            None or list containing relation names of name
+        """
+        person = self.ids.get(name)
+        if person is None:
+            # returns None if name is not a vertex or is not a spouse name of any vertex
+            return
+        if self.materialized is not None:
+            result = self.materialized.get(person, relation)
+            if result is not None:
+                return list(result)
+        if self.cache is None or relation not in RELATIONS:
+            return self.evaluate_person(person, relation, other)
+        key = (person, relation)
+        result = self.cache.get(key, _NOT_CACHED)
+        if result is _NOT_CACHED:
+            result = self.evaluate_person(person, relation)
+            self.cache.put(key, result)
+        # callers get their own copy of the cached list
+        return list(result)
+
+    def evaluate_relationship(self, name, relation, other=None):
         """
-        For the given relation, appends a result array with names of vertices that match the relation
-        between all vertices and name vertex.
+        Computes get_relationship(name, relation, other) without the cache
         :param name: str
             name of vertex whose relation to be returned
         :param relation: str
             relation name
+        :param other: str or None
+            second name of the relations between 2 names
         :return: None or list
             None or list containing relation names of name
         """
-        result = []
-        # returns None if name is not a vertex or is not a spouse name of any vertex
-        if name not in self.vertices and not self.spouse_search(name):
+        person = self.ids.get(name)
+        if person is None:
             return
+        return self.evaluate_person(person, relation, other)
+
+    def relationship_view(self, name, relation, other=None):
+        """
+        Same as get_relationship(), returning a lazy view of the result: a cached result is viewed without being
+        copied, any other result is evaluated as it is iterated and is not cached
+        :param name: str
+            name of vertex whose relation to be returned
+        :param relation: str
+            relation name
+        :param other: str or None
+            second name of the relations between 2 names
+        :return: None or RelationView
+            None or view of the relation names of name
+        """
+        person = self.ids.get(name)
+        if person is None:
+            return
+        if self.materialized is not None:
+            result = self.materialized.get(person, relation)
+            if result is not None:
+                return RelationView([result], NAMES)
+        if self.cache is not None and relation in RELATIONS:
+            result = self.cache.get((person, relation), _NOT_CACHED)
+            if result is not _NOT_CACHED:
+                return RelationView([result], NAMES)
+        return self.evaluate_view(person, relation, other)
+
+    def evaluate_person(self, person, relation, other=None):
+        """
+        Computes the relation of a person id without the cache, as the list of names of evaluate_view(). Relations
+        of RELATIONS are walked straight into lists, which is faster than through a view when every name is needed.
+        :param person: int
+            person id of ids
+        :param relation: str
+            relation name
+        :param other: str or None
+            second name of the relations between 2 names
+        :return: None or list
+            None if other is not found, else list containing relation names of the person
+        """
+        paths = RELATIONS.get(relation)
+        if paths is None:
+            view = self.evaluate_view(person, relation, other)
+            return None if view is None else list(view)
+        vertex = self.people[person]
+        result = paths[0].evaluate(vertex)
+        if paths[1] is not None and vertex.spouse is not None:
+            # the children of a couple are reached from both spouses
+            spouse_result = paths[1].evaluate(vertex.spouse)
+            if not result:
+                return spouse_result
+            reached = set(result)
+            result.extend(name for name in spouse_result if name not in reached)
+        return result
+
+    def evaluate_view(self, person, relation, other=None):
+        """
+        Computes the relation of a person id without the cache. The relation is looked up in RELATIONS and walked
+        from the vertex of the person, then from its spouse for the names not reached yet, or answered by the
+        ancestry or descendant index.
+        :param person: int
+            person id of ids
+        :param relation: str
+            relation name
+        :param other: str or None
+            second name of the relations between 2 names
+        :return: None or RelationView
+            None if other is not found, else view of the relation names of the person
+        """
+        vertex = self.people[person]
+        paths = RELATIONS.get(relation)
+        if paths is None:
+            if CHAIN in relation:
+                return ChainPlanner(self).view(person, relation)
+            # a spouse vertex without a vertex of its own name married into the tree and is not part of it
+            married_in = not self.roles[person] & _NAMED
+            if relation in DESCENDANTS or relation == DESCENDANT_COUNT or relation == IS_DESCENDANT:
+                result = self.evaluate_descendants(vertex.spouse if married_in else vertex, married_in, relation,
+                                                   other)
+            else:
+                # spouses have no ancestors in the tree
+                result = self.evaluate_ancestry(None if married_in else vertex, relation, other)
+            if result is None or result.__class__ is RelationView:
+                return result
+            return RelationView([result], NAMES)
+        path, spouse_path = paths
+        view = RelationView(path.groups(vertex), SPOUSE_NAMES if path.spouses else VERTICES)
+        if spouse_path is not None and vertex.spouse is not None:
+            # the children of a couple are reached from both spouses
+            view.extend(spouse_path.groups(vertex.spouse), SPOUSE_NAMES if spouse_path.spouses else VERTICES)
+        return view
+
+    def reverse_relationship(self, name, relation):
+        """
+        Returns the names whose given relation includes name, as get_relationship() of every name would, walking
+        the relation backwards from the vertex of name so that the cost follows the size of the result and not
+        the size of the tree. Relations of RELATIONS, of DESCENDANTS, Ancestor-N and their chains are reversed.
+        :param name: str
+            name found in the results
+        :param relation: str
+            relation name or chain of relation names
+        :return: None or list
+            None if name is not found, else list containing the names that have name as relation
+        """
+        person = self.ids.get(name)
+        if person is None:
+            return
+        vertices = [self.people[person]]
+        for part in reversed(relation.split(CHAIN)):
+            vertices = self.reverse_vertices(vertices, part)
+            if not vertices:
+                return []
+        # vertices replaced by a vertex of the same name are not queried by name
+        people, ids = self.people, self.ids
+        return list(dict.fromkeys(vertex.name for vertex in vertices if people[ids.get(vertex.name, -1)] is vertex))
+
+    def reverse_vertices(self, vertices, relation):
+        """
+        Returns the vertices whose relation reaches any of vertices, as evaluate_view() of every vertex would
+        :param vertices: sequence of Vertex
+            vertices reached, each once
+        :param relation: str
+            relation name
+        :return: list
+            vertices the relation reaches any of vertices from, each once, empty if the relation is not reversed
+        """
+        paths = RELATIONS.get(relation)
+        if paths is not None:
+            path, spouse_path = paths
+            reached = path.sources(vertices)
+            if spouse_path is not None:
+                # spouse paths are walked from the spouse of the vertex queried
+                spouses = [item.spouse for item in spouse_path.sources(vertices) if item.spouse is not None]
+                if spouses:
+                    reached = list(dict.fromkeys(itertools.chain(reached, spouses)))
+            return reached
+        if relation in DESCENDANTS:
+            # ancestors of the vertices and their spouses
+            gender = DESCENDANTS[relation]
+            reached = {}
+            for vertex in vertices:
+                if gender is not None and vertex.gender != gender:
+                    continue
+                ancestor = vertex.parent
+                while ancestor is not None and ancestor not in reached:
+                    reached[ancestor] = None
+                    if ancestor.spouse is not None:
+                        reached[ancestor.spouse] = None
+                    ancestor = ancestor.parent
+            return list(reached)
+        generations = ancestor_generations(relation)
+        if generations is None:
+            return []
+        # descendants the given number of generations below the vertices, through the vertices holding children
+        for _ in range(generations):
+            vertices = [child for vertex in vertices for child in vertex.children if child.parent is vertex]
+            if not vertices:
+                break
+        return vertices
+
+    def ancestry_index(self):
+        """
+        :return: AncestryIndex
+            ancestry index of the tree, created empty on first use and filled as vertices are queried
+        """
+        if self.ancestry is None:
+            self.ancestry = AncestryIndex()
+        return self.ancestry
+
+    def evaluate_ancestry(self, vertex, relation, other=None):
+        """
+        Answers the relations of the ancestry index: Ancestor-N, Common-Ancestor and Kinship
+        :param vertex: Vertex or None
+            vertex of the name queried, None for a spouse name
+        :param relation: str
+            relation name
+        :param other: str or None
+            second name of Common-Ancestor and Kinship
+        :return: None or list
+            None if other is not found, else list containing the ancestor name or the degree of kinship
+        """
+        if relation == COMMON_ANCESTOR or relation == KINSHIP:
+            if other is None:
+                return []
+            other_person = self.ids.get(other)
+            if other_person is None:
+                return
+            other_vertex = self.people[other_person]
+            if self.vertices.get(other) is not other_vertex:
+                other_vertex = None
+            if vertex is None or other_vertex is None:
+                return []
+            if relation == KINSHIP:
+                degree = self.ancestry_index().kinship(vertex, other_vertex)
+                return [] if degree is None else [str(degree)]
+            ancestor = self.ancestry_index().common_ancestor(vertex, other_vertex)
         else:
-            if relation == 'Paternal-Uncle':
-                # Spouses of vertex does not have Paternal-Uncle
-                if self.spouse_search(name):
-                    return result
-                else:
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    # vertex of name's parent
-                    direct_parent = name_vertex.incident_edges[0]
-                    # Father's brother is Paternal Uncle and not Mother's
-                    if direct_parent.gender == 'Female':
-                        return result
-                    else:
-                        for item in direct_parent.incident_edges[0].children:
-                            if item.gender == 'Male' and item.name != direct_parent.name:
-                                result.append(item.name)
-                        return result
-            elif relation == 'Maternal-Uncle':
-                # Spouses of vertex does not have Maternal-Uncle
-                if self.spouse_search(name):
-                    return result
-                else:
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    # Mother's brother is Maternal Uncle and not Father's
-                    if direct_parent.gender == 'Male':
-                        return result
-                    else:
-                        for item in direct_parent.incident_edges[0].children:
-                            if item.gender == 'Male' and item.name != direct_parent.name:
-                                result.append(item.name)
-                        return result
-            elif relation == 'Paternal-Aunt':
-                # Spouses of vertex does not have Paternal-Aunt
-                if self.spouse_search(name):
-                    return result
-                else:
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    # Father's sister is Paternal Aunt and not Mother's
-                    if direct_parent.gender == 'Female':
-                        return result
-                    else:
-                        for item in direct_parent.incident_edges[0].children:
-                            if item.gender == 'Female' and item.name != direct_parent.name:
-                                result.append(item.name)
-                        return result
-            elif relation == 'Maternal-Aunt':
-                # Spouses of vertex does not have Maternal-Aunt
-                if self.spouse_search(name):
-                    return result
-                else:
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    # Mother's sister is Maternal Aunt and not Father's
-                    if direct_parent.gender == 'Male':
-                        return result
+            generations = ancestor_generations(relation)
+            if generations is None or vertex is None:
+                return []
+            ancestor = self.ancestry_index().ancestor(vertex, generations)
+        return [] if ancestor is None else [ancestor.name]
+
+    def descendant_index(self):
+        """
+        :return: DescendantIndex
+            descendant index of the tree, labelled on first use and again if a vertex is not labelled
+        """
+        if self.descendants is None:
+            self.descendants = DescendantIndex(self.vertices)
+        return self.descendants
+
+    def evaluate_descendants(self, vertex, spouse, relation, other=None):
+        """
+        Answers the relations of the descendant index: Descendants, Male-Descendants, Female-Descendants,
+        Descendant-Count and Is-Descendant-Of
+        :param vertex: Vertex
+            vertex of the name queried, or vertex the spouse name queried is married to
+        :param spouse: bool
+            True if the name queried is a spouse name, whose descendants are those of the vertex
+        :param relation: str
+            relation name
+        :param other: str or None
+            second name of Is-Descendant-Of
+        :return: None, list or RelationView
+            None if other is not found, else list containing their number or YES or NO, or view of the
+            descendants
+        """
+        index = self.descendant_index()
+        if vertex not in index.enter:
+            # vertex was added as a new root
+            index.relabel()
+        if relation == IS_DESCENDANT:
+            if other is None:
+                return []
+            other_person = self.ids.get(other)
+            if other_person is None:
+                return
+            other_vertex = self.people[other_person]
+            if self.vertices.get(other) is not other_vertex:
+                other_vertex = other_vertex.spouse
+            if other_vertex not in index.enter:
+                index.relabel()
+            # spouses are not descendants of anyone in the tree
+            return ["YES" if not spouse and index.is_descendant(vertex, other_vertex) else "NO"]
+        vertex = children_holder(vertex)
+        if vertex not in index.enter:
+            index.relabel()
+        if relation == DESCENDANT_COUNT:
+            return [str(index.count(vertex))]
+        return RelationView([index.descendants(vertex, DESCENDANTS[relation])])
+
+
+class ChainPlanner:
+    """
+    Class to represent a planner of chained relation expressions such as 'Son/Daughter', the daughters of the
+    sons of a name, or 'Siblings/Maternal-Aunt'. A chain is compiled once into its relations, then run a set at a
+    time: the steps of every relation are walked from all the people reached by the relations before it at once,
+    deduplicated after every step, instead of one query per intermediate person. Siblings reach their mother
+    once, so that the sisters of their mother are walked once. Relations of RELATIONS, of DESCENDANTS and
+    Ancestor-N can be chained.
+
+    People reached by every prefix of a chain from a person are kept, so that chains sharing a prefix reuse it.
+    A planner is valid until the tree is changed.
+
+    Attributes:
+        ftree : GraphADT
+            tree the chains are run against
+        plans : dict
+            chain -> tuple of relation names, None if a relation cannot be chained
+        prefixes : dict
+            (person id, tuple of relation names) -> vertices reached, in the order they are first reached
+
+    Methods:
+        compile(chain):
+            Returns the relations of a chain
+        hop(vertices, relation):
+            Returns the vertices reached by a relation from a set of vertices
+        reach(person, relations):
+            Returns the vertices reached by relations from a person id
+        view(person, chain):
+            Returns the names reached by a chain from a person id
+        relationship_view(name, chain):
+            Same as GraphADT.relationship_view() for a chain
+    """
+
+    def __init__(self, ftree):
+        """
+        :param ftree: GraphADT
+            tree the chains are run against
+        """
+        self.ftree = ftree
+        self.plans = {}
+        self.prefixes = {}
+
+    def compile(self, chain):
+        """
+        :param chain: str
+            relation names separated by CHAIN
+        :return: tuple or None
+            relation names of chain in the order they are applied, None if one of them cannot be chained
+        """
+        if chain in self.plans:
+            return self.plans[chain]
+        relations = tuple(chain.split(CHAIN))
+        if not all(relation in RELATIONS or relation in DESCENDANTS or ancestor_generations(relation) is not None
+                   for relation in relations):
+            relations = None
+        self.plans[chain] = relations
+        return relations
+
+    def hop(self, vertices, relation):
+        """
+        :param vertices: sequence of Vertex
+            vertices the relation is applied to, each once
+        :param relation: str
+            relation name that can be chained
+        :return: list
+            vertices reached by relation from any of vertices, the spouse vertices of spouse names, each once:
+            those reached by the path of the relation, then those reached by its spouse path
+        """
+        paths = RELATIONS.get(relation)
+        if paths is None:
+            # relations of the indexes are answered vertex by vertex
+            reached = []
+            vertex_names = self.ftree.vertices
+            for vertex in vertices:
+                for groups, kind in self.ftree.evaluate_view(vertex.id, relation).parts:
+                    if kind == VERTICES:
+                        reached.extend(itertools.chain.from_iterable(groups))
                     else:
-                        for item in direct_parent.incident_edges[0].children:
-                            if item.gender == 'Female' and item.name != direct_parent.name:
-                                result.append(item.name)
-                        return result
-            elif relation == 'Son':
-                # if name is vertex.spouse_name
-                if self.spouse_search(name):
-                    name_vertex = self.vertices[self.get_spouse_name(name)]
-                else:
-                    # if name is vertex name
-                    name_vertex = self.vertices[name]
-                for item in name_vertex.children:
-                    if item.gender == 'Male':
-                        result.append(item.name)
-                return result
-            elif relation == 'Daughter':
-                # if name is vertex.spouse_name
-                if self.spouse_search(name):
-                    name_vertex = self.vertices[self.get_spouse_name(name)]
-                else:
-                    # if name is vertex name
-                    name_vertex = self.vertices[name]
-                for item in name_vertex.children:
-                    if item.gender == 'Female':
-                        result.append(item.name)
-                return result
-            elif relation == 'Siblings':
-                # Spouses of vertex does not have Siblings
-                if self.spouse_search(name):
-                    return result
-                else:
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    for item in direct_parent.children:
-                        result.append(item.name)
-                    result.remove(name_vertex.name)
-                    return result
-            elif relation == 'Sister':
-                # Spouses of vertex does not have Siblings
-                if self.spouse_search(name):
-                    return result
-                else:
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    for item in direct_parent.children:
-                        if item.gender == 'Female' and item.name != name:
-                            result.append(item.name)
-                    return result
-            elif relation == 'Brother':
-                # Spouses of vertex does not have Siblings
-                if self.spouse_search(name):
-                    return result
-                else:
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    for item in direct_parent.children:
-                        if item.gender == 'Male' and item.name != name:
-                            result.append(item.name)
-                    return result
-            elif relation == 'Sister-In-Law':
-                # For Spouse's Sister
-                if self.spouse_search(name):
-                    result = self.get_relationship(self.get_spouse_name(name), "Sister")
-                else:
-                    # For Brother's Spouse
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    for item in direct_parent.children:
-                        if item.name != name_vertex.name and item.gender == 'Male' and item.spouse_name is not None:
-                            result.append(item.spouse_name)
-                return result
-            elif relation == 'Brother-In-Law':
-                # For Spouse's Brother
-                if self.spouse_search(name):
-                    result = self.get_relationship(self.get_spouse_name(name), "Brother")
-                else:
-                    # For Sister's Spouse
-                    name_vertex = self.vertices[name]
-                    # Checking if parent of name is null or not
-                    if not bool(name_vertex.incident_edges):
-                        return result
-                    direct_parent = name_vertex.incident_edges[0]
-                    for item in direct_parent.children:
-                        if item.name != name_vertex.name and item.gender == 'Female' and item.spouse_name is not None:
-                            result.append(item.spouse_name)
-                return result
-        return result
+                        # names of the ancestry index are names of vertices
+                        reached.extend(vertex_names[name] for name in itertools.chain.from_iterable(groups)
+                                       if name in vertex_names)
+            return list(dict.fromkeys(reached))
+        path, spouse_path = paths
+        reached = path.walk(vertices)
+        if spouse_path is not None:
+            spouses = [vertex.spouse for vertex in vertices if vertex.spouse is not None]
+            if spouses:
+                spouse_reached = spouse_path.walk(spouses)
+                # the children lists of a couple are shared
+                if spouse_reached is not reached:
+                    reached = itertools.chain(reached, spouse_reached)
+        return list(dict.fromkeys(reached))
 
+    def reach(self, person, relations):
+        """
+        :param person: int
+            person id of GraphADT.ids the chain starts from
+        :param relations: tuple
+            relation names applied in order
+        :return: sequence
+            vertices reached, each once, in the order they are first reached
+        """
+        prefixes = self.prefixes
+        vertices = (self.ftree.people[person],)
+        for length in range(1, len(relations) + 1):
+            if not vertices:
+                return ()
+            key = (person, relations[:length])
+            reached = prefixes.get(key)
+            if reached is None:
+                reached = prefixes[key] = self.hop(vertices, relations[length - 1])
+            vertices = reached
+        return vertices
 
-def print_child_addition(child_addition):
+    def view(self, person, chain):
+        """
+        :param person: int
+            person id of GraphADT.ids
+        :param chain: str
+            relation names separated by CHAIN
+        :return: RelationView
+            view of the names reached, empty if a relation cannot be chained
+        """
+        relations = self.compile(chain)
+        if relations is None:
+            return RelationView([()])
+        return RelationView([self.reach(person, relations)])
+
+    def relationship_view(self, name, chain):
+        """
+        :param name: str
+            name the chain starts from
+        :param chain: str
+            relation names separated by CHAIN
+        :return: None or RelationView
+            None if name is not found, else view of the names reached
+        """
+        person = self.ftree.ids.get(name)
+        if person is None:
+            return
+        return self.view(person, chain)
+
+
+# number of output lines buffered by process_commands() before they are written out
+FLUSH_SIZE = 4096
+# number of names from which a result is streamed to the output by process_commands(), and number of names
+# written at a time
+STREAM_PAGE = 4096
+# minimum number of consecutive relationship queries answered by worker processes in process_commands()
+PARALLEL_SEGMENT = 8192
+# number of relationship queries sent to a worker process at once
+PARALLEL_CHUNK = 1024
+# tree inherited by the forked worker processes of process_commands()
+_worker_tree = None
+
+
+def format_child_addition(child_addition):
     """
-    Prints respective strings for respective child_addition values of 1, 0, -1
+    Returns respective strings for respective child_addition values of 1, 0, -1
     :param child_addition: int
         ADD_CHILD status (1 or 0 or -1)
+    :return: str or None
+        output line without line break, None for any other value
     """
     if child_addition == 1:
-        print("CHILD_ADDITION_SUCCEEDED")
+        return "CHILD_ADDITION_SUCCEEDED"
     elif child_addition == -1:
-        print("CHILD_ADDITION_FAILED")
+        return "CHILD_ADDITION_FAILED"
     elif child_addition == 0:
-        print("PERSON_NOT_FOUND")
+        return "PERSON_NOT_FOUND"
+
+
+def format_relationship(res):
+    """
+    Returns elements of res joined with a whitespace. if res is empty, NONE and if none, PERSON_NOT_FOUND
+    :param res: <list> or RelationView containing elements or None. A view is joined as it is iterated.
+    :return: str
+        output line without line break
+    """
+    if res is None:
+        return "PERSON_NOT_FOUND"
+    elif not res:
+        return "NONE"
+    return " ".join(map(str, res)) + " "
+
+
+def write_relationship(out, res, page_size=STREAM_PAGE):
+    """
+    Writes the output line of res to out a page of names at a time, as format_relationship() formats it, so that
+    a large result is never joined into one string
+    :param out: file obj
+        writer of the output
+    :param res: <list> or RelationView containing elements or None.
+    :param page_size: int
+        number of names written at a time
+    """
+    if not res:
+        out.write(format_relationship(res) + "\n")
+        return
+    names = iter(res)
+    page = list(itertools.islice(names, page_size))
+    while page:
+        page.append("")
+        out.write(" ".join(page))
+        page = list(itertools.islice(names, page_size))
+    out.write("\n")
+
+
+def print_child_addition(child_addition):
+    """
+    Prints respective strings for respective child_addition values of 1, 0, -1
+    :param child_addition: int
+        ADD_CHILD status (1 or 0 or -1)
+    """
+    line = format_child_addition(child_addition)
+    if line is not None:
+        print(line)
 
 
 def print_relationship(res):
@@ -388,87 +2909,407 @@ def print_relationship(res):
     Prints elements of list res with a whitespace. if res is empty, prints NONE and if none, prints PERSON_NOT_FOUND
     :param res: <list> containing string elements or None.
     """
-    if res is None:
-        print("PERSON_NOT_FOUND")
-    elif len(res) == 0:
-        print("NONE")
-    else:
-        for item in res:
-            print(item, end=" ")
-        print("")
+    print(format_relationship(res))
+
+
+# command names of the input file
+ADD_CHILD = "ADD_CHILD"
+GET_RELATIONSHIP = "GET_RELATIONSHIP"
+# 'GET_REVERSE_RELATIONSHIP name relation_name' returns the names whose relation includes name
+GET_REVERSE_RELATIONSHIP = "GET_REVERSE_RELATIONSHIP"
+COMMANDS = {ADD_CHILD: ADD_CHILD, GET_RELATIONSHIP: GET_RELATIONSHIP,
+            GET_REVERSE_RELATIONSHIP: GET_REVERSE_RELATIONSHIP}
+# bytes of the input file read at a time by CommandParser.parse_stream()
+CHUNK_SIZE = 1 << 20
+
+
+class CommandParser:
+    """
+    Class to represent a parser of the lines of an input file into command tuples. Command names and relation
+    names are interned to the constants of this module and the keys of RELATIONS, so that the tuples share the
+    same str objects. A name made of several words is resolved by the longest run of words that is a name or a
+    spouse name of the tree, else by the words before the relation name. Without a tree, the child name of
+    ADD_CHILD is the word before the gender.
+
+    Attributes:
+        ftree : GraphADT or None
+            tree whose names are matched, None to resolve names by the relation names only
+        relations : dict
+            relation name -> interned relation name
+
+    Methods:
+        parse(lines):
+            Returns a generator of the command tuples of lines
+        parse_stream(f, chunk_size):
+            Returns a generator of the command tuples of a binary file read in chunks
+    """
+
+    def __init__(self, ftree=None):
+        """
+        :param ftree: GraphADT or None
+            tree whose names are matched
+        """
+        self.ftree = ftree
+        self.relations = {relation: relation for relation in itertools.chain(
+            RELATIONS, DESCENDANTS, (COMMON_ANCESTOR, KINSHIP, DESCENDANT_COUNT, IS_DESCENDANT))}
+
+    def _is_name(self, name):
+        """
+        :return: bool
+            True if name is a name or a spouse name of the tree
+        """
+        return self.ftree is not None and name in self.ftree.ids
+
+    def _is_relation(self, word):
+        """
+        :return: bool
+            True if word is a relation name
+        """
+        if CHAIN in word:
+            return all(map(self._is_relation, word.split(CHAIN)))
+        return word in self.relations or word in RELATIONS or word.startswith(ANCESTOR)
+
+    def _split_name(self, words, end):
+        """
+        Splits the longest name of the tree off words[1:end]
+        :return: int
+            index of the first word after the name, 2 if no run of words is a name
+        """
+        for index in range(end, 2, -1):
+            if self._is_name(" ".join(words[1:index])):
+                return index
+        return 2
+
+    def _parse_words(self, words):
+        """
+        Parses the words of a line holding more words than its command has arguments
+        :return: tuple or None
+            command tuple, None if the line is not a command
+        """
+        command = COMMANDS.get(words[0])
+        if command is ADD_CHILD and len(words) > 4 and self.ftree is None:
+            return command, " ".join(words[1:-2]), words[-2], words[-1]
+        if command is ADD_CHILD and len(words) > 4:
+            # the gender is the last word, the child name is what is left after the mother name
+            index = self._split_name(words, len(words) - 2)
+            return command, " ".join(words[1:index]), " ".join(words[index:-1]), words[-1]
+        if (command is GET_RELATIONSHIP or command is GET_REVERSE_RELATIONSHIP) and len(words) > 3:
+            index = self._split_name(words, len(words) - 1)
+            if index == 2 and not self._is_name(words[1]):
+                index = next((index for index in range(2, len(words)) if self._is_relation(words[index])), 2)
+            relation = self.relations.get(words[index], words[index])
+            if index + 1 < len(words):
+                return command, " ".join(words[1:index]), relation, " ".join(words[index + 1:])
+            return command, " ".join(words[1:index]), relation
+
+    def parse(self, lines):
+        """
+        Parses lines lazily one line at a time. Blank lines, unknown commands and commands missing arguments are
+        skipped.
+        :param lines: iterable of str
+            lines of the format 'ADD_CHILD mother_name child_name gender', 'GET_RELATIONSHIP name relation_name'
+            or 'GET_RELATIONSHIP name relation_name other_name' for the relations between 2 names, or
+            'GET_REVERSE_RELATIONSHIP name relation_name'
+        :return: generator of tuples
+            ('ADD_CHILD', mother_name, child_name, gender), ('GET_RELATIONSHIP', name, relation_name),
+            ('GET_RELATIONSHIP', name, relation_name, other_name) or ('GET_REVERSE_RELATIONSHIP', name, relation_name)
+        """
+        get_relation = self.relations.get
+        for words in map(str.split, lines):
+            # lines of single word names take no name lookup
+            if len(words) == 3 and words[0] == GET_RELATIONSHIP:
+                yield GET_RELATIONSHIP, words[1], get_relation(words[2], words[2])
+            elif len(words) == 4 and words[0] == ADD_CHILD:
+                yield ADD_CHILD, words[1], words[2], words[3]
+            elif len(words) == 3 and words[0] == GET_REVERSE_RELATIONSHIP:
+                yield GET_REVERSE_RELATIONSHIP, words[1], get_relation(words[2], words[2])
+            elif len(words) > 3:
+                command = self._parse_words(words)
+                if command is not None:
+                    yield command
+
+    def parse_stream(self, f, chunk_size=CHUNK_SIZE):
+        """
+        Parses a file opened in binary mode, read chunk_size bytes at a time. Only whole lines of a chunk are
+        decoded, the bytes after its last line break are carried over to the next chunk.
+        :param f: file obj
+            binary reader of the input file
+        :param chunk_size: int
+            number of bytes read at a time
+        :return: generator of tuples
+            command tuples of parse()
+        """
+        rest = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            end = chunk.rfind(b"\n") + 1
+            if not end:
+                rest += chunk
+                continue
+            yield from self.parse((rest + chunk[:end] if rest else chunk[:end]).decode().splitlines())
+            rest = chunk[end:]
+        if rest:
+            yield from self.parse(rest.decode().splitlines())
+
+
+def parse_commands(lines, ftree=None):
+    """
+    Parses lines of an input file into command tuples, lazily one line at a time.
+    Blank lines and unknown commands are skipped.
+    :param lines: iterable of str
+        lines of the format 'ADD_CHILD mother_name child_name gender', 'GET_RELATIONSHIP name relation_name',
+        'GET_RELATIONSHIP name relation_name other_name' for the relations between 2 names or
+        'GET_REVERSE_RELATIONSHIP name relation_name'
+    :param ftree: GraphADT or None
+        tree whose names made of several words are matched
+    :return: generator of tuples
+        ('ADD_CHILD', mother_name, child_name, gender), ('GET_RELATIONSHIP', name, relation_name),
+        ('GET_RELATIONSHIP', name, relation_name, other_name) or ('GET_REVERSE_RELATIONSHIP', name, relation_name)
+    """
+    return CommandParser(ftree).parse(lines)
+
+
+def query_result(ftree, query):
+    """
+    Returns the result of a GET_RELATIONSHIP or GET_REVERSE_RELATIONSHIP command tuple run against ftree
+    :param ftree: GraphADT
+        tree the command is run against
+    :param query: tuple
+        ('GET_RELATIONSHIP', name, relation_name[, other_name]) or ('GET_REVERSE_RELATIONSHIP', name, relation_name)
+    :return: None or list
+        result of get_relationship() or reverse_relationship()
+    """
+    if query[0] == GET_REVERSE_RELATIONSHIP:
+        return ftree.reverse_relationship(query[1], query[2])
+    return ftree.get_relationship(*query[1:])
+
+
+def answer_queries(ftree, queries):
+    """
+    Returns the output of GET_RELATIONSHIP and GET_REVERSE_RELATIONSHIP command tuples run against ftree
+    :param ftree: GraphADT
+        tree the commands are run against
+    :param queries: list of tuples
+        commands of query_result()
+    :return: str
+        output lines, each with a line break
+    """
+    return "".join([format_relationship(query_result(ftree, query)) + "\n" for query in queries])
+
+
+def _answer_worker_queries(queries):
+    """
+    Runs in a worker process forked by process_commands() and answers queries against the tree it inherited
+    """
+    return answer_queries(_worker_tree, queries)
+
+
+def process_commands(ftree, commands, out=None, flush_size=FLUSH_SIZE, workers=1, segment_size=PARALLEL_SEGMENT,
+                     metrics=None):
+    """
+    Runs command tuples against ftree and writes one output line per command. Output lines are collected
+    and written out with a single write() every flush_size lines. Results of STREAM_PAGE names or more of the
+    descendant index are written out as they are read from the index. Chained relations such as 'Son/Daughter'
+    share the people they reach between the commands of a flush until a child is added.
+    With workers > 1, runs of at least segment_size consecutive relationship queries are read-only and are
+    answered in chunks by worker processes forked with the tree, the output staying in the order of the commands.
+    With metrics, every command is run in this process and timed. If a command raises an exception, the lines of
+    the commands answered before it are written out before the exception propagates.
+    :param ftree: GraphADT
+        tree the commands are run against
+    :param commands: iterable of tuples
+        commands as generated by parse_commands()
+    :param out: file obj
+        writer of the output, sys.stdout if None
+    :param flush_size: int
+        number of output lines buffered before they are written out
+    :param workers: int
+        number of worker processes, 1 to run every command in this process
+    :param segment_size: int
+        minimum number of consecutive relationship queries sent to the worker processes
+    :param metrics: metrics.Metrics or None
+        metrics the latency of every stage of the commands is recorded in
+    :return: int
+        number of commands processed
+    """
+    if out is None:
+        out = sys.stdout
+    if metrics is not None:
+        return _process_commands_timed(ftree, commands, out, flush_size, metrics)
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        return _process_commands_parallel(ftree, commands, out, flush_size, workers, segment_size)
+    buffer = []
+    count = 0
+    # planner of the chained relations, whose sub-results are shared until a child is added or the output is flushed
+    planner = None
+    try:
+        for command in commands:
+            if command[0] == ADD_CHILD:
+                line = format_child_addition(ftree.add_child(command[1], command[2], command[3]))
+                planner = None
+            elif command[0] == GET_REVERSE_RELATIONSHIP:
+                line = format_relationship(ftree.reverse_relationship(command[1], command[2]))
+            elif command[2] in RELATIONS:
+                line = format_relationship(ftree.get_relationship(*command[1:]))
+            elif CHAIN in command[2]:
+                if planner is None:
+                    planner = ChainPlanner(ftree)
+                line = format_relationship(planner.relationship_view(command[1], command[2]))
+            else:
+                # results of the indexes are not cached and may hold a whole subtree, they are viewed and large ones
+                # are streamed to out
+                view = ftree.relationship_view(*command[1:])
+                if view is not None and len(view) >= STREAM_PAGE:
+                    buffer.append("")
+                    out.write("\n".join(buffer))
+                    buffer = []
+                    write_relationship(out, view)
+                    count += 1
+                    continue
+                line = format_relationship(view)
+            buffer.append(line)
+            count += 1
+            if len(buffer) >= flush_size:
+                buffer.append("")
+                out.write("\n".join(buffer))
+                buffer = []
+                planner = None
+    finally:
+        # lines of the commands answered before one raising an exception are written out too
+        if buffer:
+            buffer.append("")
+            out.write("\n".join(buffer))
+    out.flush()
+    return count
+
+
+def _process_commands_timed(ftree, commands, out, flush_size, metrics):
+    """
+    process_commands() recording in metrics the latency of parsing every command, running it and writing the
+    output, the relation of every GET_RELATIONSHIP and how its name was resolved
+    """
+    clock = time.perf_counter_ns
+    parse, add_child, cached, evaluated, write = (metrics.histogram(stage) for stage in (
+        "parse", "add_child", "relationship_cached", "relationship_evaluated", "write"))
+    relations = metrics.relations
+    cache = ftree.cache
+    buffer = []
+    count = 0
+    commands = iter(commands)
+    try:
+        while True:
+            start = clock()
+            command = next(commands, None)
+            if command is None:
+                break
+            end = clock()
+            parse.observe(end - start)
+            if command[0] == ADD_CHILD:
+                line = format_child_addition(ftree.add_child(command[1], command[2], command[3]))
+                add_child.observe(clock() - end)
+            else:
+                misses = cache.misses if cache is not None else -1
+                result = query_result(ftree, command)
+                # only relations of RELATIONS are cached, reverse queries, indexes and chains never are
+                hit = (cache is not None and command[0] == GET_RELATIONSHIP and command[2] in RELATIONS
+                       and cache.misses == misses and result is not None)
+                (cached if hit else evaluated).observe(clock() - end)
+                line = format_relationship(result)
+                relations[command[2]] = relations.get(command[2], 0) + 1
+                if result is None:
+                    metrics.not_found += 1
+                elif command[1] in ftree.spouses:
+                    metrics.spouse_names += 1
+            buffer.append(line)
+            count += 1
+            if len(buffer) >= flush_size:
+                buffer.append("")
+                start = clock()
+                out.write("\n".join(buffer))
+                write.observe(clock() - start)
+                buffer = []
+    finally:
+        if buffer:
+            buffer.append("")
+            start = clock()
+            out.write("\n".join(buffer))
+            write.observe(clock() - start)
+    out.flush()
+    return count
+
+
+def _process_commands_parallel(ftree, commands, out, flush_size, workers, segment_size):
+    """
+    process_commands() with worker processes. Workers are forked when a long enough run of GET_RELATIONSHIP
+    commands is found and are kept for the next runs until a child is added, which makes their tree stale.
+    Runs are cut every 16 segment_size commands to bound the commands held in memory.
+    """
+    global _worker_tree
+    context = multiprocessing.get_context("fork")
+    pool = None
+    buffer = []
+    lines = 0
+    queries = []
+    count = 0
+    try:
+        for command in itertools.chain(commands, (None,)):
+            if command is not None and command[0] != ADD_CHILD:
+                queries.append(command)
+                if len(queries) < 16 * segment_size:
+                    continue
+            if len(queries) >= segment_size:
+                if pool is None:
+                    _worker_tree = ftree
+                    pool = context.Pool(workers)
+                chunks = [queries[index:index + PARALLEL_CHUNK] for index in range(0, len(queries), PARALLEL_CHUNK)]
+                buffer.extend(pool.imap(_answer_worker_queries, chunks))
+            elif queries:
+                buffer.append(answer_queries(ftree, queries))
+            lines += len(queries)
+            count += len(queries)
+            queries = []
+            if command is not None and command[0] == ADD_CHILD:
+                child_addition = ftree.add_child(command[1], command[2], command[3])
+                if child_addition == 1 and pool is not None:
+                    pool.terminate()
+                    pool = None
+                buffer.append(format_child_addition(child_addition) + "\n")
+                lines += 1
+                count += 1
+            if lines >= flush_size or command is None:
+                out.write("".join(buffer))
+                buffer = []
+                lines = 0
+    finally:
+        if pool is not None:
+            pool.terminate()
+        _worker_tree = None
+    out.flush()
+    return count
+
+
+# tree of King Arthur's family the commands of the input file are run against
+FAMILY_TREE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "family_tree.csv")
 
 
 if __name__ == '__main__':
     input_file = sys.argv[1]
 
     ftree = GraphADT()
-    # King Arthur Vertex
-    ftree.add_vertex(data={"name": "King Arthur", "spouse_name": "Queen Margaret", "gender": "Male"})
-
-    # Level 1 vertices
-    ftree.add_vertex(data={"name": "Bill", "spouse_name": "Flora", "gender": "Male"})
-    ftree.add_vertex(data={"name": "Charlie", "spouse_name": None, "gender": "Male"})
-    ftree.add_vertex(data={"name": "Percy", "spouse_name": "Audrey", "gender": "Male"})
-    ftree.add_vertex(data={"name": "Ronald", "spouse_name": "Helen", "gender": "Male"})
-    ftree.add_vertex(data={"name": "Ginerva", "spouse_name": "Harry", "gender": "Female"})
-
-    # Level 2 vertices
-    ftree.add_vertex(data={"name": "Victoire", "spouse_name": "Ted", "gender": "Female"})
-    ftree.add_vertex(data={"name": "Dominique", "spouse_name": None, "gender": "Female"})
-    ftree.add_vertex(data={"name": "Louis", "spouse_name": None, "gender": "Male"})
-    ftree.add_vertex(data={"name": "Molly", "spouse_name": None, "gender": "Female"})
-    ftree.add_vertex(data={"name": "Lucy", "spouse_name": None, "gender": "Female"})
-    ftree.add_vertex(data={"name": "Rose", "spouse_name": "Malfoy", "gender": "Female"})
-    ftree.add_vertex(data={"name": "Hugo", "spouse_name": None, "gender": "Male"})
-    ftree.add_vertex(data={"name": "James", "spouse_name": "Darcy", "gender": "Male"})
-    ftree.add_vertex(data={"name": "Albus", "spouse_name": "Alice", "gender": "Male"})
-    ftree.add_vertex(data={"name": "Lily", "spouse_name": None, "gender": "Female"})
-
-    # Level 3 Vertices
-    ftree.add_vertex(data={"name": "Remus", "spouse_name": None, "gender": "Male"})
-    ftree.add_vertex(data={"name": "Draco", "spouse_name": None, "gender": "Male"})
-    ftree.add_vertex(data={"name": "Aster", "spouse_name": None, "gender": "Female"})
-    ftree.add_vertex(data={"name": "William", "spouse_name": None, "gender": "Male"})
-    ftree.add_vertex(data={"name": "Ron", "spouse_name": None, "gender": "Male"})
-    ftree.add_vertex(data={"name": "Ginny", "spouse_name": None, "gender": "Female"})
-
-    # Adding edges to vertices
-    ftree.add_edge(ftree.vertices["King Arthur"], ftree.vertices["Bill"])
-    ftree.add_edge(ftree.vertices["King Arthur"], ftree.vertices["Charlie"])
-    ftree.add_edge(ftree.vertices["King Arthur"], ftree.vertices["Percy"])
-    ftree.add_edge(ftree.vertices["King Arthur"], ftree.vertices["Ronald"])
-    ftree.add_edge(ftree.vertices["King Arthur"], ftree.vertices["Ginerva"])
-
-    ftree.add_edge(ftree.vertices["Bill"], ftree.vertices["Victoire"])
-    ftree.add_edge(ftree.vertices["Bill"], ftree.vertices["Dominique"])
-    ftree.add_edge(ftree.vertices["Bill"], ftree.vertices["Louis"])
-    ftree.add_edge(ftree.vertices["Percy"], ftree.vertices["Molly"])
-    ftree.add_edge(ftree.vertices["Percy"], ftree.vertices["Lucy"])
-    ftree.add_edge(ftree.vertices["Ronald"], ftree.vertices["Rose"])
-    ftree.add_edge(ftree.vertices["Ronald"], ftree.vertices["Hugo"])
-    ftree.add_edge(ftree.vertices["Ginerva"], ftree.vertices["James"])
-    ftree.add_edge(ftree.vertices["Ginerva"], ftree.vertices["Albus"])
-    ftree.add_edge(ftree.vertices["Ginerva"], ftree.vertices["Lily"])
-
-    ftree.add_edge(ftree.vertices["Victoire"], ftree.vertices["Remus"])
-    ftree.add_edge(ftree.vertices["Rose"], ftree.vertices["Draco"])
-    ftree.add_edge(ftree.vertices["Rose"], ftree.vertices["Aster"])
-    ftree.add_edge(ftree.vertices["James"], ftree.vertices["William"])
-    ftree.add_edge(ftree.vertices["Albus"], ftree.vertices["Ron"])
-    ftree.add_edge(ftree.vertices["Albus"], ftree.vertices["Ginny"])
-    # reading data from input file
-    with open(input_file, 'r') as f:
-        for line in f:
-            line = line.split()
-            # calling ADD_CHILD() method
-            if line[0] == 'ADD_CHILD':
-                if line[1] == 'King' or line[1] == 'Queen':
-                    print_child_addition(ftree.add_child(line[1] + " " + line[2], line[3], line[4]))
-                else:
-                    print_child_addition(ftree.add_child(line[1], line[2], line[3]))
-            # calling GET_RELATIONSHIP() method
-            elif line[0] == 'GET_RELATIONSHIP':
-                if line[1] == 'King' or line[1] == 'Queen':
-                    print_relationship(ftree.get_relationship(line[1] + " " + line[2], line[3]))
-                else:
-                    print_relationship(ftree.get_relationship(line[1], line[2]))
+    ftree.load(FAMILY_TREE)
+    # path of the Prometheus text file the metrics of the commands are written to, or '-' for a summary on stderr
+    metrics_path = os.environ.get("GEEKTRUST_METRICS")
+    # number of processes answering long runs of relationship queries, 1 to answer them in this process
+    workers = int(os.environ.get("GEEKTRUST_WORKERS") or 1)
+    # reading commands from input file and streaming the output
+    with open(input_file, 'rb') as f:
+        commands = CommandParser(ftree).parse_stream(f)
+        if metrics_path:
+            import metrics
+            command_metrics = metrics.Metrics()
+            process_commands(ftree, commands, metrics=command_metrics)
+            command_metrics.dump(metrics_path)
+        else:
+            process_commands(ftree, commands, workers=workers)
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import sys
+
+# seconds between 2 dumps of the metrics of a server
+DUMP_INTERVAL = 10.0
+
+
+class Histogram:
+    """
+    Class to represent a latency histogram with power of 2 buckets in nanoseconds: a latency of n ns is counted
+    in bucket n.bit_length(), whose upper bound is 2 ** n.bit_length() ns
+
+    Attributes:
+        buckets : list of int
+            number of latencies in every bucket
+        count : int
+            number of latencies observed
+        total : int
+            sum of the latencies observed in nanoseconds
+
+    Methods:
+        observe(nanoseconds):
+            Counts a latency
+        quantile(q):
+            Returns the upper bound in nanoseconds of the bucket of the q quantile
+    """
+
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+
+    def observe(self, nanoseconds):
+        """
+        :param nanoseconds: int
+            latency to be counted
+        """
+        self.buckets[nanoseconds.bit_length()] += 1
+        self.count += 1
+        self.total += nanoseconds
+
+    def quantile(self, q):
+        """
+        :param q: float
+            quantile between 0 and 1
+        :return: int
+            upper bound in nanoseconds of the bucket the q quantile falls in, 0 if nothing was observed
+        """
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return 1 << bucket
+        return 0
+
+
+class Metrics:
+    """
+    Class to represent the metrics of the commands run by geektrust.process_commands() when it is given a Metrics
+    object. Commands run without one go through a loop that measures nothing and costs nothing more.
+
+    Stages timed, each with a latency histogram: parse (reading and parsing a command line), add_child,
+    relationship_cached and relationship_evaluated (a GET_RELATIONSHIP served from the cache or walked on the
+    tree) and write (writing a batch of output lines).
+
+    Attributes:
+        histograms : dict
+            stage -> Histogram
+        relations : dict
+            relation name -> number of GET_RELATIONSHIP commands
+        spouse_names : int
+            number of GET_RELATIONSHIP names resolved through the spouse index
+        not_found : int
+            number of GET_RELATIONSHIP names not found
+
+    Methods:
+        histogram(stage):
+            Returns the histogram of stage
+        summary():
+            Returns a human readable summary
+        prometheus():
+            Returns the metrics in the Prometheus text format
+        dump(path):
+            Writes the Prometheus text to path, or the summary to stderr if path is '-'
+        dump_periodically(path, interval):
+            Dumps the metrics every interval seconds until cancelled
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.relations = {}
+        self.spouse_names = 0
+        self.not_found = 0
+
+    def histogram(self, stage):
+        """
+        :return: Histogram
+            histogram of stage, created on first use
+        """
+        if stage not in self.histograms:
+            self.histograms[stage] = Histogram()
+        return self.histograms[stage]
+
+    def summary(self):
+        """
+        :return: str
+            one line per stage with its count, total, mean, p50 and p99 latency, then the counts of relations
+            and of names resolved through the spouse index or not found
+        """
+        lines = ["{:<24} {:>10} {:>12} {:>10} {:>10} {:>10}".format("stage", "count", "total (ms)", "mean (us)",
+                                                                    "p50 (us)", "p99 (us)")]
+        for stage, histogram in self.histograms.items():
+            if histogram.count:
+                lines.append("{:<24} {:>10} {:>12.1f} {:>10.2f} {:>10.2f} {:>10.2f}".format(
+                    stage, histogram.count, histogram.total / 1e6, histogram.total / histogram.count / 1e3,
+                    histogram.quantile(0.5) / 1e3, histogram.quantile(0.99) / 1e3))
+        for relation, count in sorted(self.relations.items()):
+            lines.append("{:<24} {:>10}".format(relation, count))
+        lines.append("{:<24} {:>10}".format("spouse names", self.spouse_names))
+        lines.append("{:<24} {:>10}".format("names not found", self.not_found))
+        return "\n".join(lines) + "\n"
+
+    def prometheus(self):
+        """
+        :return: str
+            the histograms as geektrust_stage_seconds, the relation counts as geektrust_relations_total and the
+            name counts as geektrust_spouse_names_total and geektrust_names_not_found_total, in the Prometheus
+            text format
+        """
+        lines = ["# TYPE geektrust_stage_seconds histogram"]
+        for stage, histogram in self.histograms.items():
+            cumulative = 0
+            last = max((bucket for bucket, count in enumerate(histogram.buckets) if count), default=0)
+            for bucket in range(last + 1):
+                cumulative += histogram.buckets[bucket]
+                lines.append('geektrust_stage_seconds_bucket{{stage="{}",le="{:.9g}"}} {}'.format(
+                    stage, (1 << bucket) / 1e9, cumulative))
+            lines.append('geektrust_stage_seconds_bucket{{stage="{}",le="+Inf"}} {}'.format(stage, histogram.count))
+            lines.append('geektrust_stage_seconds_sum{{stage="{}"}} {:.9f}'.format(stage, histogram.total / 1e9))
+            lines.append('geektrust_stage_seconds_count{{stage="{}"}} {}'.format(stage, histogram.count))
+        lines.append("# TYPE geektrust_relations_total counter")
+        for relation, count in sorted(self.relations.items()):
+            lines.append('geektrust_relations_total{{relation="{}"}} {}'.format(relation, count))
+        lines.append("# TYPE geektrust_spouse_names_total counter")
+        lines.append("geektrust_spouse_names_total {}".format(self.spouse_names))
+        lines.append("# TYPE geektrust_names_not_found_total counter")
+        lines.append("geektrust_names_not_found_total {}".format(self.not_found))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Writes the Prometheus text to path through a temporary file, so that a scraper never reads a partial
+        file, or the summary to stderr if path is '-'
+        :param path: str
+            path of the metrics file or '-'
+        """
+        if path == "-":
+            sys.stderr.write(self.summary())
+            return
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as f:
+            f.write(self.prometheus())
+        os.replace(temporary_path, path)
+
+    async def dump_periodically(self, path, interval=DUMP_INTERVAL):
+        """
+        Dumps the metrics to path every interval seconds until cancelled
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.dump(path)
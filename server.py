@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import io
+import time
+
+import geektrust as ft
+import metrics
+import snapshot
+import wal
+
+# bytes read from a connection at once, every complete command line read is answered before the next read
+READ_SIZE = 65536
+# bytes of a partial line kept for the next read, a connection sending a longer line is closed
+MAX_LINE = 1 << 20
+# output line of a command that raised an exception
+COMMAND_FAILED = "COMMAND_FAILED"
+
+
+class TreeServer:
+    """
+    Class to represent a server answering the ADD_CHILD and GET_RELATIONSHIP line protocol of the input files
+    over TCP or a Unix socket, against one GraphADT held in memory.
+
+    The server answers one batch of lines at a time: commands of all connections run on the event loop thread,
+    every add_child() runs alone and is never interleaved with a get_relationship(), and the batches of different
+    connections are interleaved between the batches each connection has sent. A long query, such as the
+    descendants of the root of a large tree, delays the batches of every other connection until it is answered.
+    Reads are not moved to other threads, the relationship cache and the indexes of the tree being updated as
+    they are read. A client may pipeline any number of lines; each batch of lines read is answered with a single
+    write. Every line is parsed once the lines before it have run, against the names they added. Bytes that are
+    not UTF-8 are replaced and a command raising an exception is answered with COMMAND_FAILED, the connection and
+    the next commands going on.
+
+    Attributes:
+        ftree : GraphADT
+            tree the commands are run against
+        metrics : metrics.Metrics or None
+            metrics the commands are recorded in
+        connections, commands : int
+            number of connections accepted and commands answered
+
+    Methods:
+        answer(data):
+            Returns the output of the command lines in data
+        handle(reader, writer):
+            Answers the commands of a connection until it is closed
+        start(host, port, path):
+            Starts listening on a TCP port or on a Unix socket path
+    """
+
+    def __init__(self, ftree, command_metrics=None):
+        """
+        Constructs a server for ftree
+        :param ftree: GraphADT
+            tree the commands are run against
+        :param command_metrics: metrics.Metrics or None
+            metrics the commands are recorded in, None to record nothing
+        """
+        self.ftree = ftree
+        self.metrics = command_metrics
+        self.connections = 0
+        self.commands = 0
+
+    def answer(self, data):
+        """
+        Runs the command lines in data and returns their output. Lines are parsed lazily, so that a name made of
+        several words added by a line is matched in the lines after it. A command raising an exception is answered
+        with COMMAND_FAILED and the lines after it are run from there, the lines of the commands answered before
+        it being written out by process_commands().
+        :param data: bytes
+            complete command lines
+        :return: bytes
+            output lines
+        """
+        lines = iter(data.decode(errors="replace").splitlines())
+        out = io.StringIO()
+        count = 0
+
+        def commands():
+            nonlocal count
+            # the parser takes one line at a time from lines, those after a failed command are left to the next one
+            for command in ft.parse_commands(lines, self.ftree):
+                count += 1
+                yield command
+
+        while True:
+            try:
+                ft.process_commands(self.ftree, commands(), out, metrics=self.metrics)
+                break
+            except Exception:
+                out.write(COMMAND_FAILED + "\n")
+        self.commands += count
+        return out.getvalue().encode()
+
+    async def handle(self, reader, writer):
+        """
+        Answers the commands of a connection until it is closed. A partial last line is kept for the next read,
+        up to MAX_LINE bytes.
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        """
+        self.connections += 1
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                pending += data
+                end = pending.rfind(b"\n") + 1
+                if end:
+                    output = self.answer(pending[:end])
+                    pending = pending[end:]
+                    if output:
+                        writer.write(output)
+                        await writer.drain()
+                if len(pending) > MAX_LINE:
+                    pending = b""
+                    break
+            if pending:
+                writer.write(self.answer(pending))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """
+        Starts listening on a Unix socket if path is given, on host and port otherwise
+        :return: asyncio.Server
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path=path)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def load_test(host="127.0.0.1", port=None, path=None, lines=(), connections=8, pipeline=16):
+    """
+    Sends lines to a server over concurrent connections, pipeline lines at a time per connection, and
+    measures the latency of every line from the send of its batch to the receipt of its output
+    :param lines: list of str
+        command lines, each with a line break, answered by exactly one output line
+    :param connections: int
+        number of concurrent connections the lines are spread over
+    :param pipeline: int
+        number of lines sent by a connection before it waits for their output
+    :return: dict
+        requests, seconds, requests/sec and p50/p99 latency in milliseconds
+    """
+    latencies = []
+
+    async def client(client_lines):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        for index in range(0, len(client_lines), pipeline):
+            batch = client_lines[index:index + pipeline]
+            start = time.perf_counter()
+            writer.write("".join(batch).encode())
+            for _ in batch:
+                await reader.readline()
+                latencies.append(time.perf_counter() - start)
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(lines[index::connections]) for index in range(connections)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {"requests": len(latencies), "seconds": seconds, "rps": len(latencies) / seconds,
+            "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0}
+
+
+async def serve(ftree, host="127.0.0.1", port=0, path=None, metrics_path=None, metrics_interval=metrics.DUMP_INTERVAL):
+    """
+    Serves ftree until cancelled. If metrics_path is given, the metrics of the commands are written to
+    metrics_path every metrics_interval seconds and when the server stops.
+    """
+    command_metrics = metrics.Metrics() if metrics_path is not None else None
+    server = await TreeServer(ftree, command_metrics).start(host, port, path)
+    dumps = None
+    if command_metrics is not None:
+        dumps = asyncio.ensure_future(command_metrics.dump_periodically(metrics_path, metrics_interval))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if dumps is not None:
+            dumps.cancel()
+            command_metrics.dump(metrics_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serves a family tree over the ADD_CHILD/GET_RELATIONSHIP protocol")
+    parser.add_argument("--tree", default=ft.FAMILY_TREE, help="CSV or JSON-lines tree file")
+    parser.add_argument("--snapshot", help="snapshot file loaded instead of --tree")
+    parser.add_argument("--wal", help="mutation log replayed on the tree and appended to")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix", help="Unix socket path listened on instead of --host and --port")
+    parser.add_argument("--metrics", help="Prometheus text file the command metrics are written to, '-' for stderr")
+    parser.add_argument("--metrics-interval", type=float, default=metrics.DUMP_INTERVAL,
+                        help="seconds between 2 writes of the metrics")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        ftree = snapshot.load_snapshot(args.snapshot)
+    else:
+        ftree = ft.GraphADT()
+        ftree.load(args.tree)
+    log = wal.recover(ftree, args.wal) if args.wal else None
+    try:
+        asyncio.run(serve(ftree, args.host, args.port, args.unix, args.metrics, args.metrics_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if log is not None:
+            log.close()
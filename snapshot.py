@@ -0,0 +1,337 @@
+import gc
+import mmap
+import struct
+from array import array
+
+import geektrust as ft
+
+# magic, number of vertices, number of names, number of child entries, number of married vertices
+HEADER = struct.Struct("<8sQQQQ")
+MAGIC = b"FTSNAP2\0"
+# gender codes of the gender array
+GENDERS = ("Male", "Female")
+
+
+def _align(offset):
+    """
+    Rounds offset up to a multiple of 8 so that every array of the snapshot starts aligned
+    """
+    return (offset + 7) & ~7
+
+
+def _layout(vertex_count, name_count, child_count, spouse_count, blob_size):
+    """
+    Returns the (typecode, start, length) of every section of a snapshot with the given counts, in file order:
+    string offsets, parent, spouse, child offsets, children, name order, spouse order, gender, string blob
+    """
+    sections = (("I", vertex_count + 1), ("i", vertex_count), ("i", vertex_count), ("i", vertex_count + 1),
+                ("i", child_count), ("i", name_count), ("i", spouse_count), ("B", vertex_count),
+                ("B", blob_size))
+    layout = []
+    offset = HEADER.size
+    for typecode, length in sections:
+        offset = _align(offset)
+        layout.append((typecode, offset, length))
+        offset += length * array(typecode).itemsize
+    return layout
+
+
+def columns(ftree):
+    """
+    Lays ftree out as columns indexed by integer vertex ids, the person ids of ftree.people. Spouse vertices are
+    vertices of their own, with the parent and children a merged tree gives them.
+    :param ftree: GraphADT
+        tree to be laid out
+    :return: tuple
+        (strings, parent, spouse, gender, child_offsets, children) where strings holds the names of vertices at
+        their ids, parent and spouse are vertex ids (-1 if none), gender holds codes of GENDERS and the children of
+        vertex id are children[child_offsets[id]:child_offsets[id + 1]]
+    """
+    people = ftree.people
+    strings = [vertex.name for vertex in people]
+    parent = array("i", [vertex.parent.id if vertex.parent is not None else -1 for vertex in people])
+    spouse = array("i", [vertex.spouse.id if vertex.spouse is not None else -1 for vertex in people])
+    gender = array("B", [GENDERS.index(vertex.gender) for vertex in people])
+    child_offsets = array("i", [0])
+    children = array("i")
+    for vertex in people:
+        # children shared with a spouse are laid out under the spouse they have as parent
+        children.extend(child.id for child in vertex.children if child.parent is vertex)
+        child_offsets.append(len(children))
+    return strings, parent, spouse, gender, child_offsets, children
+
+
+def save_snapshot(ftree, path):
+    """
+    Saves ftree to a binary snapshot: a table of the names of all people followed by integer arrays of parent,
+    spouse, gender and children (as offsets into one array of child ids), plus the ids of the vertices of
+    ftree.vertices sorted by name and of the vertices of the spouse index sorted by spouse name to look names up
+    without building a dict. Arrays use the native byte order.
+    :param ftree: GraphADT
+        tree to be saved
+    :param path: str
+        path of the snapshot file
+    :return: int
+        number of vertices saved, spouse vertices included
+    """
+    strings, parent, spouse, gender, child_offsets, children = columns(ftree)
+    strings = [string.encode() for string in strings]
+    name_order = array("i", sorted((vertex.id for vertex in ftree.vertices.values()), key=strings.__getitem__))
+    spouse_order = array("i", sorted((vertex.id for vertex in ftree.spouses.values()),
+                                     key=lambda vertex_id: strings[spouse[vertex_id]]))
+    string_offsets = array("I", [0])
+    for string in strings:
+        string_offsets.append(string_offsets[-1] + len(string))
+    blob = b"".join(strings)
+
+    layout = _layout(len(parent), len(name_order), len(children), len(spouse_order), len(blob))
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(parent), len(name_order), len(children), len(spouse_order)))
+        for (typecode, start, length), data in zip(layout, (string_offsets, parent, spouse, child_offsets, children,
+                                                            name_order, spouse_order, gender, blob)):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(data)
+    return len(parent)
+
+
+def load_snapshot(path, cache_size=ft.CACHE_SIZE):
+    """
+    Builds a GraphADT from a snapshot saved by save_snapshot(), for trees that are mutated after being opened
+    :param path: str
+        path of the snapshot file
+    :param cache_size: int
+        size of the relationship cache of the tree
+    :return: GraphADT
+    """
+    ftree = ft.GraphADT(cache_size)
+    # the cyclic garbage collector would rescan every vertex allocated so far many times during the load
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        with MappedTree(path) as mapped_tree:
+            ftree.load_people(mapped_tree.people(), mapped_tree.name_order, mapped_tree.spouse_order)
+    finally:
+        if collecting:
+            gc.enable()
+    return ftree
+
+
+class MappedTree:
+    """
+    Class to represent a family tree opened from a snapshot saved by save_snapshot(). The file is memory-mapped
+    read-only and queried in place, so opening it costs no deserialization and processes opening the same
+    snapshot share its pages.
+
+    Methods:
+        find(name):
+            Returns the vertex id of name in the vertices of the tree, -1 if not found
+        find_spouse(name):
+            Returns the vertex id of the vertex whose spouse_name is name, -1 if not found
+        person(name):
+            Returns the vertex id name is resolved to, as by GraphADT.ids, -1 if not found
+        spouse_search(name), get_spouse_name(name), get_relationship(name, relation):
+            Same as methods of GraphADT, answered from the mapped arrays
+        people():
+            Returns the linked vertices of all people, to be loaded into a GraphADT
+        close():
+            Unmaps the snapshot
+    """
+
+    def __init__(self, path):
+        """
+        Maps the snapshot at path and creates views of its arrays
+        :param path: str
+            path of the snapshot file
+        """
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, vertex_count, name_count, child_count, spouse_count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError("{} is not a family tree snapshot".format(path))
+        self.vertex_count = vertex_count
+        view = memoryview(self.mm)
+        layout = _layout(vertex_count, name_count, child_count, spouse_count, 0)
+        (self.string_offsets, self.parent, self.spouse, self.child_offsets, self.children, self.name_order,
+         self.spouse_order, self.gender) = [view[start:start + length * array(typecode).itemsize].cast(typecode)
+                                            for typecode, start, length in layout[:-1]]
+        self.blob = view[layout[-1][1]:]
+        self.views = [self.string_offsets, self.parent, self.spouse, self.child_offsets, self.children,
+                      self.name_order, self.spouse_order, self.gender, self.blob, view]
+
+    def close(self):
+        """
+        Releases the array views and unmaps the snapshot
+        """
+        for view in self.views:
+            view.release()
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def string(self, string_id):
+        """
+        :param string_id: int
+            id of a name in the string table
+        :return: str
+            the name
+        """
+        return str(self.blob[self.string_offsets[string_id]:self.string_offsets[string_id + 1]], "utf-8")
+
+    def _search(self, order, key, name):
+        """
+        Binary searches order, a vertex id array sorted by key(vertex id) string ids, for name
+        :return: int
+            first vertex id whose string is name, -1 if not found
+        """
+        target = name.encode()
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            string_id = key(order[middle])
+            if bytes(self.blob[self.string_offsets[string_id]:self.string_offsets[string_id + 1]]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(order):
+            string_id = key(order[low])
+            if bytes(self.blob[self.string_offsets[string_id]:self.string_offsets[string_id + 1]]) == target:
+                return order[low]
+        return -1
+
+    def find(self, name):
+        """
+        :param name: str
+            name of vertex
+        :return: int
+            vertex id of name in the vertices of the tree, -1 if not found
+        """
+        return self._search(self.name_order, lambda vertex_id: vertex_id, name)
+
+    def find_spouse(self, name):
+        """
+        :param name: str
+            spouse name of vertex
+        :return: int
+            vertex id of the vertex whose spouse_name is name, -1 if not found
+        """
+        return self._search(self.spouse_order, self.spouse.__getitem__, name)
+
+    def person(self, name):
+        """
+        :param name: str
+            name or spouse name
+        :return: int
+            vertex id of the spouse vertex of a spouse name, else vertex id of name, -1 if not found
+        """
+        vertex_id = self.find_spouse(name)
+        if vertex_id >= 0:
+            return self.spouse[vertex_id]
+        return self.find(name)
+
+    def spouse_search(self, name):
+        """
+        :return: bool
+            True if name is spouse name of any vertex else False
+        """
+        return self.find_spouse(name) >= 0
+
+    def get_spouse_name(self, name):
+        """
+        :return: str
+            name of vertex whose spouse_name is name, else empty str
+        """
+        vertex_id = self.find_spouse(name)
+        if vertex_id < 0:
+            return ''
+        return self.string(vertex_id)
+
+    def people(self):
+        """
+        :return: list of Vertex
+            vertices of all people in id order, linked to their parents, spouses and children
+        """
+        people = [ft.Vertex({"name": self.string(vertex_id), "gender": GENDERS[self.gender[vertex_id]],
+                             "spouse_name": None}) for vertex_id in range(self.vertex_count)]
+        for vertex, spouse_id in zip(people, self.spouse):
+            if spouse_id >= 0:
+                vertex.spouse = people[spouse_id]
+        child_offsets, children = self.child_offsets, self.children
+        for vertex_id, vertex in enumerate(people):
+            for child_id in children[child_offsets[vertex_id]:child_offsets[vertex_id + 1]]:
+                ft.attach(vertex, people[child_id])
+        return people
+
+    def _step(self, step, vertex_id):
+        """
+        Takes a PathStep from vertex_id over the mapped arrays
+        :return: list
+            next vertex ids
+        """
+        gender = self.gender
+        code = GENDERS.index(step.gender) if step.gender is not None else -1
+        if step.kind == ft.PARENT:
+            parent_id = self.parent[vertex_id]
+            if parent_id >= 0 and code >= 0 and gender[parent_id] != code:
+                # the parent of a given gender is the parent vertex or its spouse
+                parent_id = self.spouse[parent_id]
+            if parent_id < 0 or (code >= 0 and gender[parent_id] != code):
+                return []
+            return [parent_id]
+        if step.kind == ft.CHILDREN:
+            start, end = self.child_offsets[vertex_id], self.child_offsets[vertex_id + 1]
+            spouse_id = self.spouse[vertex_id]
+            if start == end and spouse_id >= 0:
+                # children of a couple are laid out under the spouse holding them
+                start, end = self.child_offsets[spouse_id], self.child_offsets[spouse_id + 1]
+            return [child for child in self.children[start:end] if code < 0 or gender[child] == code]
+        parent_id = self.parent[vertex_id]
+        if parent_id < 0:
+            return []
+        start, end = self.child_offsets[parent_id], self.child_offsets[parent_id + 1]
+        # siblings of the name of vertex, such as a vertex it replaced, are left out with it
+        name = self.string(vertex_id)
+        return [child for child in self.children[start:end]
+                if (code < 0 or gender[child] == code) and self.string(child) != name]
+
+    def evaluate(self, path, vertex_id):
+        """
+        Walks a RelationPath from vertex_id over the mapped arrays
+        :return: list
+            names (or spouse names) reached by the path
+        """
+        vertex_ids = [vertex_id]
+        for step in path.steps:
+            vertex_ids = [item for current in vertex_ids for item in self._step(step, current)]
+            if not vertex_ids:
+                return []
+        if path.spouses:
+            return [self.string(self.spouse[item]) for item in vertex_ids if self.spouse[item] >= 0]
+        return [self.string(item) for item in vertex_ids]
+
+    def get_relationship(self, name, relation):
+        """
+        Same as GraphADT.get_relationship(), walking the relations registered in geektrust.RELATIONS from the
+        vertex of name, then from its spouse for the names not reached yet
+        :return: None or list
+            None or list containing relation names of name
+        """
+        vertex_id = self.person(name)
+        if vertex_id < 0:
+            return
+        paths = ft.RELATIONS.get(relation)
+        if paths is None:
+            return []
+        result = self.evaluate(paths[0], vertex_id)
+        spouse_id = self.spouse[vertex_id]
+        if paths[1] is not None and spouse_id >= 0:
+            spouse_result = self.evaluate(paths[1], spouse_id)
+            if not result:
+                return spouse_result
+            reached = set(result)
+            result.extend(name for name in spouse_result if name not in reached)
+        return result
@@ -1,7 +1,17 @@
+import asyncio
+import io
+import json
 import sys
+import time
 import pytest
 
+import bulk
 import meet_the_family as ft
+import metrics
+import server
+import snapshot
+import tree_generator
+import wal
 
 
 def create_tree():
@@ -109,6 +119,76 @@ def test_spouse_gender_vertex():
     assert result is not None, message.format("v", "Female", result)
 
 
+def test_vertex_storage():
+    """
+    Tests the compact storage of Vertex class. Asserts that vertices carry no __dict__, share one interned
+    gender string and keep the parent as a single reference exposed through incident_edges.
+    """
+    ftree_obj = create_tree()
+    message = "Vertex storage wrong. {} should be {} but returned {}"
+    v = ft.Vertex(data={"name": "test_name", "gender": "".join(["Ma", "le"]), "spouse_name": None})
+    assert not hasattr(v, "__dict__"), message.format("__dict__ of v", "missing", "present")
+    assert v.gender is ftree_obj.vertices["A"].gender, message.format("gender of v", "interned", v.gender)
+    assert v.parent is None, message.format("parent of v", None, v.parent)
+    assert ftree_obj.vertices["E"].parent is ftree_obj.vertices["B"], message.format("parent of E", "B", "other")
+    assert ftree_obj.vertices["E"].incident_edges == {0: ftree_obj.vertices["B"]}, \
+        message.format("incident edges of E", "{0: B}", ftree_obj.vertices["E"].incident_edges)
+
+
+def test_children_by_gender():
+    """
+    Tests children_by_gender of Vertex class and Siblings class. Asserts that the children of a vertex are kept
+    partitioned by gender as children are added and that siblings are a view of the group without the vertex.
+    """
+    ftree_obj = create_tree()
+    ftree_obj.add_child("D", "H", "Female")
+    message = "Children by gender wrong. {} should be {} but returned {}"
+    a, d = ftree_obj.vertices["A"], ftree_obj.vertices["D"]
+    result = {gender: [item.name for item in group] for gender, group in a.children_by_gender.items()}
+    assert result == {"Male": ["B"], "Female": ["C", "D"]}, message.format("children of A", "B | C, D", result)
+    result = [item.name for item in d.children_by_gender["Female"]]
+    assert result == ["F", "H"], message.format("daughters of D", ["F", "H"], result)
+    assert ftree_obj.vertices["E"].children_by_gender is None, message.format("children of E", None, "a dict")
+    siblings = ft.siblings_step("Female")(ftree_obj.vertices["F"])
+    assert isinstance(siblings, ft.Siblings), message.format("sisters of F", "a view", type(siblings))
+    result = (len(siblings), [item.name for item in siblings], siblings[0].name)
+    assert result == (1, ["H"], "H"), message.format("sisters of F", (1, ["H"], "H"), result)
+    sisters = ft.siblings_step("Female")(ftree_obj.vertices["B"])
+    result = [sisters.group is a.children_by_gender["Female"], [item.name for item in sisters]]
+    assert result == [True, ["C", "D"]], message.format("sisters of B", [True, ["C", "D"]], result)
+    siblings = ft.siblings_step()(ftree_obj.vertices["C"])
+    result = [[item.name for item in siblings], siblings[0].name, siblings[1].name, siblings.positions]
+    assert result == [["B", "D"], "B", "D", [1]], message.format("siblings of C", [["B", "D"], "B", "D", [1]], result)
+
+
+def test_replaced_siblings(tmp_path):
+    """
+    Tests siblings when ADD_CHILD reuses a name. Asserts that the replaced vertex, still a child of the parent,
+    is left out of the siblings of the vertex replacing it, by the tree, its snapshot and its columnar tree.
+    """
+    message = "Siblings of a replaced name wrong. {} should be {} but returned {}"
+    ftree_obj = ft.GraphADT()
+    ftree_obj.add_vertex(data={"name": "A", "spouse_name": "Z", "gender": "Male"})
+    for name, gender in (("P1", "Male"), ("P2", "Female"), ("P1", "Male"), ("P1", "Female"), ("Q", "Male")):
+        ftree_obj.add_child("Z", name, gender)
+    path = str(tmp_path / "tree.snap")
+    snapshot.save_snapshot(ftree_obj, path)
+    expected = {("P1", "Brother"): ["Q"], ("P1", "Sister"): ["P2"], ("P1", "Siblings"): ["P2", "Q"],
+                ("P2", "Brother"): ["P1", "P1", "Q"], ("Q", "Sister"): ["P2", "P1"]}
+    with snapshot.MappedTree(path) as mapped_tree:
+        columnar_tree = bulk.ColumnarTree.from_graph(ftree_obj, False)
+        for (name, relation), names in expected.items():
+            result = [ftree_obj.get_relationship(name, relation), mapped_tree.get_relationship(name, relation),
+                      columnar_tree.query([name], relation).names(0)]
+            assert result == [names] * 3, message.format(relation + " of " + name, [names] * 3, result)
+    ftree_obj = ft.GraphADT()
+    ftree_obj.add_vertex(data={"name": "A", "spouse_name": "Z", "gender": "Male"})
+    ftree_obj.add_child("Z", "P1", "Male")
+    ftree_obj.add_child("Z", "P1", "Male")
+    result = ftree_obj.get_relationship("P1", "Brother")
+    assert result == [], message.format("Brother of P1", [], result)
+
+
 def test_edge_creation():
     """
     Tests if the edge created is as expected with start and end vertices correct and 
@@ -129,6 +209,60 @@ def test_edge_creation():
     assert not bool(edge.start.incident_edges), message.format("u", "v", "v", bool(edge.start.incident_edges))
 
 
+def test_edge_store():
+    """
+    Tests EdgeStore class of the edges of GraphADT. Asserts the edges enumerated, looked up from a child and
+    from a parent and exported as columns, for the initial tree and a loaded tree, before and after a child is added,
+    and children read between additions without building the children arrays again.
+    """
+    message = "Edge store wrong. {} should be {} but returned {}"
+    for ftree_obj in (create_tree(), ft.GraphADT()):
+        if not ftree_obj.vertices:
+            ftree_obj.load_rows([("E", "Male", None, "B"), ("A", "Male", "Z", None), ("B", "Male", "X", "A"),
+                                 ("C", "Female", None, "Z"), ("D", "Female", "Y", "A"), ("F", "Female", None, "D"),
+                                 ("G", "Male", None, "D")])
+        people, ids, edges = ftree_obj.people, ftree_obj.ids, ftree_obj.edges
+        result = sorted((people[parent_id].name, people[child_id].name) for parent_id, child_id in edges)
+        expected = [("A", "B"), ("A", "C"), ("A", "D"), ("B", "E"), ("D", "F"), ("D", "G")]
+        assert result == expected, message.format("edges", expected, result)
+        result = [people[edges.parent(ids["E"])].name, edges.parent(ids["A"]), edges.parent(len(people) + 5)]
+        assert result == ["B", -1, -1], message.format("parents of E and A", ["B", -1, -1], result)
+        result = sorted(people[child_id].name for child_id in edges.children_of(ids["A"]))
+        assert result == ["B", "C", "D"], message.format("children of A", ["B", "C", "D"], result)
+        ftree_obj.add_child("D", "H", "Female")
+        result = [people[child_id].name for child_id in edges.children_of(ids["D"])]
+        assert result[-1] == "H" and len(edges) == 7, message.format("children of D", "F, G and H", result)
+        parent_ids, child_ids = edges.columns()
+        result = [(people[parent_id].name, people[child_id].name) for parent_id, child_id in zip(parent_ids, child_ids)]
+        assert result == [(people[parent_id].name, people[child_id].name) for parent_id, child_id in edges], \
+            message.format("columns", "the edges", result)
+
+
+    # children added between reads are read along with the built arrays until they are merged into them
+    edges = ft.EdgeStore()
+    for child_id in range(1, 5):
+        edges.add(0, child_id)
+    result = list(edges.children_of(0))
+    assert result == [1, 2, 3, 4], message.format("children of 0", [1, 2, 3, 4], result)
+    offsets = edges.offsets
+    children = [1, 2, 3, 4]
+    for child_id in (9, 7, 8):
+        edges.add(0, child_id)
+        edges.add(child_id, child_id + 10)
+        children = sorted(children + [child_id])
+        result = [list(edges.children_of(0)), list(edges.children_of(child_id)), edges.offsets is offsets]
+        assert result == [children, [child_id + 10], True], \
+            message.format("children after adding " + str(child_id), [children, [child_id + 10], True], result)
+    edges.add(1, 8)
+    result = [list(edges.children_of(0)), list(edges.children_of(1)), edges.offsets is offsets, len(edges)]
+    assert result == [[1, 2, 3, 4, 7, 9], [8], False, 10], \
+        message.format("children after moving 8", [[1, 2, 3, 4, 7, 9], [8], False, 10], result)
+    # a parent may get a person id after those of its children
+    edges.add(30, 5)
+    result = [list(edges.children_of(30)), edges.parent(5)]
+    assert result == [[5], 30], message.format("children of 30", [[5], 30], result)
+
+
 def test_add_child():
     """
     Tests if the child is added or not. Asserts add_child() method that child is added only through
@@ -155,6 +289,36 @@ def test_add_child():
     assert not result[6] == 1, message.format("V", "Y", -1, result[6])
 
 
+def test_add_children():
+    """
+    Tests add_children() method of GraphADT. Asserts that a batch gets the statuses of add_child() called row by
+    row, including rows whose mother is added in the batch or whose name is already taken, and that cached
+    results and the descendant index see the children of the batch.
+    """
+    message = "Batch child addition wrong. {} should be {} but returned {}"
+    rows = [("C", "I", "Male"), ("E", "J", "Female"), ("X", "K", "Male"), ("A", "L", "Female"),
+            ("Z", "M", "Male"), ("H", "N", "Female"), ("K", "O", "Female"), ("D", "P", "Female"),
+            ("Y", "Q", "Male"), ("Z", "F", "Female"), ("D", "R", "Male")]
+    expected_tree = create_tree()
+    expected = [expected_tree.add_child(*row) for row in rows]
+    ftree_obj = create_tree()
+    queries = [("A", "Daughter"), ("D", "Descendants"), ("F", "Siblings"), ("E", "Brother"), ("Y", "Son")]
+    for name, relation in queries:
+        ftree_obj.get_relationship(name, relation)
+    result = list(ftree_obj.add_children(rows))
+    assert result == expected == [-1, -1, 1, -1, 1, 0, -1, 1, -1, 1, 1], message.format("statuses", expected, result)
+    for name, relation in queries + [("M", "Siblings"), ("F", "Paternal-Aunt")]:
+        result = ftree_obj.get_relationship(name, relation)
+        expected = expected_tree.get_relationship(name, relation)
+        assert result == expected, message.format(name + " " + relation, expected, result)
+    index = ftree_obj.descendants
+    assert index.relabels == 1, message.format("relabels", 1, index.relabels)
+    assert index.count(ftree_obj.vertices["D"]) == 4, message.format("descendants of D", 4,
+                                                                    index.count(ftree_obj.vertices["D"]))
+    result = list(ftree_obj.add_children([]))
+    assert result == [], message.format("statuses of no rows", [], result)
+
+
 def test_get_relationship():
     """
     Tests get_relationship() method of GraphADT class. Asserts the list returned from the method with expected list
@@ -301,6 +465,555 @@ def test_get_relationship():
     assert result[61] == [], message.format("Brother-In-Law", "A", [], result[61])
 
 
+def test_registered_relations():
+    """
+    Tests the relations registered with register_relation(). Asserts the lists returned by get_relationship()
+    for relations added on top of the original ones and for a relation registered by the test.
+    """
+    ftree_obj = create_tree()
+    message = "Relationship wrong. {} of {} should be {} but returned {}"
+    ftree_obj.add_child("X", "H", "Female")
+    result = [ftree_obj.get_relationship("A", "Grandchild"), ftree_obj.get_relationship("Z", "Grandchild"),
+              ftree_obj.get_relationship("E", "Cousin"), ftree_obj.get_relationship("Y", "Cousin"),
+              ftree_obj.get_relationship("D", "Nephew"), ftree_obj.get_relationship("B", "Nephew")]
+    ft.register_relation("Niece", ft.RelationPath(ft.siblings_step(), ft.children_step("Female")))
+    try:
+        result.append(ftree_obj.get_relationship("D", "Niece"))
+        result.append(ftree_obj.get_relationship("D", "Unknown-Relation"))
+    finally:
+        # RELATIONS is shared by every test
+        del ft.RELATIONS["Niece"]
+    assert result[0] == ["E", "H", "F", "G"], message.format("Grandchild", "A", ["E", "H", "F", "G"], result[0])
+    assert result[1] == result[0], message.format("Grandchild", "Z", result[0], result[1])
+    assert result[2] == ["F", "G"], message.format("Cousin", "E", ["F", "G"], result[2])
+    assert result[3] == [], message.format("Cousin", "Y", [], result[3])
+    assert result[4] == ["E"], message.format("Nephew", "D", ["E"], result[4])
+    assert result[5] == ["G"], message.format("Nephew", "B", ["G"], result[5])
+    assert result[6] == ["H"], message.format("Niece", "D", ["H"], result[6])
+    assert result[7] == [], message.format("Unknown-Relation", "D", [], result[7])
+
+
+def test_chained_relations():
+    """
+    Tests chained relation expressions answered by ChainPlanner. Asserts the names reached by chains of
+    relations, through spouses and indexes, and that chains sharing a prefix share the people it reaches.
+    """
+    ftree_obj = create_tree()
+    message = "Chained relation wrong. {} of {} should be {} but returned {}"
+    ftree_obj.add_child("X", "H", "Female")
+    queries = [("A", "Son/Son", ["E"]), ("Z", "Daughter/Son", ["G"]), ("E", "Paternal-Uncle/Son", []),
+               ("E", "Cousin/Siblings", ["G", "F"]), ("Y", "Son/Sister", ["F"]),
+               ("A", "Grandchild/Ancestor-2", ["A"]), ("A", "Son/Nobody", []), ("Q", "Son/Son", None),
+               ("A", "Descendants/Male-Descendants", ["E", "G"]), ("F", "Ancestor-1/Sister-In-Law/Son", ["E"])]
+    for name, chain, expected in queries:
+        result = ftree_obj.get_relationship(name, chain)
+        assert result == expected, message.format(chain, name, expected, result)
+    result = list(ft.parse_commands(["GET_RELATIONSHIP King Arthur Son/Daughter\n"]))
+    expected = [("GET_RELATIONSHIP", "King Arthur", "Son/Daughter")]
+    assert result == expected, message.format("parsed command", "King Arthur", expected, result)
+
+    planner = ft.ChainPlanner(ftree_obj)
+    result = [list(planner.relationship_view("Z", chain)) for chain in ("Daughter/Son", "Daughter/Daughter")]
+    assert result == [["G"], ["F"]], message.format("Daughter/Son and Daughter/Daughter", "Z", [["G"], ["F"]], result)
+    assert len(planner.prefixes) == 3, message.format("prefixes reached", "Z", 3, len(planner.prefixes))
+    out = io.StringIO()
+    ft.process_commands(ftree_obj, ft.parse_commands(["GET_RELATIONSHIP Z Daughter/Son\n", "ADD_CHILD D I Male\n",
+                                                      "GET_RELATIONSHIP Z Daughter/Son\n"]), out)
+    expected = "G \nCHILD_ADDITION_SUCCEEDED\nG I \n"
+    assert out.getvalue() == expected, message.format("output", "Z", expected, out.getvalue())
+
+
+def test_reverse_relationship():
+    """
+    Tests reverse_relationship() method of GraphADT. Asserts that the names whose relation includes a name are
+    those found by querying the relation of every name, for relations, chains and indexes.
+    """
+    ftree_obj = create_tree()
+    message = "Reverse relationship wrong. Names whose {} includes {} should be {} but returned {}"
+    ftree_obj.add_child("X", "H", "Female")
+    names = ["A", "Z", "B", "X", "D", "Y", "E", "F", "G", "H", "C"]
+    relations = list(ft.RELATIONS) + ["Descendants", "Male-Descendants", "Ancestor-1", "Ancestor-2", "Son/Daughter",
+                                      "Siblings/Son", "Ancestor-1/Sister-In-Law"]
+    for relation in relations:
+        for name in names:
+            expected = {other for other in names if name in ftree_obj.get_relationship(other, relation)}
+            result = ftree_obj.reverse_relationship(name, relation)
+            assert set(result) == expected and len(result) == len(expected), \
+                message.format(relation, name, expected, result)
+    result = ftree_obj.reverse_relationship("Q", "Son")
+    assert result is None, message.format("Son", "Q", None, result)
+    out = io.StringIO()
+    ft.process_commands(ftree_obj, ft.parse_commands(["GET_REVERSE_RELATIONSHIP E Son\n",
+                                                      "GET_REVERSE_RELATIONSHIP G Nobody\n"]), out)
+    expected = "B X \nNONE\n"
+    assert out.getvalue() == expected, message.format("Son", "E", expected, out.getvalue())
+
+
+def test_relationship_view():
+    """
+    Tests relationship_view() method of GraphADT and RelationView class. Asserts that views hold the names of
+    get_relationship() for every relation and name, with their size, emptiness, membership and pages, and that
+    write_relationship() streams a view as format_relationship() formats it.
+    """
+    ftree_obj = create_tree()
+    message = "Relationship view wrong. {} should be {} but returned {}"
+    ftree_obj.add_child("X", "H", "Female")
+    relations = list(ft.RELATIONS) + ["Descendants", "Female-Descendants", "Descendant-Count", "Ancestor-1"]
+    for name in ["A", "Z", "B", "X", "D", "Y", "E", "F", "G", "H", "C", "Q"]:
+        for relation in relations:
+            expected = ftree_obj.get_relationship(name, relation)
+            view = ftree_obj.relationship_view(name, relation)
+            if expected is None:
+                assert view is None, message.format(name + " " + relation, None, view)
+                continue
+            result = [list(view), len(view), bool(view), view.page(1, 2), view.page(len(expected) + 1),
+                      all(item in view for item in expected), "Q" in view]
+            assert result == [expected, len(expected), bool(expected), expected[1:3], [], True, False], \
+                message.format(name + " " + relation, expected, result)
+            # pages from every offset, across the groups of the view
+            result = [view.page(offset, limit) for offset in range(len(expected)) for limit in (1, 3, None)]
+            pages = [expected[offset:None if limit is None else offset + limit]
+                     for offset in range(len(expected)) for limit in (1, 3, None)]
+            assert result == pages, message.format(name + " " + relation + " pages", pages, result)
+    view = ftree_obj.relationship_view("Z", "Grandchild")
+    assert len(view.parts) == 1, message.format("parts of a view of the children of a couple", 1, len(view.parts))
+    for page_size in (1, 2, ft.STREAM_PAGE):
+        out = io.StringIO()
+        ft.write_relationship(out, ftree_obj.relationship_view("A", "Descendants"), page_size)
+        expected = ft.format_relationship(ftree_obj.get_relationship("A", "Descendants")) + "\n"
+        assert out.getvalue() == expected, message.format("streamed output", expected, out.getvalue())
+
+
+def test_relationship_cache():
+    """
+    Tests the relationship cache of GraphADT class. Asserts that repeated queries are served from the cache,
+    that adding a child invalidates only the results of its family and that the least recently used result
+    is evicted once the cache is full.
+    """
+    ftree_obj = create_tree()
+    message = "Cache {} should be {} but returned {}"
+    ftree_obj.add_vertex(data={"name": "K", "spouse_name": None, "gender": "Male"})
+    ftree_obj.get_relationship("E", "Paternal-Aunt")
+    ftree_obj.get_relationship("K", "Son")
+    result = ftree_obj.get_relationship("E", "Paternal-Aunt")
+    result.append("mutated")
+    assert ftree_obj.get_relationship("E", "Paternal-Aunt") == ["C", "D"], message.format("copy", ["C", "D"], result)
+    assert ftree_obj.cache.hits == 2, message.format("hits", 2, ftree_obj.cache.hits)
+    assert ftree_obj.cache.misses == 2, message.format("misses", 2, ftree_obj.cache.misses)
+
+    ftree_obj.add_child("D", "H", "Female")
+    assert (ftree_obj.ids["K"], "Son") in ftree_obj.cache.entries, message.format("entry of K", "kept", "dropped")
+    assert (ftree_obj.ids["E"], "Paternal-Aunt") not in ftree_obj.cache.entries, \
+        message.format("entry of E", "dropped", "kept")
+    result = ftree_obj.get_relationship("E", "Paternal-Aunt")
+    assert result == ["C", "D"], message.format("result", ["C", "D"], result)
+    result = [ftree_obj.get_relationship("Y", "Daughter"), ftree_obj.get_relationship("H", "Sister")]
+    assert result == [["F", "H"], ["F"]], message.format("result", [["F", "H"], ["F"]], result)
+
+    ftree_obj = ft.GraphADT(cache_size=2)
+    ftree_obj.add_vertex(data={"name": "A", "spouse_name": "Z", "gender": "Male"})
+    result = [ftree_obj.get_relationship(name, "Son") for name in ("A", "Z", "A", "B")]
+    ftree_obj.add_vertex(data={"name": "B", "spouse_name": None, "gender": "Male"})
+    result.append(ftree_obj.get_relationship("B", "Son"))
+    assert result == [[], [], [], None, []], message.format("result", [[], [], [], None, []], result)
+    assert ftree_obj.cache.evictions == 1, message.format("evictions", 1, ftree_obj.cache.evictions)
+    assert ft.GraphADT(cache_size=0).cache is None, message.format("of size 0", None, "a cache")
+
+    # cached results of registered relations reaching further than the family of a child are invalidated too
+    ftree_obj = ft.GraphADT()
+    rows = list(tree_generator.generate_rows(300, seed=3))
+    ftree_obj.load_rows(rows)
+    names = tree_generator.names_of(rows)
+    ft.register_relation("Great-Grandchild", ft.RelationPath(ft.children_step(), ft.children_step(),
+                                                             ft.children_step()))
+    try:
+        for name in names:
+            ftree_obj.get_relationship(name, "Great-Grandchild")
+        for index, name in enumerate(names[::7]):
+            ftree_obj.add_child(name, "N{}".format(index), "Male")
+        result = [ftree_obj.get_relationship(name, "Great-Grandchild") for name in names]
+        expected = [ftree_obj.evaluate_relationship(name, "Great-Grandchild") for name in names]
+    finally:
+        del ft.RELATIONS["Great-Grandchild"]
+    assert result == expected, message.format("Great-Grandchild", expected, result)
+
+
+def test_materialized_views():
+    """
+    Tests watch() method of GraphADT and MaterializedViews class. Asserts that watched names are answered from
+    their views, that adding children evaluates again exactly the results they change, one by one or in a batch,
+    and that the views are evaluated again after a merge.
+    """
+    ftree_obj = create_tree()
+    message = "Materialized views {} should be {} but returned {}"
+    names = ["A", "Z", "B", "X", "C", "D", "Y", "E", "F", "G"]
+    result = ftree_obj.watch(names + ["Q"])
+    assert result == len(names), message.format("names watched", len(names), result)
+    views = ftree_obj.materialized
+
+    def results():
+        return {(name, relation): ftree_obj.evaluate_relationship(name, relation)
+                for name in names for relation in ft.RELATIONS}
+
+    before = results()
+    ftree_obj.add_child("D", "H", "Female")
+    after = results()
+    changed = sum(before[key] != after[key] for key in after)
+    assert views.recomputed == changed, message.format("results evaluated again", changed, views.recomputed)
+    before = after
+    ftree_obj.add_children([("X", "I", "Male"), ("D", "J", "Male")])
+    after = results()
+    for name, relation in after:
+        view = views.get(ftree_obj.ids[name], relation)
+        assert list(view) == after[(name, relation)], message.format(name + " " + relation, after[(name, relation)],
+                                                                     view)
+    result = ftree_obj.get_relationship("D", "Son")
+    assert result == ["G", "J"], message.format("D Son", ["G", "J"], result)
+    changed += sum(before[key] != after[key] for key in after)
+    assert views.recomputed == changed, message.format("results evaluated again", changed, views.recomputed)
+    stats = views.stats()
+    assert [stats["inserts"], stats["persons"], sum(views.fanouts.values())] == [3, len(names), 3], \
+        message.format("stats", [3, len(names), 3], stats)
+
+    other = ft.GraphADT()
+    other.add_vertex(data={"name": "E", "spouse_name": "K", "gender": "Male"})
+    other.add_vertex(data={"name": "L", "spouse_name": None, "gender": "Female"})
+    other.add_edge(other.vertices["E"], other.vertices["L"])
+    ftree_obj.merge(other)
+    result = [ftree_obj.get_relationship("E", "Daughter"), ftree_obj.get_relationship("A", "Grandchild")]
+    expected = [["L"], ftree_obj.evaluate_relationship("A", "Grandchild")]
+    assert result == expected, message.format("after merge", expected, result)
+
+
+def test_person_ids():
+    """
+    Tests the person ids of GraphADT class. Asserts that ids interns every name and spouse name to the person id
+    of its vertex, spouse names first, as vertices are added, replaced and loaded in bulk, and that a spouse name
+    shared by two vertices resolves to the other one when the first is replaced.
+    """
+    message = "Person id of {} should be {} but returned {}"
+    ftree_obj = create_tree()
+    for vertex in ftree_obj.people:
+        assert ftree_obj.people[vertex.id] is vertex, message.format(vertex.name, "its index", vertex.id)
+    for name, vertex in ftree_obj.vertices.items():
+        assert ftree_obj.ids[name] == vertex.id, message.format(name, vertex.id, ftree_obj.ids[name])
+    for name, vertex in ftree_obj.spouses.items():
+        assert ftree_obj.ids[name] == vertex.spouse.id, message.format(name, vertex.spouse.id, ftree_obj.ids[name])
+    assert len(ftree_obj.ids) == len(ftree_obj.vertices) + len(ftree_obj.spouses), \
+        message.format("all names", "interned", len(ftree_obj.ids))
+
+    # A is replaced by a vertex without spouse, Z is no longer a spouse name
+    ftree_obj.add_vertex(data={"name": "A", "spouse_name": None, "gender": "Male"})
+    ftree_obj.add_vertex(data={"name": "W", "spouse_name": "B", "gender": "Female"})
+    result = [ftree_obj.ids["A"], "Z" in ftree_obj.ids, ftree_obj.ids["B"]]
+    expected = [ftree_obj.vertices["A"].id, False, ftree_obj.vertices["W"].spouse.id]
+    assert result == expected, message.format("A, Z and B", expected, result)
+    # the vertex of B stays in the vertices view behind the spouse vertex of W
+    b = ftree_obj.vertices["B"]
+    result = [b.name, b.id != ftree_obj.ids["B"], ftree_obj.spouses["B"].name, "B" in dict(ftree_obj.vertices)]
+    assert result == ["B", True, "W", True], message.format("B", ["B", True, "W", True], result)
+    assert len(ftree_obj.ids) == len(ftree_obj.vertices) + len(ftree_obj.spouses) - 1, \
+        message.format("all names", "interned", len(ftree_obj.ids))
+
+    ftree_obj = ft.GraphADT()
+    ftree_obj.load_rows([("P", "Female", "Q", None), ("Q", "Male", None, "P"), ("R", "Male", "Q", "P")])
+    result = [ftree_obj.ids[name] for name in ("P", "Q", "R")]
+    assert result == [0, 1, 3], message.format("loaded names", [0, 1, 3], result)
+
+    # Z resolves to B, also married to Z, once A is replaced, and to nobody once the only vertex married to Z is
+    ftree_obj = ft.GraphADT()
+    ftree_obj.add_vertex(data={"name": "A", "spouse_name": "Z", "gender": "Male"})
+    ftree_obj.add_vertex(data={"name": "B", "spouse_name": "Z", "gender": "Male"})
+    result = [ftree_obj.add_child("Z", "A", "Female"), ftree_obj.get_spouse_name("Z"),
+              ftree_obj.get_relationship("B", "Daughter"), ftree_obj.ids["Z"] == ftree_obj.vertices["B"].spouse.id]
+    assert result == [1, "B", ["A"], True], message.format("Z", [1, "B", ["A"], True], result)
+    ftree_obj = ft.GraphADT()
+    ftree_obj.add_vertex(data={"name": "A", "spouse_name": "Z", "gender": "Male"})
+    result = [ftree_obj.add_child("Z", "A", "Female"), "Z" in ftree_obj.ids, len(ftree_obj.spouses)]
+    assert result == [-1, False, 0], message.format("Z", [-1, False, 0], result)
+
+
+def test_merge():
+    """
+    Tests merge() method of GraphADT class and spouse vertices. Asserts that Y, who married into the initial tree,
+    gets the family of a second tree, that in-law and uncle relations then go through Y's vertex, that children
+    known to both trees are kept once, and that a person of another gender in the second tree is refused.
+    """
+    message = "Merged tree wrong. {} should be {} but returned {}"
+    ftree_obj = create_tree()
+    y = ftree_obj.people[ftree_obj.ids["Y"]]
+    result = [y.spouse is ftree_obj.vertices["D"], y.gender, ftree_obj.get_relationship("G", "Paternal-Uncle")]
+    assert result == [True, "Male", []], message.format("spouse vertex of Y", [True, "Male", []], result)
+
+    other = ft.GraphADT()
+    other.load_rows([("M", "Male", "N", None), ("Y", "Male", "D", "M"), ("V", "Female", "U", "M"),
+                     ("T", "Male", None, "M"), ("F", "Female", None, "Y"), ("K", "Male", None, "Y")])
+    count = ftree_obj.merge(other)
+    assert count == 6, message.format("number of people added", 6, count)
+    for name, relation, expected in (("Y", "Siblings", ["V", "T"]), ("Y", "Ancestor-1", ["M"]),
+                                     ("D", "Sister-In-Law", ["X", "V"]), ("D", "Brother-In-Law", ["T"]),
+                                     ("G", "Paternal-Uncle", ["T"]), ("F", "Paternal-Aunt", ["V"]),
+                                     ("Y", "Son", ["G", "K"]), ("N", "Grandchild", ["F", "G", "K"]),
+                                     ("K", "Sister", ["F"]), ("U", "Brother-In-Law", ["Y", "T"]),
+                                     ("Y", "Descendants", ["F", "G", "K"]), ("E", "Siblings", [])):
+        result = ftree_obj.get_relationship(name, relation)
+        assert result == expected, message.format(relation + " of " + name, expected, result)
+    assert ftree_obj.vertices["Y"] is y, message.format("Y", "its spouse vertex", ftree_obj.vertices["Y"])
+    # the cached results of the parents of Y change with the children of D and Y
+    ftree_obj.add_child("D", "H", "Female")
+    result = ftree_obj.get_relationship("N", "Grandchild")
+    assert result == ["F", "G", "K", "H"], message.format("Grandchild of N", ["F", "G", "K", "H"], result)
+
+    other = ft.GraphADT()
+    other.load_rows([("E", "Female", None, None)])
+    with pytest.raises(ValueError):
+        ftree_obj.merge(other)
+
+    # Q is merged before E conflicts
+    ftree_obj = create_tree()
+    result = [ftree_obj.get_relationship("A", "Son"), ftree_obj.get_relationship("A", "Descendant-Count")]
+    other = ft.GraphADT()
+    other.load_rows([("A", "Male", "Z", None), ("Q", "Male", None, "A"), ("E", "Female", None, "Q")])
+    with pytest.raises(ValueError):
+        ftree_obj.merge(other)
+    result += [ftree_obj.get_relationship("A", "Son"), ftree_obj.get_relationship("A", "Descendant-Count")]
+    expected = [["B"], ["6"], ["B", "Q"], ["7"]]
+    assert result == expected, message.format("Son and Descendant-Count of A after a failed merge", expected, result)
+
+
+def test_load(tmp_path):
+    """
+    Tests load() method of GraphADT class. Asserts that a tree loaded from a CSV or JSON-lines file,
+    with a child row before its parent row and a spouse as parent, answers relationships as create_tree() does.
+    """
+    message = "Loaded tree wrong. {} of {} should be {} but returned {}"
+    csv_file = tmp_path / "tree.csv"
+    csv_file.write_text("name,gender,spouse_name,parent\nA,Male,Z,\nB,Male,X,A\nC,Female,,Z\nE,Male,,B\n"
+                        "F,Female,,D\nD,Female,Y,A\nG,Male,,D\n")
+    jsonl_file = tmp_path / "tree.jsonl"
+    jsonl_file.write_text("\n".join(json.dumps(row) for row in (
+        {"name": "A", "gender": "Male", "spouse_name": "Z"}, {"name": "E", "gender": "Male", "parent": "B"},
+        {"name": "B", "gender": "Male", "spouse_name": "X", "parent": "A"},
+        {"name": "C", "gender": "Female", "parent": "A"},
+        {"name": "D", "gender": "Female", "spouse_name": "Y", "parent": "A"},
+        {"name": "F", "gender": "Female", "parent": "D"}, {"name": "G", "gender": "Male", "parent": "D"})))
+    expected = create_tree()
+    for path in (csv_file, jsonl_file):
+        ftree_obj = ft.GraphADT()
+        stats = ftree_obj.load(str(path))
+        assert stats["rows"] == 7, message.format("rows", path.name, 7, stats["rows"])
+        for name in ("A", "B", "C", "D", "E", "F", "G", "X", "Y", "Z"):
+            for relation in ("Son", "Daughter", "Siblings", "Sister-In-Law", "Maternal-Aunt", "Cousin"):
+                result = ftree_obj.get_relationship(name, relation)
+                assert sorted(result) == sorted(expected.get_relationship(name, relation)), \
+                    message.format(relation, name, expected.get_relationship(name, relation), result)
+    bad_file = tmp_path / "bad.csv"
+    bad_file.write_text("name,gender,spouse_name,parent\nE,Male,,B\n")
+    with pytest.raises(ValueError):
+        ft.GraphADT().load(str(bad_file))
+
+
+def test_snapshot(tmp_path):
+    """
+    Tests save_snapshot() and MappedTree of snapshot module. Asserts that a tree opened from its snapshot
+    answers spouse searches and relationships the same as the tree it was saved from, merged trees included, and
+    that load_snapshot() rebuilds the tree.
+    """
+    ftree_obj = create_tree()
+    ftree_obj.add_child("Z", "H", "Female")
+    message = "Snapshot wrong. {} of {} should be {} but returned {}"
+    path = str(tmp_path / "tree.snap")
+    count = snapshot.save_snapshot(ftree_obj, path)
+    # spouse vertices X, Y and Z are vertices of the snapshot
+    assert count == 11, message.format("vertex count", path, 11, count)
+    with snapshot.MappedTree(path) as mapped_tree:
+        assert mapped_tree.find("H") >= 0, message.format("id", "H", "an id", mapped_tree.find("H"))
+        assert mapped_tree.find("I") == -1, message.format("id", "I", -1, mapped_tree.find("I"))
+        for name in ("A", "B", "C", "D", "E", "F", "G", "H", "I", "X", "Y", "Z"):
+            result = (mapped_tree.spouse_search(name), mapped_tree.get_spouse_name(name))
+            expected = (ftree_obj.spouse_search(name), ftree_obj.get_spouse_name(name))
+            assert result == expected, message.format("spouse", name, expected, result)
+            for relation in list(ft.RELATIONS) + ["Unknown-Relation"]:
+                result = mapped_tree.get_relationship(name, relation)
+                expected = ftree_obj.get_relationship(name, relation)
+                assert result == expected, message.format(relation, name, expected, result)
+
+    # the replaced root is only reachable as the parent of its children
+    ftree_obj.add_child("X", "A", "Male")
+    snapshot.save_snapshot(ftree_obj, path)
+    with snapshot.MappedTree(path) as mapped_tree:
+        for name in ("A", "B", "C", "D", "E", "F", "G", "H", "X", "Y", "Z"):
+            for relation in ft.RELATIONS:
+                result = mapped_tree.get_relationship(name, relation)
+                expected = ftree_obj.get_relationship(name, relation)
+                assert result == expected, message.format(relation, name + " of a tree with a replaced vertex",
+                                                          expected, result)
+
+    # Y married into the tree and has the parents, siblings and children of another tree
+    ftree_obj = create_tree()
+    other = ft.GraphADT()
+    other.load_rows([("M", "Male", "N", None), ("Y", "Male", "D", "M"), ("V", "Female", "U", "M"),
+                     ("T", "Male", None, "M"), ("F", "Female", None, "Y"), ("K", "Male", None, "Y")])
+    ftree_obj.merge(other)
+    snapshot.save_snapshot(ftree_obj, path)
+    loaded = snapshot.load_snapshot(path)
+    with snapshot.MappedTree(path) as mapped_tree:
+        for name in ("A", "D", "E", "F", "G", "K", "M", "N", "T", "U", "V", "Y", "Z"):
+            for relation in ft.RELATIONS:
+                expected = ftree_obj.get_relationship(name, relation)
+                for tree, result in (("snapshot", mapped_tree.get_relationship(name, relation)),
+                                     ("loaded tree", loaded.get_relationship(name, relation))):
+                    assert result == expected, message.format(relation, name + " of a merged " + tree, expected,
+                                                              result)
+    bad_file = tmp_path / "bad.snap"
+    bad_file.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        snapshot.MappedTree(str(bad_file))
+
+
+def check_bulk_query(tmp_path, vectorized):
+    """
+    Asserts that the results of a relation for all names at once from a ColumnarTree of bulk module are the
+    results of get_relationship() for every name, for a tree with replaced vertices and spouses merged from
+    another tree, and for its snapshot.
+    :param tmp_path: pathlib.Path
+        directory of the snapshot
+    :param vectorized: bool
+        True to check the NumPy steps, False to check the loops over the arrays
+    """
+    ftree_obj = ft.GraphADT()
+    rows = list(tree_generator.generate_rows(300, seed=3))
+    ftree_obj.load_rows(rows)
+    for index in range(0, 60, 3):
+        ftree_obj.add_child("P{}".format(index), "P{}".format(index * 2), "Female")
+    other = ft.GraphADT()
+    other.load_rows([("M", "Male", "N", None), ("S1", "Male", "P1", "M"), ("S5", "Female", "P5", "M"),
+                     ("T", "Male", None, "M"), ("Q", "Female", None, "S5")])
+    ftree_obj.merge(other)
+    names = tree_generator.names_of(rows) + ["M", "N", "T", "Q", "Nobody"]
+    path = str(tmp_path / "tree.snap")
+    snapshot.save_snapshot(ftree_obj, path)
+    message = "Bulk query wrong. {} of {} should be {} but returned {}"
+    with snapshot.MappedTree(path) as mapped_tree:
+        for columnar_tree in (bulk.ColumnarTree.from_graph(ftree_obj, vectorized),
+                              bulk.ColumnarTree.from_mapped(mapped_tree, vectorized)):
+            assert columnar_tree.vectorized == vectorized, \
+                message.format("vectorized", "tree", vectorized, columnar_tree.vectorized)
+            for relation in list(ft.RELATIONS) + ["Unknown-Relation"]:
+                results = columnar_tree.query(names, relation)
+                assert len(results) == len(names), message.format("count", relation, len(names), len(results))
+                for name, result in zip(names, results):
+                    expected = ftree_obj.get_relationship(name, relation)
+                    assert result == expected, message.format(relation, name, expected, result)
+        # NumPy arrays of a ColumnarTree keep the snapshot mapped
+        del columnar_tree
+    columnar_tree = bulk.ColumnarTree.from_graph(ftree_obj, vectorized)
+    generations = columnar_tree.generations()
+    vertex_ids = [vertex.id for vertex in ftree_obj.vertices.values() if generations[vertex.id] == 2]
+    results = columnar_tree.query_ids(vertex_ids, "Maternal-Aunt")
+    for index, vertex_id in enumerate(vertex_ids):
+        name = columnar_tree.string(vertex_id)
+        result, expected = results.names(index), ftree_obj.get_relationship(name, "Maternal-Aunt")
+        assert result == expected, message.format("Maternal-Aunt", name, expected, result)
+
+
+def test_bulk_query(tmp_path):
+    """
+    Tests ColumnarTree of bulk module looping over the arrays, which needs no optional dependency.
+    """
+    check_bulk_query(tmp_path, False)
+
+
+@pytest.mark.skipif(bulk.numpy is None, reason="numpy is not installed")
+def test_bulk_query_vectorized(tmp_path):
+    """
+    Tests ColumnarTree of bulk module with NumPy array operations. Skipped if numpy is not installed.
+    """
+    check_bulk_query(tmp_path, True)
+
+
+def test_mutation_log(tmp_path):
+    """
+    Tests MutationLog of wal module. Asserts that only successful add_child() calls are logged, that they are
+    replayed on top of the base tree or a snapshot after compaction, that a torn last record is ignored, that
+    records already in the snapshot are not replayed again and that a group is committed after its interval.
+    """
+    message = "Mutation log wrong. {} should be {} but returned {}"
+    log_path = str(tmp_path / "tree.wal")
+    snapshot_path = str(tmp_path / "tree.snap")
+    ftree_obj = create_tree()
+    log = wal.recover(ftree_obj, log_path, group_size=2, group_interval=60)
+    result = [ftree_obj.add_child("Z", "H", "Female"), ftree_obj.add_child("A", "I", "Male"),
+              ftree_obj.add_child("D", "J", "Male")]
+    assert result == [1, -1, 1], message.format("statuses", [1, -1, 1], result)
+    assert log.commits == 1, message.format("commits", 1, log.commits)
+    ftree_obj.add_child("X", "K", "Male")
+    log.close()
+
+    ftree_obj = create_tree()
+    log = wal.recover(ftree_obj, log_path)
+    result = ftree_obj.get_relationship("A", "Daughter"), ftree_obj.get_relationship("E", "Siblings")
+    assert result == (["C", "D", "H"], ["K"]), message.format("replayed tree", (["C", "D", "H"], ["K"]), result)
+    log.compact(ftree_obj, snapshot_path)
+    ftree_obj.add_child("D", "L", "Male")
+    log.close()
+    with open(log_path, "a") as f:
+        f.write("D\tM")
+
+    ftree_obj = snapshot.load_snapshot(snapshot_path)
+    log = wal.recover(ftree_obj, log_path)
+    ftree_obj.add_child("D", "N", "Female")
+    log.close()
+    with open(log_path) as f:
+        result = f.read()
+    assert result == "D\tL\tMale\nD\tN\tFemale\n", message.format("log", "2 records", result)
+    result = ftree_obj.get_relationship("D", "Son"), ftree_obj.get_relationship("M", "Siblings")
+    assert result == (["G", "J", "L"], None), message.format("recovered tree", (["G", "J", "L"], None), result)
+
+    # a crash in compact() after the snapshot was replaced leaves the records of the snapshot in the log
+    snapshot.save_snapshot(ftree_obj, snapshot_path)
+    ftree_obj = snapshot.load_snapshot(snapshot_path)
+    log = wal.recover(ftree_obj, log_path, group_size=100, group_interval=0.01)
+    result = ftree_obj.get_relationship("D", "Son"), ftree_obj.get_relationship("D", "Daughter")
+    assert result == (["G", "J", "L"], ["F", "N"]), message.format("tree recovered after a crash in compact()",
+                                                                   (["G", "J", "L"], ["F", "N"]), result)
+    ftree_obj.add_child("D", "O", "Male")
+    for _ in range(100):
+        if log.commits:
+            break
+        time.sleep(0.05)
+    assert log.commits == 1, message.format("commits after the group interval", 1, log.commits)
+    log.close()
+
+
+def test_tree_generator():
+    """
+    Tests generate_rows() and generate_commands() of tree_generator module. Asserts that the same arguments
+    generate the same tree, that size and depth are honoured and that the tree and commands can be run.
+    """
+    message = "Generated tree wrong. {} should be {} but returned {}"
+    rows = list(tree_generator.generate_rows(500, fanout=2, marriage_rate=0.7, seed=3))
+    assert rows == list(tree_generator.generate_rows(500, fanout=2, marriage_rate=0.7, seed=3)), \
+        message.format("rows of the same seed", "the same", "different rows")
+    assert len(rows) == 500, message.format("number of rows", 500, len(rows))
+    ftree_obj = ft.GraphADT()
+    ftree_obj.load_rows(rows)
+    depths = []
+    for vertex in ftree_obj.vertices.values():
+        depth = 0
+        while vertex.parent is not None:
+            vertex, depth = vertex.parent, depth + 1
+        depths.append(depth)
+    shallow_rows = list(tree_generator.generate_rows(500, fanout=2, depth=2, seed=3))
+    assert max(depths) > 2, message.format("depth", "more than 2", max(depths))
+    assert 1 < len(shallow_rows) <= 1 + 4 + 16, message.format("rows of depth 2", "at most 21", len(shallow_rows))
+    names = tree_generator.names_of(rows)
+    lines = list(tree_generator.generate_commands(names, 1000, add_ratio=0.2, seed=3))
+    out = io.StringIO()
+    count = ft.process_commands(ftree_obj, ft.parse_commands(lines), out)
+    assert count == 1000, message.format("commands processed", 1000, count)
+
+
 def test_spouse_search():
     """
     Tests the spouse_search() method of GraphADT class. This method is expected to return
@@ -335,6 +1048,26 @@ def test_get_spouse_name():
     assert not result[3] == "Z", message.format("A", "", result[3])
 
 
+def test_spouse_index():
+    """
+    Tests the spouse index of GraphADT class. The index is expected to map every spouse_name to its vertex
+    and to be kept up to date when vertices are added or replaced.
+    """
+    ftree_obj = create_tree()
+    message = "Spouse index of {} should be {}, but returned {}"
+    result = [ftree_obj.spouses["Z"].name, ftree_obj.spouses["Y"].name, "A" in ftree_obj.spouses]
+    ftree_obj.add_child("Y", "H", "Male")
+    ftree_obj.add_vertex(data={"name": "H", "spouse_name": "W", "gender": "Male"})
+    result.append(ftree_obj.get_spouse_name("W"))
+    ftree_obj.add_vertex(data={"name": "H", "spouse_name": None, "gender": "Male"})
+    result.append(ftree_obj.spouse_search("W"))
+    assert result[0] == "A", message.format("Z", "A", result[0])
+    assert result[1] == "D", message.format("Y", "D", result[1])
+    assert result[2] == False, message.format("A", False, result[2])
+    assert result[3] == "H", message.format("W", "H", result[3])
+    assert result[4] == False, message.format("W", False, result[4])
+
+
 def test_print_child_addition(capsys):
     """
     Tests if the output printed to the command prompt is as expected to the respective inputs.
@@ -400,5 +1133,243 @@ def test_print_relationship(capsys):
     assert not captured.out == " \n", message.format("NONE", captured.out)
 
 
+def test_process_commands():
+    """
+    Tests parse_commands() and process_commands(). Asserts the command tuples parsed from input lines
+    and the output written for them, which must be the same for any flush size.
+    """
+    message = "Commands parsed from {} should be {} but returned {}"
+    lines = ["ADD_CHILD Z H Male\n", "\n", "GET_RELATIONSHIP King Arthur Son\n", "GET_RELATIONSHIP E Paternal-Uncle"]
+    result = list(ft.parse_commands(lines))
+    assert result == [("ADD_CHILD", "Z", "H", "Male"), ("GET_RELATIONSHIP", "King Arthur", "Son"),
+                      ("GET_RELATIONSHIP", "E", "Paternal-Uncle")], message.format(lines, "3 tuples", result)
+
+    message = "Output of process_commands with flush size {} should be {} but returned {}"
+    expected = "CHILD_ADDITION_SUCCEEDED\nPERSON_NOT_FOUND\nH \n"
+    for flush_size in (1, 2, ft.FLUSH_SIZE):
+        out = io.StringIO()
+        count = ft.process_commands(create_tree(), ft.parse_commands(lines), out, flush_size)
+        assert count == 3, message.format(flush_size, 3, count)
+        assert out.getvalue() == expected, message.format(flush_size, expected, out.getvalue())
+
+
+def test_command_parser():
+    """
+    Tests CommandParser class. Asserts that names of several words are matched against the names and spouse names
+    of the tree, that relation names are interned, that a binary file read in chunks splitting lines and
+    multi-byte characters is parsed the same as its lines and that without a tree the child name is one word.
+    """
+    message = "Commands parsed from {} should be {} but returned {}"
+    ftree_obj = ft.GraphADT()
+    ftree_obj.load_rows([("Mary Ann", "Female", "John Paul Smith", None), ("Lee", "Male", "Zoë", "Mary Ann")])
+    lines = ["GET_RELATIONSHIP Mary Ann Son\n", "GET_RELATIONSHIP John Paul Smith Son\n",
+             "ADD_CHILD Mary Ann Tom Lee Male\n", "GET_RELATIONSHIP Lee Kinship Mary Ann\n",
+             "GET_RELATIONSHIP No Body Sister-In-Law\n", "GET_RELATIONSHIP Mary\n", "JUMP Lee\n", "  \n",
+             "GET_RELATIONSHIP Zoë Son"]
+    expected = [("GET_RELATIONSHIP", "Mary Ann", "Son"), ("GET_RELATIONSHIP", "John Paul Smith", "Son"),
+                ("ADD_CHILD", "Mary Ann", "Tom Lee", "Male"), ("GET_RELATIONSHIP", "Lee", "Kinship", "Mary Ann"),
+                ("GET_RELATIONSHIP", "No Body", "Sister-In-Law"), ("GET_RELATIONSHIP", "Zoë", "Son")]
+    parser = ft.CommandParser(ftree_obj)
+    result = list(parser.parse(lines))
+    assert result == expected, message.format(lines, expected, result)
+    relation = next(key for key in ft.RELATIONS if key == "Son")
+    assert result[0][2] is relation, message.format("relation", "interned", "a copy")
+    for chunk_size in (1, 7, ft.CHUNK_SIZE):
+        result = list(parser.parse_stream(io.BytesIO("".join(lines).encode()), chunk_size))
+        assert result == expected, message.format("chunks of {} bytes".format(chunk_size), expected, result)
+    lines = ["ADD_CHILD Queen Margaret Bob Male\n", "GET_RELATIONSHIP Mary Ann Son\n"]
+    expected = [("ADD_CHILD", "Queen Margaret", "Bob", "Male"), ("GET_RELATIONSHIP", "Mary Ann", "Son")]
+    result = list(ft.CommandParser().parse(lines))
+    assert result == expected, message.format(lines, expected, result)
+
+
+def test_ancestry():
+    """
+    Tests AncestryIndex class and the Ancestor-N, Common-Ancestor and Kinship relations of GraphADT. Asserts the
+    ancestors found on a tree 40 generations deep, and on the initial tree as it grows, against its parent links.
+    """
+    message = "Ancestry wrong. {} should be {} but returned {}"
+    ftree_obj = ft.GraphADT()
+    rows = [("P{}".format(index), "Female", "S{}".format(index), "P{}".format(index - 1) if index else None)
+            for index in range(40)]
+    ftree_obj.load_rows(rows + [("Q", "Male", None, "P20")])
+    for relation, other, expected in (("Ancestor-37", None, ["P2"]), ("Ancestor-39", None, ["P0"]),
+                                      ("Ancestor-40", None, []), ("Ancestor-0", None, []),
+                                      ("Common-Ancestor", "Q", ["P20"]), ("Kinship", "Q", ["20"]),
+                                      ("Common-Ancestor", "P5", ["P5"]), ("Kinship", "P39", ["0"]),
+                                      ("Kinship", "S3", []), ("Kinship", "R", None)):
+        result = ftree_obj.get_relationship("P39", relation, other)
+        assert result == expected, message.format(relation + " of P39", expected, result)
+
+    ftree_obj = create_tree()
+    assert ftree_obj.ancestry is None, message.format("index before the first query", None, ftree_obj.ancestry)
+    lines = ["GET_RELATIONSHIP E Ancestor-2\n", "GET_RELATIONSHIP E Common-Ancestor G\n",
+             "GET_RELATIONSHIP E Kinship G\n", "GET_RELATIONSHIP B Kinship E\n", "GET_RELATIONSHIP Z Ancestor-1\n",
+             "GET_RELATIONSHIP E Kinship I\n",
+             "ADD_CHILD D H Female\n", "GET_RELATIONSHIP H Ancestor-2\n", "GET_RELATIONSHIP H Kinship F\n"]
+    result = list(ft.parse_commands(lines))[1]
+    assert result == ("GET_RELATIONSHIP", "E", "Common-Ancestor", "G"), message.format("command", "4 items", result)
+    out = io.StringIO()
+    ft.process_commands(ftree_obj, ft.parse_commands(lines), out)
+    expected = "A \nA \n4 \n1 \nNONE\nPERSON_NOT_FOUND\nCHILD_ADDITION_SUCCEEDED\nA \n2 \n"
+    assert out.getvalue() == expected, message.format("output", expected, out.getvalue())
+    h = ftree_obj.vertices["H"]
+    assert ftree_obj.ancestry.depth[h] == 2, message.format("depth of H", 2, ftree_obj.ancestry.depth.get(h))
+
+
+def test_descendants():
+    """
+    Tests DescendantIndex class and the descendant relations of GraphADT. Asserts the descendants, their number
+    and descendant tests of the initial tree, before and after children are labelled in place.
+    """
+    ftree_obj = create_tree()
+    message = "Descendants wrong. {} should be {} but returned {}"
+    lines = ["GET_RELATIONSHIP A Descendants\n", "GET_RELATIONSHIP A Female-Descendants\n",
+             "GET_RELATIONSHIP Z Descendant-Count\n", "GET_RELATIONSHIP E Descendant-Count\n",
+             "GET_RELATIONSHIP E Is-Descendant-Of A\n", "GET_RELATIONSHIP Z Is-Descendant-Of A\n",
+             "GET_RELATIONSHIP A Is-Descendant-Of E\n", "GET_RELATIONSHIP E Is-Descendant-Of I\n",
+             "ADD_CHILD D H Female\n", "GET_RELATIONSHIP A Descendants\n", "GET_RELATIONSHIP Y Male-Descendants\n",
+             "GET_RELATIONSHIP H Is-Descendant-Of Y\n"]
+    out = io.StringIO()
+    ft.process_commands(ftree_obj, ft.parse_commands(lines), out)
+    expected = ("B E C D F G \nC D F \n6 \n0 \nYES \nNO \nNO \nPERSON_NOT_FOUND\nCHILD_ADDITION_SUCCEEDED\n"
+                "B E C D F G H \nG \nYES \n")
+    assert out.getvalue() == expected, message.format("output", expected, out.getvalue())
+    index = ftree_obj.descendants
+    assert index.relabels == 1, message.format("relabels", 1, index.relabels)
+    h, d = ftree_obj.vertices["H"], ftree_obj.vertices["D"]
+    assert index.exit[ftree_obj.vertices["G"]] < index.enter[h] < index.exit[h] < index.exit[d], \
+        message.format("interval of H", "inside interval of D after G", (index.enter[h], index.exit[h]))
+
+    # leaves added one by one stay pending until the descendants are read, then go into order with one merge
+    for number in range(20):
+        ftree_obj.add_child("D", "K{}".format(number), "Male" if number % 2 else "Female")
+    result = [len(index.pending[None]), index.is_descendant(ftree_obj.vertices["K19"], d), index.count(d),
+              index.count(d, "Male"), index.pending, index.relabels]
+    expected = [20, True, 23, 11, {}, 1]
+    assert result == expected, message.format("pending leaves", expected, result)
+    result = [vertex.name for vertex in index.descendants(d)][-2:]
+    assert result == ["K18", "K19"], message.format("last descendants of D", ["K18", "K19"], result)
+
+
+def test_metrics(tmp_path):
+    """
+    Tests Metrics class of metrics module. Asserts that commands run with metrics are answered the same as
+    without, and the counts of the stages, relations and names that are recorded.
+    """
+    message = "Metrics wrong. {} should be {} but returned {}"
+    lines = ["ADD_CHILD Z H Male\n", "GET_RELATIONSHIP X Son\n", "GET_RELATIONSHIP E Paternal-Uncle\n",
+             "GET_RELATIONSHIP E Paternal-Uncle\n", "GET_RELATIONSHIP I Son\n", "GET_RELATIONSHIP E Ancestor-1\n",
+             "GET_RELATIONSHIP E Ancestor-1\n"]
+    expected = io.StringIO()
+    ft.process_commands(create_tree(), ft.parse_commands(lines), expected)
+    tree_metrics = metrics.Metrics()
+    out = io.StringIO()
+    ft.process_commands(create_tree(), ft.parse_commands(lines), out, flush_size=2, metrics=tree_metrics)
+    assert out.getvalue() == expected.getvalue(), message.format("output", expected.getvalue(), out.getvalue())
+    result = {stage: histogram.count for stage, histogram in tree_metrics.histograms.items()}
+    # the second Paternal-Uncle query is served from the cache, Ancestor-1 is answered by the ancestry index
+    expected = {"parse": 7, "add_child": 1, "relationship_cached": 1, "relationship_evaluated": 5, "write": 4}
+    assert result == expected, message.format("stage counts", expected, result)
+    result = tree_metrics.relations
+    expected = {"Son": 2, "Paternal-Uncle": 2, "Ancestor-1": 2}
+    assert result == expected, message.format("relations", expected, result)
+    result = (tree_metrics.spouse_names, tree_metrics.not_found)
+    assert result == (1, 1), message.format("spouse names and names not found", (1, 1), result)
+    path = tmp_path / "metrics.prom"
+    tree_metrics.dump(str(path))
+    text = path.read_text()
+    for line in ('geektrust_stage_seconds_count{stage="relationship_evaluated"} 5',
+                 'geektrust_relations_total{relation="Son"} 2',
+                 'geektrust_stage_seconds_bucket{stage="add_child",le="+Inf"} 1',
+                 'geektrust_names_not_found_total 1'):
+        assert line in text.splitlines(), message.format("Prometheus text", line, text)
+    assert "Paternal-Uncle" in tree_metrics.summary(), message.format("summary", "Paternal-Uncle", "missing")
+
+
+def test_server(tmp_path):
+    """
+    Tests TreeServer of server module. Asserts that pipelined command lines sent over TCP and a Unix socket,
+    including a line split across writes, are answered as process_commands() answers them, that bytes that are
+    not UTF-8 and a failing command are answered line by line, that a line is parsed against the names added by
+    the lines before it and that a connection sending a too long line is closed.
+    """
+    message = "Server output over {} should be {} but returned {}"
+    lines = ["ADD_CHILD Z H Male\n", "GET_RELATIONSHIP E Paternal-Uncle\n", "GET_RELATIONSHIP I Son\n",
+             "ADD_CHILD C I Male\n", "GET_RELATIONSHIP A Son\n"]
+    expected = io.StringIO()
+    ft.process_commands(create_tree(), ft.parse_commands(lines), expected)
+
+    async def exchange(path):
+        tree_server = await server.TreeServer(create_tree()).start(path=path)
+        async with tree_server:
+            if path is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", tree_server.sockets[0].getsockname()[1])
+            else:
+                reader, writer = await asyncio.open_unix_connection(path)
+            data = "".join(lines)
+            writer.write(data[:40].encode())
+            await writer.drain()
+            await asyncio.sleep(0.01)
+            writer.write(data[40:].encode())
+            writer.write_eof()
+            output = await reader.read()
+            writer.close()
+            return output.decode()
+
+    for path in (None, str(tmp_path / "tree.sock")):
+        result = asyncio.run(exchange(path))
+        assert result == expected.getvalue(), message.format(path or "TCP", expected.getvalue(), result)
+
+    def failing_relationship(name, relation, other=None):
+        if name == "H":
+            raise RuntimeError(name)
+        return ft.GraphADT.get_relationship(tree_server.ftree, name, relation, other)
+
+    tree_server = server.TreeServer(create_tree())
+    tree_server.ftree.get_relationship = failing_relationship
+    data = b"GET_RELATIONSHIP \xff Son\nADD_CHILD Z H Male\nGET_RELATIONSHIP H Siblings\nGET_RELATIONSHIP A Son\n"
+    result = tree_server.answer(data).decode()
+    expected = "PERSON_NOT_FOUND\nCHILD_ADDITION_SUCCEEDED\nCOMMAND_FAILED\nB H \n"
+    assert result == expected, message.format("answer()", expected, result)
+    # a name of several words added by a line is matched in the next lines of the same batch
+    tree_server = server.TreeServer(create_tree())
+    data = b"ADD_CHILD D Mary Jane Female\nADD_CHILD Mary Jane Ann Female\nGET_RELATIONSHIP Mary Jane Sister\n"
+    result = tree_server.answer(data).decode()
+    expected = "CHILD_ADDITION_SUCCEEDED\nCHILD_ADDITION_FAILED\nF \n"
+    assert result == expected, message.format("answer() of a pipelined name", expected, result)
+
+    async def send_long_line():
+        tree_server = await server.TreeServer(create_tree()).start()
+        async with tree_server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", tree_server.sockets[0].getsockname()[1])
+            writer.write(b"GET_RELATIONSHIP " + b"E" * (server.MAX_LINE + 1))
+            output = await reader.read()
+            writer.close()
+            return output.decode()
+
+    result = asyncio.run(send_long_line())
+    assert result == "", message.format("a connection sending a too long line", "closed", result)
+
+
+def test_process_commands_parallel():
+    """
+    Tests process_commands() with worker processes. Asserts that the output is the same as without workers when
+    runs of GET_RELATIONSHIP commands answered by workers are interleaved with children added to the tree.
+    """
+    message = "Output of process_commands with {} workers should be {} but returned {}"
+    names = ["A", "B", "C", "D", "E", "F", "G", "H", "X", "Y", "Z"]
+    commands = [("GET_RELATIONSHIP", name, relation) for name in names for relation in ft.RELATIONS]
+    commands = commands + [("ADD_CHILD", "Z", "H", "Male")] + commands + [("ADD_CHILD", "D", "I", "Female"),
+                                                                         ("ADD_CHILD", "I", "J", "Female")] + commands
+    expected = io.StringIO()
+    ft.process_commands(create_tree(), commands, expected)
+    for flush_size in (7, ft.FLUSH_SIZE):
+        out = io.StringIO()
+        count = ft.process_commands(create_tree(), iter(commands), out, flush_size, workers=2, segment_size=10)
+        assert count == len(commands), message.format(2, len(commands), count)
+        assert out.getvalue() == expected.getvalue(), message.format(2, expected.getvalue(), out.getvalue())
+
+
 if __name__ == '__main__':
     pytest.main(sys.argv)
@@ -0,0 +1,120 @@
+import argparse
+import csv
+import os
+import random
+from collections import deque
+
+import geektrust as ft
+
+
+def generate_rows(size, fanout=3, marriage_rate=0.6, depth=None, seed=0):
+    """
+    Generates a family tree generation by generation. Every married vertex has between 0 and 2 * fanout children
+    (fanout on average), every vertex is married with probability marriage_rate, and the tree stops growing at
+    size vertices or after depth generations. The same arguments always generate the same tree.
+    :param size: int
+        maximum number of blood-line vertices
+    :param fanout: int
+        average number of children of a married vertex
+    :param marriage_rate: float
+        probability of a vertex to be married
+    :param depth: int or None
+        maximum number of generations below the root, None for no limit
+    :param seed: int
+        seed of the random generator
+    :return: generator of tuples
+        (name, gender, spouse_name or None, parent name or None) rows of GraphADT.load_rows(), parents first
+    """
+    rnd = random.Random(seed)
+    yield "P0", rnd.choice(("Male", "Female")), "S0", None
+    count = 1
+    # married vertices whose children are still to be generated, with their generation
+    parents = deque([("P0", 0)])
+    while parents and count < size:
+        parent, generation = parents.popleft()
+        if depth is not None and generation >= depth:
+            continue
+        for _ in range(rnd.randint(0, 2 * fanout)):
+            if count >= size:
+                break
+            name = "P{}".format(count)
+            married = rnd.random() < marriage_rate
+            yield name, rnd.choice(("Male", "Female")), "S{}".format(count) if married else None, parent
+            if married:
+                parents.append((name, generation + 1))
+            count += 1
+        if not parents and count < size:
+            # every family died out, the next family starts from a new root
+            name = "P{}".format(count)
+            yield name, rnd.choice(("Male", "Female")), "S{}".format(count), None
+            parents.append((name, 0))
+            count += 1
+
+
+def names_of(rows):
+    """
+    :param rows: iterable of tuples
+        rows generated by generate_rows()
+    :return: list
+        names and spouse names of the rows
+    """
+    names = []
+    for name, _, spouse_name, _ in rows:
+        names.append(name)
+        if spouse_name is not None:
+            names.append(spouse_name)
+    return names
+
+
+def generate_commands(names, count, add_ratio=0.1, relations=None, seed=0):
+    """
+    Generates command lines over names with add_ratio of ADD_CHILD commands (to random names, so that some of
+    them fail) and GET_RELATIONSHIP commands with random relations otherwise
+    :param names: list of str
+        names of the tree the commands are run against
+    :param count: int
+        number of lines
+    :param add_ratio: float
+        ratio of ADD_CHILD commands
+    :param relations: list of str or None
+        relations queried, all relations registered in geektrust.RELATIONS if None
+    :param seed: int
+        seed of the random generator
+    :return: generator of str
+        command lines, each with a line break
+    """
+    rnd = random.Random(seed)
+    relations = list(relations or ft.RELATIONS)
+    for index in range(count):
+        if rnd.random() < add_ratio:
+            yield "ADD_CHILD {} C{} {}\n".format(rnd.choice(names), index, rnd.choice(("Male", "Female")))
+        else:
+            yield "GET_RELATIONSHIP {} {}\n".format(rnd.choice(names), rnd.choice(relations))
+
+
+def write_tree_csv(path, rows):
+    """
+    Writes rows to a CSV file readable by GraphADT.load()
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("name", "gender", "spouse_name", "parent"))
+        writer.writerows((name, gender, spouse_name or "", parent or "") for name, gender, spouse_name, parent in rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates a family tree CSV file and a matching input file")
+    parser.add_argument("--size", type=int, default=100000, help="maximum number of blood-line vertices")
+    parser.add_argument("--fanout", type=int, default=3, help="average number of children of a married vertex")
+    parser.add_argument("--marriage-rate", type=float, default=0.6)
+    parser.add_argument("--depth", type=int, help="maximum number of generations")
+    parser.add_argument("--commands", type=int, default=100000, help="number of command lines")
+    parser.add_argument("--add-ratio", type=float, default=0.1, help="ratio of ADD_CHILD commands")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", default=".")
+    args = parser.parse_args()
+
+    tree_rows = list(generate_rows(args.size, args.fanout, args.marriage_rate, args.depth, args.seed))
+    write_tree_csv(os.path.join(args.out_dir, "tree.csv"), tree_rows)
+    with open(os.path.join(args.out_dir, "input.txt"), "w") as input_file:
+        input_file.writelines(generate_commands(names_of(tree_rows), args.commands, args.add_ratio, seed=args.seed))
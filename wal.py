@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+
+import snapshot
+
+# records written to the log with a single write() and fsync()
+GROUP_SIZE = 256
+# seconds a record may wait for its group before it is committed by a timer or the next append()
+GROUP_INTERVAL = 0.05
+# records applied together by replay() with GraphADT.add_children()
+REPLAY_BATCH = 65536
+
+
+class MutationLog:
+    """
+    Class to represent an append-only log of the children added to a GraphADT. Each successful add_child() is
+    one line 'mother_name<TAB>name<TAB>gender'. Records are committed in groups with one write() and fsync(),
+    so a larger group_size or group_interval trades how many recent children a crash may lose for throughput.
+    A group that is not full is committed by a timer group_interval after its first record, even if no other
+    child is added.
+
+    Attributes:
+        path : str
+            path of the log file
+        group_size : int
+            number of records committed together, 1 to fsync every child
+        group_interval : float
+            seconds after which pending records are committed
+
+    Methods:
+        append(mother_name, name, gender):
+            Adds a record to the pending group and commits the group if it is full or old enough
+        commit():
+            Writes and fsyncs the pending records
+        replay(ftree):
+            Applies the records of the log file to ftree
+        compact(ftree, snapshot_path):
+            Saves ftree to a snapshot and empties the log
+        close():
+            Commits the pending records and closes the log file
+    """
+
+    def __init__(self, path, group_size=GROUP_SIZE, group_interval=GROUP_INTERVAL):
+        """
+        Opens the log file at path for appending, creating it if needed
+        :param path: str
+            path of the log file
+        :param group_size: int
+            number of records committed together
+        :param group_interval: float
+            seconds after which pending records are committed
+        """
+        self.path = path
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.pending = []
+        self.first_pending = 0.0
+        self.commits = 0
+        self.file = open(path, "ab")
+        # the timer commits from its own thread
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def append(self, mother_name, name, gender):
+        """
+        Adds a record to the pending group and commits the group if it is full or older than group_interval
+        :param mother_name: str
+            name the child was added to
+        :param name: str
+            name of the child added
+        :param gender: str
+            gender of the child added
+        """
+        with self.lock:
+            first = not self.pending
+            if first:
+                self.first_pending = time.monotonic()
+            self.pending.append("{}\t{}\t{}\n".format(mother_name, name, gender))
+            if len(self.pending) >= self.group_size or time.monotonic() - self.first_pending >= self.group_interval:
+                self._commit()
+            elif first:
+                self.timer = threading.Timer(self.group_interval, self.commit)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def commit(self):
+        """
+        Writes the pending records with a single write() and makes them durable with fsync()
+        """
+        with self.lock:
+            self._commit()
+
+    def _commit(self):
+        """
+        Same as commit(), with the lock held
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        self.file.write("".join(self.pending).encode())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+        self.commits += 1
+
+    def replay(self, ftree):
+        """
+        Applies the committed records of the log file to ftree with add_children(), REPLAY_BATCH records at a
+        time. A last record without a line break was torn by a crash and is cut from the log. Records are not
+        logged again while being replayed.
+        Leading records whose child is already a child of the mother in ftree are skipped: a crash in compact()
+        between replacing the snapshot and emptying the log leaves a log whose records are all in the snapshot.
+        :param ftree: GraphADT
+            base tree the log was recorded on
+        :return: int
+            number of records replayed
+        """
+        self.commit()
+        log, ftree.log = ftree.log, None
+        count = 0
+        size = 0
+        records = []
+        covered = True
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        self.file.truncate(size)
+                        break
+                    size += len(line)
+                    record = line[:-1].decode().split("\t")
+                    covered = covered and has_child(ftree, *record)
+                    if covered:
+                        continue
+                    records.append(record)
+                    count += 1
+                    if len(records) >= REPLAY_BATCH:
+                        ftree.add_children(records)
+                        records = []
+            ftree.add_children(records)
+        finally:
+            ftree.log = log
+        return count
+
+    def compact(self, ftree, snapshot_path):
+        """
+        Saves ftree, which must include every record of the log, to snapshot_path and empties the log.
+        The snapshot is written to a temporary file first so that a crash leaves either snapshot complete.
+        :param ftree: GraphADT
+            tree the log is attached to
+        :param snapshot_path: str
+            path of the snapshot to be replaced
+        :return: int
+            number of vertices saved
+        """
+        self.commit()
+        temporary_path = snapshot_path + ".tmp"
+        count = snapshot.save_snapshot(ftree, temporary_path)
+        with open(temporary_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(temporary_path, snapshot_path)
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+        return count
+
+    def close(self):
+        """
+        Commits the pending records and closes the log file
+        """
+        self.commit()
+        self.file.close()
+
+
+def has_child(ftree, mother_name, name, gender):
+    """
+    Checks if the child of a record is in ftree, as a child of gender of mother_name or of her spouse
+    :param ftree: GraphADT
+    :param mother_name: str
+        name the child was added to
+    :param name: str
+        name of the child
+    :param gender: str
+        gender of the child
+    :return: bool
+    """
+    vertex = ftree.vertices.get(name)
+    if vertex is None or vertex.parent is None or vertex.gender != gender:
+        return False
+    parent_vertex = vertex.parent
+    return parent_vertex.name == mother_name or (parent_vertex.spouse is not None
+                                                 and parent_vertex.spouse.name == mother_name)
+
+
+def recover(ftree, path, group_size=GROUP_SIZE, group_interval=GROUP_INTERVAL):
+    """
+    Replays the log at path on top of ftree, built from the base tree or snapshot the log was recorded on,
+    and attaches the log to ftree so that the children added next are recorded
+    :param ftree: GraphADT
+        base tree
+    :param path: str
+        path of the log file
+    :return: MutationLog
+        log attached to ftree
+    """
+    log = MutationLog(path, group_size, group_interval)
+    log.replay(ftree)
+    ftree.log = log
+    return log